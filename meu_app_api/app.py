@@ -1,24 +1,160 @@
 from flask_openapi3 import OpenAPI, Info, Tag
-from flask import redirect
+from flask import g, redirect, request, Response, stream_with_context
 from urllib.parse import unquote
+import time
+from werkzeug.http import quote_etag
 
 #from schemas.categoria import apresenta_categoria, apresenta_categorias
 from sqlalchemy.exc import IntegrityError
 
 #from model import Session, categoria, Comentario
-from model import Session, Categoria, Gasto
+from model import engine, engine_leitura, janela_leitura, usa_leitura, Session, Categoria, Gasto, NotaGasto, ORDEM_GASTOS, filtros_gasto, condicao_cursor, \
+    projecao_gasto, totais_por_categoria, totais_por_periodo, reconstroi_resumo, cache_categorias, \
+    versao_tabela, busca_gastos, reconstroi_busca
 from logger import logger
+from fuso import obtem_fuso, fuso_padrao, localiza
+from importacao import le_linhas, importa_gastos
+from exportacao import exporta_gastos, CAMPOS_CSV
+from operacoes_lote import aplica_operacoes, recategoriza_gastos
 from schemas import *
+from schemas.serializacao import serializa_gasto, serializa_gastos
 from flask_cors import CORS
+from compressao import Compressao
+from metricas import Metricas
+from perfil_sql import PerfilSQL
+from model.perfil_conexao import PERFIL_SQL
 
 info = Info(title="ControleDeGastos API", version="1.0.0")
 app = OpenAPI(__name__, info=info)
 CORS(app)
+# as métricas são registradas antes da compressão para medir o tamanho final
+metricas = Metricas(app, engine)
+Compressao(app)
+if PERFIL_SQL:
+    perfil_sql = PerfilSQL(app, engine)
+if engine_leitura is not engine:
+    metricas.observa_engine(engine_leitura)
+    if PERFIL_SQL:
+        perfil_sql.observa_engine(engine_leitura)
+
+# cookie que marca o cliente que acabou de escrever, com o momento da escrita
+COOKIE_ESCRITA = "escrita_recente"
+
+
+def escrita_recente(cookie) -> bool:
+    """Indica se o valor do cookie COOKIE_ESCRITA marca uma escrita feita há
+    menos de DB_LEITURA_JANELA segundos.
+    """
+    try:
+        escrita = float(cookie or 0)
+    except ValueError:
+        escrita = 0
+    return time.time() - escrita < janela_leitura
+
+
+@app.teardown_appcontext
+def encerra_session(exception=None):
+    """Encerra a sessão usada no request, desfazendo o que não foi efetivado.
+    """
+    if exception is not None and Session.registry.has():
+        Session.rollback()
+    Session.remove()
+
+
+# rotas que exibem ou interpretam datas, as únicas em que um fuso horário
+# inválido é recusado
+ROTAS_COM_DATAS = {
+    "add_gasto", "add_gastos_bulk", "get_gastos", "busca_texto_gastos", "export_gastos", "get_gasto",
+    "update_gasto", "partial_update_gasto", "batch_gastos", "get_notas_gasto", "add_nota_gasto",
+    "update_nota_gasto", "get_relatorio_por_categoria", "get_relatorio_por_periodo",
+}
+
+
+@app.before_request
+def define_fuso():
+    """Define o fuso horário da requisição, informado pelo parâmetro tz ou
+    pelo cabeçalho X-Timezone, usado para exibir e interpretar datas. Nas
+    rotas sem datas, um fuso inválido é ignorado.
+    """
+    nome = request.args.get("tz") or request.headers.get("X-Timezone")
+    try:
+        g.fuso = obtem_fuso(nome) if nome else fuso_padrao()
+    except ValueError as e:
+        if request.endpoint not in ROTAS_COM_DATAS:
+            g.fuso = fuso_padrao()
+            return
+        error_msg = "%s :/" % e
+        logger.warning(f"Erro ao definir o fuso horário, {error_msg}")
+        return {"message": error_msg}, 400
+
+
+@app.before_request
+def roteia_leitura():
+    """Envia as leituras das rotas GET para a engine de leitura, exceto
+    quando o cliente escreveu há menos de DB_LEITURA_JANELA segundos: ele
+    continua lendo da engine principal até que a cópia o alcance.
+    """
+    if engine_leitura is engine or request.method not in ("GET", "HEAD"):
+        return
+    if not escrita_recente(request.cookies.get(COOKIE_ESCRITA)):
+        usa_leitura(Session())
+
+
+@app.after_request
+def marca_escrita(response):
+    """Marca o cliente que fez uma escrita bem-sucedida (ver roteia_leitura).
+    """
+    if engine_leitura is not engine and request.method in ("POST", "PUT", "PATCH", "DELETE") \
+            and response.status_code < 400:
+        response.set_cookie(COOKIE_ESCRITA, "%.3f" % time.time(), max_age=int(janela_leitura) + 1,
+                            httponly=True, samesite="Lax")
+    return response
+
+
+def verifica_etag(fuso=None, **versoes):
+    """Monta o ETag da representação a partir das versões das tabelas das
+    quais ela depende e, quando as datas dependem dele, do fuso horário.
+
+    Retorna os cabeçalhos a incluir na resposta e, se o cliente já tem essa
+    versão (If-None-Match), a resposta 304 a ser devolvida antes de carregar
+    qualquer registro. A comparação é fraca, já que as respostas comprimidas
+    levam o mesmo ETag marcado como fraco.
+    """
+    etag = "-".join("%s%d" % (tabela, versao) for tabela, versao in versoes.items())
+    cabecalhos = {}
+    if fuso is not None:
+        etag += "@" + fuso.key
+        cabecalhos["Vary"] = "X-Timezone"
+    cabecalhos["ETag"] = quote_etag(etag)
+    if request.if_none_match.contains_weak(etag):
+        return cabecalhos, Response(status=304, headers=cabecalhos)
+    return cabecalhos, None
 
 # definindo tags
 home_tag = Tag(name="Documentação", description="Seleção de documentação: Swagger, Redoc ou RapiDoc")
 categoria_tag = Tag(name="Categoria", description="Adição, visualização e remoção de categorias à base")
 gasto_tag = Tag(name="Gastos", description="Adição, visualização e remoção de gastos à base")
+relatorio_tag = Tag(name="Relatórios", description="Totais de gastos agregados por categoria e por período")
+nota_tag = Tag(name="Notas", description="Adição, visualização e remoção de notas dos gastos")
+
+
+@app.cli.command("reconstroi-resumo")
+def reconstroi_resumo_command():
+    """Recria o resumo mensal de gastos a partir da tabela de gastos.
+    """
+    session = Session()
+    reconstroi_resumo(session)
+    session.commit()
+    logger.info("Resumo mensal de gastos reconstruído")
+
+
+@app.cli.command("reconstroi-busca")
+def reconstroi_busca_command():
+    """Recria o índice de busca textual a partir dos gastos e das notas.
+    """
+    with engine.begin() as conexao:
+        reconstroi_busca(conexao)
+    logger.info("Índice de busca textual reconstruído")
 
 
 @app.get('/', tags=[home_tag])
@@ -27,6 +163,14 @@ def home():
     """
     return redirect('/openapi')
 
+
+@app.get('/metrics', doc_ui=False)
+def get_metrics():
+    """Medidas das requisições, do banco e do pool de conexões no formato
+    texto do Prometheus.
+    """
+    return Response(metricas.exporta(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
 # Rotas para Categorias
 @app.post('/categorias', tags=[categoria_tag],
           responses={"200": CategoriaViewSchema, "409": ErrorSchema, "400": ErrorSchema})
@@ -73,17 +217,21 @@ def get_categorias():
     logger.debug(f"Coletando categorias")
     # criando conexão com a base
     session = Session()
-    # fazendo a busca
-    categorias = session.query(Categoria).all()
+    # fazendo a busca (as categorias já vêm apresentadas do cache)
+    versao, categorias = cache_categorias.obtem_versionado(session)
+    cabecalhos, nao_modificado = verifica_etag(categoria=versao)
+    if nao_modificado:
+        return nao_modificado
+    categorias = list(categorias.values())
 
     if not categorias:
         # se não há categorias cadastrados
-        return {"categorias": []}, 200
+        return {"categorias": []}, 200, cabecalhos
     else:
         logger.debug(f"%d rodutos econtrados" % len(categorias))
         # retorna a representação de categoria
-        print(categorias)
-        return apresenta_categorias(categorias), 200
+        logger.debug("Categorias: %s", categorias)
+        return {"categorias": categorias}, 200, cabecalhos
     
 @app.get('/categorias/<uuid:id>', tags=[categoria_tag],  
          responses={"200": CategoriaViewSchema, "404": ErrorSchema})
@@ -95,18 +243,17 @@ def get_categoria(path: CategoriaPathSchema):
     # criando conexão com a base
     session = Session()
     
-    # Construindo a query dinamicamente com base nos parâmetros fornecidos
-    query_base = session.query(Categoria)
-    
-    
     if not path.id:
         error_msg = "ID da categoria é obrigatório para busca."
         logger.warning(f"Erro ao buscar categoria, {error_msg}")
         return {"message": error_msg}, 422
     
-    query_base = query_base.filter(Categoria.id == path.id)
-    
-    categoria = query_base.first()
+    # a categoria já vem apresentada do cache
+    versao, categorias = cache_categorias.obtem_versionado(session)
+    cabecalhos, nao_modificado = verifica_etag(categoria=versao)
+    if nao_modificado:
+        return nao_modificado
+    categoria = categorias.get(path.id)
 
     if not categoria:
         # se o produto não foi encontrado
@@ -115,9 +262,9 @@ def get_categoria(path: CategoriaPathSchema):
         logger.warning(f"Erro ao buscar categoria '{search_term}', {error_msg}")
         return {"message": error_msg}, 404
     else:
-        logger.debug(f"Categoria econtrado: '{categoria.nome}'")
+        logger.debug(f"Categoria econtrado: '{categoria['nome']}'")
         # retorna a representação de Categoria
-        return apresenta_categoria(categoria), 200
+        return categoria, 200, cabecalhos
     
 
 @app.delete('/categoria/<uuid:id>', tags=[categoria_tag],
@@ -251,9 +398,9 @@ def add_gasto(form: GastoSchema):
     """
     gasto = Gasto(
         descricao=form.descricao,
-        valor=form.valor,
+        valor_centavos=form.valor_centavos,
         categoria_id=form.categoria_id,
-        data_gasto=form.data_gasto
+        data_gasto=localiza(form.data_gasto, g.fuso)
     )
     logger.debug(f"Adicionando gasto de nome: '{gasto}'")
     try:
@@ -264,7 +411,7 @@ def add_gasto(form: GastoSchema):
         # efetivando o camando de adição de novo item na tabela
         session.commit()
         logger.debug(f"Adicionado gasto de nome: '{gasto}'")
-        return apresenta_gasto(gasto), 201
+        return apresenta_gasto(gasto, cache_categorias.obtem(session), g.fuso), 201
 
     except IntegrityError as e:
         # como a duplicidade do nome é a provável razão do IntegrityError
@@ -279,28 +426,148 @@ def add_gasto(form: GastoSchema):
         return {"message": error_msg}, 400
     
 
+@app.post('/gastos/bulk', tags=[gasto_tag],
+          responses={"200": GastoImportacaoViewSchema, "415": ErrorSchema})
+def add_gastos_bulk(query: GastoImportacaoQuerySchema):
+    """Adiciona gastos em lote à base de dados
+
+    Aceita uma lista JSON (application/json), NDJSON (application/x-ndjson)
+    ou CSV com cabeçalho (text/csv), com os mesmos campos de GastoSchema.
+    Retorna a quantidade de gastos inseridos e os erros de cada linha rejeitada.
+    """
+    try:
+        linhas = le_linhas(request)
+    except ValueError as e:
+        error_msg = "Formato de importação não suportado: %s :/" % e
+        logger.warning(f"Erro ao importar gastos, {error_msg}")
+        return {"message": error_msg}, 415
+
+    # criando conexão com a base
+    session = Session()
+    inseridos, total_erros, erros = importa_gastos(session, linhas, query.tamanho_lote, g.fuso)
+    logger.debug(f"Importados {inseridos} gastos, {total_erros} linhas rejeitadas")
+    return {"inseridos": inseridos, "total_erros": total_erros, "erros": erros}, 200
+
+
 @app.get('/gastos', tags=[gasto_tag],
-         responses={"200": ListaGastosViewSchema, "404": ErrorSchema})
-def get_gastos():
-    """Faz a busca por todos as Gastos cadastradas
+         responses={"200": ListaGastosViewSchema, "400": ErrorSchema})
+def get_gastos(query: GastoListaQuerySchema):
+    """Faz a busca paginada pelos Gastos cadastrados
 
-    Retorna uma representação da listagem de gastos.
+    Aceita filtros por período, categoria, faixa de valor e trecho da descrição.
+    Retorna uma página da listagem de gastos e o cursor da próxima página.
     """
     logger.debug(f"Coletando gastos")
+    cursor = None
+    if query.cursor:
+        try:
+            cursor = decodifica_cursor(query.cursor)
+        except ValueError:
+            error_msg = "Cursor de paginação inválido :/"
+            logger.warning(f"Erro ao listar gastos, {error_msg}")
+            return {"message": error_msg}, 400
+
     # criando conexão com a base
     session = Session()
-    # fazendo a busca
-    gastos = session.query(Gasto).all()
+    # a versão é lida antes dos gastos: uma escrita entre as duas leituras
+    # apenas faz o ETag mudar na próxima requisição
+    versao_categoria, categorias = cache_categorias.obtem_versionado(session)
+    cabecalhos, nao_modificado = verifica_etag(gasto=versao_tabela(session, "gasto"),
+                                               categoria=versao_categoria, fuso=g.fuso)
+    if nao_modificado:
+        return nao_modificado
+
+    # Construindo a query dinamicamente com base nos filtros fornecidos. Só
+    # as colunas dos campos pedidos são lidas, e as notas da página inteira
+    # vêm em uma única consulta (IN)
+    entidades, opcoes = projecao_gasto(query.campos)
+    query_base = session.query(*entidades).options(*opcoes)
+    query_base = query_base.filter(*filtros_gasto(query, g.fuso))
+    if cursor:
+        query_base = query_base.filter(condicao_cursor(*cursor))
+
+    # busca um registro a mais apenas para saber se existe próxima página
+    gastos = query_base.order_by(*ORDEM_GASTOS).limit(query.limite + 1).all()
 
     if not gastos:
         # se não há gastos cadastrados
-        return {"gastos": []}, 200
+        return {"gastos": [], "proximo_cursor": None}, 200, cabecalhos
     else:
+        proximo_cursor = None
+        if len(gastos) > query.limite:
+            gastos = gastos[:query.limite]
+            proximo_cursor = codifica_cursor(gastos[-1])
         logger.debug(f"%d rodutos econtrados" % len(gastos))
         # retorna a representação de gasto
-        print(gastos)
-        return apresenta_gastos(gastos), 200
-    
+        logger.debug("Gastos: %s", gastos)
+        # as categorias vêm do cache, sem consulta por gasto, e os gastos são
+        # escritos direto no corpo da resposta
+        corpo = serializa_gastos(gastos, categorias, proximo_cursor, g.fuso, query.campos)
+        return Response(corpo, mimetype="application/json", headers=cabecalhos)
+    
+@app.get('/gastos/busca', tags=[gasto_tag],
+         responses={"200": ListaGastosViewSchema, "400": ErrorSchema})
+def busca_texto_gastos(query: GastoBuscaTextoQuerySchema):
+    """Busca Gastos por palavras da descrição ou das notas
+
+    Cada palavra também encontra as que começam com ela, e todas precisam
+    aparecer no gasto. Os resultados vêm dos mais aos menos relevantes.
+    """
+    logger.debug(f"Buscando gastos por '{query.q}'")
+    session = Session()
+    versao_categoria, categorias = cache_categorias.obtem_versionado(session)
+    cabecalhos, nao_modificado = verifica_etag(gasto=versao_tabela(session, "gasto"),
+                                               categoria=versao_categoria, fuso=g.fuso)
+    if nao_modificado:
+        return nao_modificado
+    try:
+        gastos = busca_gastos(session, query.q, query.limite, query.campos)
+    except ValueError as e:
+        error_msg = "%s :/" % e
+        logger.warning(f"Erro ao buscar gastos, {error_msg}")
+        return {"message": error_msg}, 400
+    logger.debug(f"%d gastos encontrados" % len(gastos))
+    corpo = serializa_gastos(gastos, categorias, None, g.fuso, query.campos)
+    return Response(corpo, mimetype="application/json", headers=cabecalhos)
+
+
+@app.get('/gastos/export', tags=[gasto_tag])
+def export_gastos(query: GastoExportQuerySchema):
+    """Exporta os Gastos cadastrados em NDJSON ou CSV
+
+    Aceita os mesmos filtros da listagem. O arquivo é gerado e enviado aos
+    poucos, sem montar toda a resposta em memória.
+    """
+    logger.debug(f"Exportando gastos em {query.formato}")
+    # o CSV tem colunas fixas
+    campos = query.campos if query.formato == "ndjson" else CAMPOS_CSV
+    entidades, opcoes = projecao_gasto(campos)
+    filtros = filtros_gasto(query, g.fuso)
+    fuso = g.fuso
+
+    def gera_conteudo():
+        # a sessão é aberta dentro do gerador, que roda após o retorno da view
+        session = Session()
+        categorias = cache_categorias.obtem(session)
+        # os gastos são lidos do cursor em blocos, à medida que são enviados,
+        # com uma consulta de notas por bloco, quando incluídas
+        gastos = session.query(*entidades).options(*opcoes) \
+            .filter(*filtros) \
+            .order_by(*ORDEM_GASTOS) \
+            .yield_per(1000)
+        yield from exporta_gastos(gastos, categorias, query.formato, query.gzip, fuso, campos)
+
+    nome_arquivo = "gastos.%s" % query.formato
+    mimetype = "text/csv" if query.formato == "csv" else "application/x-ndjson"
+    if query.gzip:
+        nome_arquivo += ".gz"
+        mimetype = "application/gzip"
+
+    return Response(stream_with_context(gera_conteudo()), mimetype=mimetype, headers={
+        "Content-Disposition": "attachment; filename=%s" % nome_arquivo
+    })
+
+
 @app.get('/gastos/<uuid:id>', tags=[gasto_tag],  
          responses={"200": GastoViewSchema, "404": ErrorSchema})
 def get_gasto(path: GastoPathSchema):
@@ -310,6 +577,11 @@ def get_gasto(path: GastoPathSchema):
     """
     # criando conexão com a base
     session = Session()
+    versao_categoria, categorias = cache_categorias.obtem_versionado(session)
+    cabecalhos, nao_modificado = verifica_etag(gasto=versao_tabela(session, "gasto"),
+                                               categoria=versao_categoria, fuso=g.fuso)
+    if nao_modificado:
+        return nao_modificado
     
     # Construindo a query dinamicamente com base nos parâmetros fornecidos
     query_base = session.query(Gasto)
@@ -333,7 +605,7 @@ def get_gasto(path: GastoPathSchema):
     else:
         logger.debug(f"Gasto econtrado: '{gasto}'")
         # retorna a representação de Gasto
-        return apresenta_gasto(gasto), 200
+        return Response(serializa_gasto(gasto, categorias, g.fuso), mimetype="application/json", headers=cabecalhos)
     
 
 @app.delete('/gasto/<uuid:id>', tags=[gasto_tag],
@@ -353,23 +625,23 @@ def del_gasto(path: GastoPathSchema):
             logger.warning(f"Erro ao deletar gasto #'{path.id}', {error_msg}")
             return {"message": error_msg}, 404
         
-        nome_deletado = gasto
+        descricao_deletada = gasto.descricao
         id_deletado = gasto.id
         
         # fazendo a remoção
         session.delete(gasto)
         session.commit()
-        logger.debug(f"Gasto '{nome_deletado}' (ID: {id_deletado}) removida")
+        logger.debug(f"Gasto '{descricao_deletada}' (ID: {id_deletado}) removida")
         return {
             "id": id_deletado,
-            "nome": nome_deletado,
+            "descricao": descricao_deletada,
             "mensagem": "Gasto removida da base"
         }, 200
 
     except Exception as e:
         # caso um erro fora do previsto
         error_msg = "Não foi possível remover o item :/"
-        logger.warning(f"Erro ao remover gasto '{gasto}', {error_msg}")
+        logger.warning(f"Erro ao remover gasto '{path.id}', {error_msg}")
         return {"message": error_msg}, 400
     
 
@@ -403,14 +675,14 @@ def update_gasto(path: GastoPathSchema, form: GastoSchema):
     else:
         logger.debug(f"Gasto econtrado: '{gasto}'")
         gasto.descricao = form.descricao
-        gasto.valor = form.valor
+        gasto.valor_centavos = form.valor_centavos
         gasto.categoria_id = form.categoria_id
-        gasto.data_gasto = form.data_gasto
+        gasto.data_gasto = localiza(form.data_gasto, g.fuso)
         # retorna a representação de Gasto
 
         try:
             session.commit()
-            return apresenta_gasto(gasto), 200
+            return apresenta_gasto(gasto, cache_categorias.obtem(session), g.fuso), 200
         except IntegrityError as e:
             session.rollback()
             # Relança a exceção para ser tratada na camada de Service/HTTP
@@ -450,16 +722,194 @@ def partial_update_gasto(path: GastoPathSchema, form: GastoPatchSchema):
         if form.categoria_id is not None and form.categoria_id != "":
             gasto.categoria_id = form.categoria_id
         if form.data_gasto is not None and form.data_gasto != "":
-            gasto.data_gasto = form.data_gasto
+            gasto.data_gasto = localiza(form.data_gasto, g.fuso)
         if form.valor is not None and form.valor != "":
-            gasto.valor = form.valor
+            gasto.valor_centavos = form.valor_centavos
             
         # retorna a representação de Gasto
 
         try:
             session.commit()
-            return apresenta_gasto(gasto), 200
+            return apresenta_gasto(gasto, cache_categorias.obtem(session), g.fuso), 200
         except IntegrityError as e:
             session.rollback()
             # Relança a exceção para ser tratada na camada de Service/HTTP
-            raise IntegrityError("Tentativa de atualizar para um nome de gasto duplicado.", {}, {}) from e
\ No newline at end of file
+            raise IntegrityError("Tentativa de atualizar para um nome de gasto duplicado.", {}, {}) from e
+
+
+@app.post('/gastos/batch', tags=[gasto_tag],
+          responses={"200": GastoLoteViewSchema, "400": ErrorSchema})
+def batch_gastos(body: GastoLoteSchema):
+    """Remove e atualiza vários Gastos de uma só vez
+
+    Cada operação se aplica a uma lista de ids e é executada como um único
+    comando no banco. Todas as operações são efetivadas juntas, em uma única
+    transação, ou nenhuma delas é.
+    """
+    logger.debug(f"Aplicando {len(body.operacoes)} operações em lote")
+    session = Session()
+    try:
+        removidos, atualizados = aplica_operacoes(session, body.operacoes, g.fuso)
+    except ValueError as e:
+        error_msg = "%s :/" % e
+        logger.warning(f"Erro nas operações em lote, {error_msg}")
+        return {"message": error_msg}, 400
+    logger.debug(f"{removidos} gastos removidos e {atualizados} atualizados em lote")
+    return {"removidos": removidos, "atualizados": atualizados}, 200
+
+
+@app.post('/gastos/recategorizar', tags=[gasto_tag],
+          responses={"200": RecategorizacaoViewSchema, "400": ErrorSchema, "404": ErrorSchema})
+def recategorizar_gastos(body: RecategorizacaoSchema):
+    """Move todos os Gastos de uma categoria para outra
+
+    Retorna a quantidade de gastos movidos.
+    """
+    session = Session()
+    if body.origem_id == body.destino_id:
+        error_msg = "As categorias de origem e destino devem ser diferentes :/"
+        logger.warning(f"Erro ao recategorizar gastos, {error_msg}")
+        return {"message": error_msg}, 400
+    categorias = cache_categorias.obtem(session)
+    for categoria_id in (body.origem_id, body.destino_id):
+        if categoria_id not in categorias:
+            error_msg = "Categoria não encontrada na base :/"
+            logger.warning(f"Erro ao recategorizar gastos para '{categoria_id}', {error_msg}")
+            return {"message": error_msg}, 404
+    atualizados = recategoriza_gastos(session, body.origem_id, body.destino_id)
+    logger.debug(f"{atualizados} gastos movidos de '{body.origem_id}' para '{body.destino_id}'")
+    return {"atualizados": atualizados}, 200
+
+
+def busca_nota(session, path: NotaGastoPathSchema):
+    """Retorna a nota do gasto informado no path, ou None.
+    """
+    return session.query(NotaGasto) \
+        .filter(NotaGasto.id == path.nota_id, NotaGasto.gasto_id == path.id) \
+        .first()
+
+
+@app.get('/gastos/<uuid:id>/notas', tags=[nota_tag],
+         responses={"200": ListaNotasGastoViewSchema, "404": ErrorSchema})
+def get_notas_gasto(path: GastoPathSchema):
+    """Lista as Notas de um Gasto
+
+    Retorna as notas em ordem de inserção.
+    """
+    session = Session()
+    # as notas fazem parte da versão dos gastos
+    cabecalhos, nao_modificado = verifica_etag(gasto=versao_tabela(session, "gasto"), fuso=g.fuso)
+    if nao_modificado:
+        return nao_modificado
+
+    gasto = session.get(Gasto, path.id)
+    if not gasto:
+        error_msg = "Gasto não encontrada na base :/"
+        logger.warning(f"Erro ao buscar notas do gasto '{path.id}', {error_msg}")
+        return {"message": error_msg}, 404
+    logger.debug(f"%d notas encontradas" % len(gasto.notas))
+    return apresenta_notas(gasto.notas, g.fuso), 200, cabecalhos
+
+
+@app.post('/gastos/<uuid:id>/notas', tags=[nota_tag],
+          responses={"201": NotaGastoViewSchema, "404": ErrorSchema, "400": ErrorSchema})
+def add_nota_gasto(path: GastoPathSchema, form: NotaGastoSchema):
+    """Adiciona uma Nota a um Gasto
+
+    Retorna uma representação da nota criada.
+    """
+    session = Session()
+    if session.get(Gasto, path.id) is None:
+        error_msg = "Gasto não encontrada na base :/"
+        logger.warning(f"Erro ao adicionar nota ao gasto '{path.id}', {error_msg}")
+        return {"message": error_msg}, 404
+
+    nota = NotaGasto(texto=form.texto, gasto_id=path.id)
+    try:
+        session.add(nota)
+        session.commit()
+        logger.debug(f"Adicionada nota #{nota.id} ao gasto '{path.id}'")
+        return apresenta_nota(nota, g.fuso), 201
+    except Exception as e:
+        # caso um erro fora do previsto
+        session.rollback()
+        error_msg = "Não foi possível salvar nova nota :/"
+        logger.warning(f"Erro ao adicionar nota ao gasto '{path.id}', {error_msg}")
+        return {"message": error_msg}, 400
+
+
+@app.put('/gastos/<uuid:id>/notas/<int:nota_id>', tags=[nota_tag],
+         responses={"200": NotaGastoViewSchema, "404": ErrorSchema})
+def update_nota_gasto(path: NotaGastoPathSchema, form: NotaGastoSchema):
+    """Atualiza o texto de uma Nota de um Gasto
+    """
+    session = Session()
+    nota = busca_nota(session, path)
+    if not nota:
+        error_msg = "Nota não encontrada na base :/"
+        logger.warning(f"Erro ao atualizar nota #{path.nota_id} do gasto '{path.id}', {error_msg}")
+        return {"message": error_msg}, 404
+
+    nota.texto = form.texto
+    session.commit()
+    logger.debug(f"Atualizada nota #{nota.id} do gasto '{path.id}'")
+    return apresenta_nota(nota, g.fuso), 200
+
+
+@app.delete('/gastos/<uuid:id>/notas/<int:nota_id>', tags=[nota_tag],
+            responses={"200": NotaGastoDelSchema, "404": ErrorSchema})
+def del_nota_gasto(path: NotaGastoPathSchema):
+    """Remove uma Nota de um Gasto
+
+    Retorna uma mensagem de confirmação da remoção.
+    """
+    session = Session()
+    nota = busca_nota(session, path)
+    if not nota:
+        error_msg = "Nota não encontrada na base :/"
+        logger.warning(f"Erro ao deletar nota #{path.nota_id} do gasto '{path.id}', {error_msg}")
+        return {"message": error_msg}, 404
+
+    session.delete(nota)
+    session.commit()
+    logger.debug(f"Nota #{path.nota_id} do gasto '{path.id}' removida")
+    return {"id": path.nota_id, "mensagem": "Nota removida da base"}, 200
+
+
+# Rotas para Relatórios
+@app.get('/relatorios/por-categoria', tags=[relatorio_tag],
+         responses={"200": RelatorioCategoriaViewSchema})
+def get_relatorio_por_categoria(query: GastoFiltroSchema):
+    """Soma os gastos de cada categoria
+
+    Aceita os mesmos filtros da listagem de gastos. Retorna apenas os totais,
+    calculados no banco.
+    """
+    logger.debug(f"Calculando totais por categoria")
+    # criando conexão com a base
+    session = Session()
+    cabecalhos, nao_modificado = verifica_etag(gasto=versao_tabela(session, "gasto"),
+                                               categoria=versao_tabela(session, "categoria"),
+                                               fuso=g.fuso)
+    if nao_modificado:
+        return nao_modificado
+    linhas = totais_por_categoria(session, query, g.fuso)
+    return apresenta_relatorio_categorias(linhas), 200, cabecalhos
+
+
+@app.get('/relatorios/por-periodo', tags=[relatorio_tag],
+         responses={"200": RelatorioPeriodoViewSchema})
+def get_relatorio_por_periodo(query: RelatorioPeriodoQuerySchema):
+    """Soma os gastos de cada dia, semana ou mês
+
+    Aceita os mesmos filtros da listagem de gastos. Retorna apenas os totais,
+    calculados no banco.
+    """
+    logger.debug(f"Calculando totais por {query.granularidade}")
+    # criando conexão com a base
+    session = Session()
+    cabecalhos, nao_modificado = verifica_etag(gasto=versao_tabela(session, "gasto"), fuso=g.fuso)
+    if nao_modificado:
+        return nao_modificado
+    linhas = totais_por_periodo(session, query, query.granularidade, g.fuso)
+    return apresenta_relatorio_periodos(linhas, query.granularidade), 200, cabecalhos
@@ -0,0 +1,382 @@
+""" Modo de execução assíncrono (ASGI) da API.
+
+    As rotas de leitura, que concentram os clientes lentos (exportações
+    longas, painéis que consultam a API periodicamente), são atendidas por
+    views assíncronas com a engine assíncrona do SQLAlchemy (aiosqlite): a
+    espera pelo banco e pelo envio ao cliente não prende uma thread. As
+    demais rotas, a documentação e o /metrics continuam sendo atendidos pelo
+    app Flask, montado por baixo. Com uma engine de leitura configurada, as
+    views leem dela como as rotas GET do app Flask (ver app.roteia_leitura).
+
+    Uso (a partir da pasta meu_app_api, com requirements-asgi.txt instalado):
+        uvicorn asgi:app --host 0.0.0.0 --port 5000
+"""
+import contextlib
+import functools
+import os
+
+from a2wsgi import WSGIMiddleware
+from pydantic import ValidationError
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import selectinload
+from starlette.applications import Starlette
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Mount, Route
+from werkzeug.http import parse_accept_header, parse_etags, quote_etag
+
+from app import app as app_flask, COOKIE_ESCRITA, escrita_recente
+from compressao import COMPRESSORES, TAMANHO_MINIMO
+from exportacao import ExportacaoEmLotes, CAMPOS_CSV
+from fuso import obtem_fuso, fuso_padrao
+from logger import logger
+from model import url, pool_config, configura_sqlite, configura_sqlite_leitura, engine, engine_leitura, \
+    SessaoRoteada, usa_leitura, Gasto, ORDEM_GASTOS, filtros_gasto, \
+    condicao_cursor, projecao_gasto, totais_por_categoria, totais_por_periodo, cache_categorias, versao_tabela, \
+    busca_gastos
+from schemas import *
+from schemas.serializacao import codifica, serializa_gasto, serializa_gastos
+
+
+# url da engine assíncrona; por padrão, o mesmo banco do app com o driver
+# aiosqlite
+db_url_async = os.environ.get("DB_URL_ASYNC")
+if db_url_async is None:
+    if url.get_backend_name() != "sqlite":
+        raise RuntimeError("defina DB_URL_ASYNC para usar o modo ASGI com %s" % url.get_backend_name())
+    db_url_async = url.set(drivername="sqlite+aiosqlite")
+
+# o mesmo pool do app, sem as opções de conexão específicas do sqlite3
+engine_async = create_async_engine(
+    db_url_async, echo=False, **{k: v for k, v in pool_config.items() if k != "connect_args"})
+event.listen(engine_async.sync_engine, "connect", configura_sqlite)
+
+# engine assíncrona da engine de leitura (DB_URL_LEITURA ou cópia de
+# leitura), se houver uma; por padrão, o mesmo banco com o driver aiosqlite
+engine_async_leitura = None
+if engine_leitura is not engine:
+    db_url_async_leitura = os.environ.get("DB_URL_ASYNC_LEITURA")
+    if db_url_async_leitura is None:
+        if engine_leitura.url.get_backend_name() != "sqlite":
+            raise RuntimeError("defina DB_URL_ASYNC_LEITURA para usar o modo ASGI com %s"
+                               % engine_leitura.url.get_backend_name())
+        db_url_async_leitura = engine_leitura.url.set(drivername="sqlite+aiosqlite")
+    engine_async_leitura = create_async_engine(
+        db_url_async_leitura, echo=False, **{k: v for k, v in pool_config.items() if k != "connect_args"})
+    event.listen(engine_async_leitura.sync_engine, "connect", configura_sqlite_leitura)
+
+# as sessões roteiam as leituras como as do app Flask (ver SessaoRoteada)
+SessionAsync = async_sessionmaker(
+    engine_async, expire_on_commit=False, sync_session_class=SessaoRoteada,
+    engine_leitura=engine_async_leitura.sync_engine if engine_async_leitura is not None else None)
+
+# gastos lidos do banco a cada lote da exportação
+TAMANHO_LOTE_EXPORTACAO = 1000
+
+
+def _gastos(resultado, entidades):
+    # com as notas, a projeção lê objetos Gasto; sem elas, linhas com as colunas
+    return resultado.scalars() if entidades == [Gasto] else resultado
+
+
+def sessao(request):
+    """ Abre uma sessão assíncrona que lê da engine de leitura, exceto
+        quando o cliente escreveu há menos de DB_LEITURA_JANELA segundos
+        (ver app.roteia_leitura).
+    """
+    session = SessionAsync()
+    if engine_async_leitura is not None and not escrita_recente(request.cookies.get(COOKIE_ESCRITA)):
+        usa_leitura(session.sync_session)
+    return session
+
+
+def _erro(mensagem: str, status: int):
+    return Response(codifica({"message": mensagem}), status, media_type="application/json")
+
+
+def _valida(schema, dados):
+    """ Valida os parâmetros com o schema pydantic. Retorna o schema
+        preenchido e, em caso de erro, a resposta 422 no formato do Flask.
+    """
+    try:
+        return schema(**dados), None
+    except ValidationError as e:
+        return None, Response(e.json(include_url=False), 422, media_type="application/json")
+
+
+def com_fuso(view):
+    """ Resolve o fuso horário da requisição (parâmetro tz ou cabeçalho
+        X-Timezone) e o repassa para a view. Usado apenas nas views que
+        exibem ou interpretam datas.
+    """
+    @functools.wraps(view)
+    async def atende(request):
+        nome = request.query_params.get("tz") or request.headers.get("x-timezone")
+        try:
+            fuso = obtem_fuso(nome) if nome else fuso_padrao()
+        except ValueError as e:
+            error_msg = "%s :/" % e
+            logger.warning(f"Erro ao definir o fuso horário, {error_msg}")
+            return _erro(error_msg, 400)
+        return await view(request, fuso)
+    return atende
+
+
+def verifica_etag(request, fuso=None, **versoes):
+    """ Equivalente de app.verifica_etag para as views assíncronas.
+    """
+    etag = "-".join("%s%d" % (tabela, versao) for tabela, versao in versoes.items())
+    cabecalhos = {}
+    if fuso is not None:
+        etag += "@" + fuso.key
+        cabecalhos["Vary"] = "X-Timezone"
+    cabecalhos["ETag"] = quote_etag(etag)
+    if parse_etags(request.headers.get("if-none-match")).contains_weak(etag):
+        return cabecalhos, Response(status_code=304, headers=cabecalhos)
+    return cabecalhos, None
+
+
+def _codificacao(request, cabecalhos):
+    """ Negocia a compressão como compressao.Compressao faz no app Flask. """
+    cabecalhos["Vary"] = ", ".join(filter(None, (cabecalhos.get("Vary"), "Accept-Encoding")))
+    codificacao = parse_accept_header(request.headers.get("accept-encoding")).best_match(COMPRESSORES)
+    if codificacao is not None:
+        etag = cabecalhos.get("ETag")
+        if etag and not etag.startswith("W/"):
+            cabecalhos["ETag"] = "W/" + etag
+    return codificacao
+
+
+def resposta_json(request, corpo: bytes, cabecalhos=None):
+    """ Resposta JSON comprimida conforme o Accept-Encoding do cliente. """
+    cabecalhos = dict(cabecalhos or {})
+    if len(corpo) >= TAMANHO_MINIMO:
+        codificacao = _codificacao(request, cabecalhos)
+        if codificacao is not None:
+            compressor = COMPRESSORES[codificacao]()
+            corpo = compressor.comprime(corpo) + compressor.finaliza()
+            cabecalhos["Content-Encoding"] = codificacao
+    return Response(corpo, 200, cabecalhos, media_type="application/json")
+
+
+async def _comprime_fluxo(partes, compressor):
+    async for parte in partes:
+        dados = compressor.comprime(parte)
+        if dados:
+            yield dados
+    yield compressor.finaliza()
+
+
+async def get_categorias(request):
+    async with sessao(request) as session:
+        versao, categorias = await session.run_sync(cache_categorias.obtem_versionado)
+    cabecalhos, nao_modificado = verifica_etag(request, categoria=versao)
+    if nao_modificado:
+        return nao_modificado
+    return resposta_json(request, codifica({"categorias": list(categorias.values())}), cabecalhos)
+
+
+async def get_categoria(request):
+    async with sessao(request) as session:
+        versao, categorias = await session.run_sync(cache_categorias.obtem_versionado)
+    cabecalhos, nao_modificado = verifica_etag(request, categoria=versao)
+    if nao_modificado:
+        return nao_modificado
+    categoria = categorias.get(request.path_params["id"])
+    if not categoria:
+        error_msg = "Categoria não encontrada na base :/"
+        logger.warning(f"Erro ao buscar categoria '{request.path_params['id']}', {error_msg}")
+        return _erro(error_msg, 404)
+    return resposta_json(request, codifica(categoria), cabecalhos)
+
+
+@com_fuso
+async def get_gastos(request, fuso):
+    query, invalido = _valida(GastoListaQuerySchema, request.query_params)
+    if invalido:
+        return invalido
+    cursor = None
+    if query.cursor:
+        try:
+            cursor = decodifica_cursor(query.cursor)
+        except ValueError:
+            error_msg = "Cursor de paginação inválido :/"
+            logger.warning(f"Erro ao listar gastos, {error_msg}")
+            return _erro(error_msg, 400)
+
+    async with sessao(request) as session:
+        versao_categoria, categorias = await session.run_sync(cache_categorias.obtem_versionado)
+        versao_gasto = await session.run_sync(versao_tabela, "gasto")
+        cabecalhos, nao_modificado = verifica_etag(request, gasto=versao_gasto,
+                                                   categoria=versao_categoria, fuso=fuso)
+        if nao_modificado:
+            return nao_modificado
+
+        # a sessão assíncrona não carrega relacionamentos sob demanda: as
+        # notas da página, quando pedidas, vêm juntas, em uma única consulta (IN)
+        entidades, opcoes = projecao_gasto(query.campos)
+        consulta = select(*entidades).options(*opcoes).where(*filtros_gasto(query, fuso))
+        if cursor:
+            consulta = consulta.where(condicao_cursor(*cursor))
+        # busca um registro a mais apenas para saber se existe próxima página
+        consulta = consulta.order_by(*ORDEM_GASTOS).limit(query.limite + 1)
+        gastos = _gastos(await session.execute(consulta), entidades).all()
+
+    proximo_cursor = None
+    if len(gastos) > query.limite:
+        gastos = gastos[:query.limite]
+        proximo_cursor = codifica_cursor(gastos[-1])
+    corpo = serializa_gastos(gastos, categorias, proximo_cursor, fuso, query.campos)
+    return resposta_json(request, corpo, cabecalhos)
+
+
+@com_fuso
+async def busca_texto_gastos(request, fuso):
+    query, invalido = _valida(GastoBuscaTextoQuerySchema, request.query_params)
+    if invalido:
+        return invalido
+    async with sessao(request) as session:
+        versao_categoria, categorias = await session.run_sync(cache_categorias.obtem_versionado)
+        versao_gasto = await session.run_sync(versao_tabela, "gasto")
+        cabecalhos, nao_modificado = verifica_etag(request, gasto=versao_gasto,
+                                                   categoria=versao_categoria, fuso=fuso)
+        if nao_modificado:
+            return nao_modificado
+        try:
+            gastos = await session.run_sync(busca_gastos, query.q, query.limite, query.campos)
+        except ValueError as e:
+            error_msg = "%s :/" % e
+            logger.warning(f"Erro ao buscar gastos, {error_msg}")
+            return _erro(error_msg, 400)
+    return resposta_json(request, serializa_gastos(gastos, categorias, None, fuso, query.campos), cabecalhos)
+
+
+@com_fuso
+async def export_gastos(request, fuso):
+    query, invalido = _valida(GastoExportQuerySchema, request.query_params)
+    if invalido:
+        return invalido
+    # o CSV tem colunas fixas
+    campos = query.campos if query.formato == "ndjson" else CAMPOS_CSV
+    entidades, opcoes = projecao_gasto(campos)
+    consulta = select(*entidades).options(*opcoes).where(*filtros_gasto(query, fuso)).order_by(*ORDEM_GASTOS)
+
+    async def gera_conteudo():
+        # a sessão fica aberta enquanto o arquivo é enviado, sem prender uma
+        # thread: cada lote é lido do banco só quando o anterior foi enviado
+        async with sessao(request) as session:
+            categorias = await session.run_sync(cache_categorias.obtem)
+            exportacao = ExportacaoEmLotes(categorias, query.formato, query.gzip, fuso, campos)
+            resultado = await session.stream(
+                consulta.execution_options(yield_per=TAMANHO_LOTE_EXPORTACAO))
+            async for lote in _gastos(resultado, entidades).partitions():
+                dados = exportacao.lote(lote)
+                if dados:
+                    yield dados
+            yield exportacao.finaliza()
+
+    nome_arquivo = "gastos.%s" % query.formato
+    media_type = "text/csv" if query.formato == "csv" else "application/x-ndjson"
+    cabecalhos = {}
+    conteudo = gera_conteudo()
+    if query.gzip:
+        nome_arquivo += ".gz"
+        media_type = "application/gzip"
+    else:
+        codificacao = _codificacao(request, cabecalhos)
+        if codificacao is not None:
+            conteudo = _comprime_fluxo(conteudo, COMPRESSORES[codificacao]())
+            cabecalhos["Content-Encoding"] = codificacao
+    cabecalhos["Content-Disposition"] = "attachment; filename=%s" % nome_arquivo
+    return StreamingResponse(conteudo, media_type=media_type, headers=cabecalhos)
+
+
+@com_fuso
+async def get_gasto(request, fuso):
+    async with sessao(request) as session:
+        versao_categoria, categorias = await session.run_sync(cache_categorias.obtem_versionado)
+        versao_gasto = await session.run_sync(versao_tabela, "gasto")
+        cabecalhos, nao_modificado = verifica_etag(request, gasto=versao_gasto,
+                                                   categoria=versao_categoria, fuso=fuso)
+        if nao_modificado:
+            return nao_modificado
+        gasto = await session.get(Gasto, request.path_params["id"], options=[selectinload(Gasto.notas)])
+
+    if not gasto:
+        error_msg = "Gasto não encontrada na base :/"
+        logger.warning(f"Erro ao buscar gasto '{request.path_params['id']}', {error_msg}")
+        return _erro(error_msg, 404)
+    return resposta_json(request, serializa_gasto(gasto, categorias, fuso), cabecalhos)
+
+
+@com_fuso
+async def get_notas_gasto(request, fuso):
+    async with sessao(request) as session:
+        versao_gasto = await session.run_sync(versao_tabela, "gasto")
+        cabecalhos, nao_modificado = verifica_etag(request, gasto=versao_gasto, fuso=fuso)
+        if nao_modificado:
+            return nao_modificado
+        gasto = await session.get(Gasto, request.path_params["id"], options=[selectinload(Gasto.notas)])
+
+    if not gasto:
+        error_msg = "Gasto não encontrada na base :/"
+        logger.warning(f"Erro ao buscar notas do gasto '{request.path_params['id']}', {error_msg}")
+        return _erro(error_msg, 404)
+    return resposta_json(request, codifica(apresenta_notas(gasto.notas, fuso)), cabecalhos)
+
+
+@com_fuso
+async def get_relatorio_por_categoria(request, fuso):
+    query, invalido = _valida(GastoFiltroSchema, request.query_params)
+    if invalido:
+        return invalido
+    async with sessao(request) as session:
+        versao_gasto = await session.run_sync(versao_tabela, "gasto")
+        versao_categoria = await session.run_sync(versao_tabela, "categoria")
+        cabecalhos, nao_modificado = verifica_etag(request, gasto=versao_gasto,
+                                                   categoria=versao_categoria, fuso=fuso)
+        if nao_modificado:
+            return nao_modificado
+        linhas = await session.run_sync(totais_por_categoria, query, fuso)
+    return resposta_json(request, codifica(apresenta_relatorio_categorias(linhas)), cabecalhos)
+
+
+@com_fuso
+async def get_relatorio_por_periodo(request, fuso):
+    query, invalido = _valida(RelatorioPeriodoQuerySchema, request.query_params)
+    if invalido:
+        return invalido
+    async with sessao(request) as session:
+        versao_gasto = await session.run_sync(versao_tabela, "gasto")
+        cabecalhos, nao_modificado = verifica_etag(request, gasto=versao_gasto, fuso=fuso)
+        if nao_modificado:
+            return nao_modificado
+        linhas = await session.run_sync(totais_por_periodo, query, query.granularidade, fuso)
+    return resposta_json(request, codifica(apresenta_relatorio_periodos(linhas, query.granularidade)),
+                         cabecalhos)
+
+
+@contextlib.asynccontextmanager
+async def ciclo_de_vida(app):
+    yield
+    await engine_async.dispose()
+    if engine_async_leitura is not None:
+        await engine_async_leitura.dispose()
+
+
+app = Starlette(
+    routes=[
+        Route("/categorias", get_categorias, methods=["GET"]),
+        Route("/categorias/{id:uuid}", get_categoria, methods=["GET"]),
+        Route("/gastos", get_gastos, methods=["GET"]),
+        Route("/gastos/busca", busca_texto_gastos, methods=["GET"]),
+        Route("/gastos/export", export_gastos, methods=["GET"]),
+        Route("/gastos/{id:uuid}", get_gasto, methods=["GET"]),
+        Route("/gastos/{id:uuid}/notas", get_notas_gasto, methods=["GET"]),
+        Route("/relatorios/por-categoria", get_relatorio_por_categoria, methods=["GET"]),
+        Route("/relatorios/por-periodo", get_relatorio_por_periodo, methods=["GET"]),
+        # as escritas, a documentação e o /metrics seguem no app Flask
+        Mount("/", app=WSGIMiddleware(app_flask)),
+    ],
+    lifespan=ciclo_de_vida,
+)
@@ -0,0 +1,10 @@
+"""Benchmarks da API, executados a partir da pasta meu_app_api.
+
+    python -m benchmarks.micro          apresentação e serialização, em memória
+    python -m benchmarks.rotas          rotas de ponta a ponta, pelo test client e por um servidor WSGI
+    python -m benchmarks.compara A B    compara dois resultados em JSON
+    python -m benchmarks.serializacao   serialização da listagem antes e depois da view compilada
+
+Os dados são gerados por benchmarks.dados a partir de uma semente, então
+execuções com os mesmos parâmetros medem sempre os mesmos dados.
+"""
@@ -0,0 +1,66 @@
+"""Compara dois resultados de benchmark em JSON e aponta as regressões.
+
+Uso (a partir da pasta meu_app_api):
+    python -m benchmarks.compara antes.json depois.json [--tolerancia 10]
+
+Os casos são pareados pelo nome (e pelo modo, no benchmark de rotas). A
+comparação usa a latência p50 das rotas e o menor tempo dos micro-benchmarks.
+O comando termina com código 1 quando algum caso ficou mais lento que a
+tolerância, em porcentagem.
+"""
+import argparse
+import json
+import sys
+
+
+def _medidas(resultado: dict):
+    """ Retorna a medida comparável de cada caso: chave -> milissegundos. """
+    medidas = {}
+    for caso in resultado["resultados"]:
+        if "rota" in caso:
+            medidas["%s %s" % (caso["modo"], caso["rota"])] = caso["latencia_ms"].get("p50")
+        else:
+            medidas[caso["caso"]] = caso["tempo_ms"].get("min")
+    return medidas
+
+
+def compara(antes: dict, depois: dict, tolerancia: float):
+    """ Retorna as linhas da comparação e se houve alguma regressão. """
+    medidas_antes, medidas_depois = _medidas(antes), _medidas(depois)
+    linhas = []
+    regressao = False
+    for chave, anterior in medidas_antes.items():
+        atual = medidas_depois.get(chave)
+        if not anterior or atual is None:
+            continue
+        variacao = (atual - anterior) / anterior * 100
+        marca = ""
+        if variacao > tolerancia:
+            marca = "  REGRESSÃO"
+            regressao = True
+        linhas.append("%-45s %10.3f ms %10.3f ms %+8.1f%%%s" % (chave, anterior, atual, variacao, marca))
+    return linhas, regressao
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("antes")
+    parser.add_argument("depois")
+    parser.add_argument("--tolerancia", type=float, default=10.0)
+    args = parser.parse_args()
+
+    with open(args.antes, encoding="utf-8") as arquivo:
+        antes = json.load(arquivo)
+    with open(args.depois, encoding="utf-8") as arquivo:
+        depois = json.load(arquivo)
+
+    print("antes:  %s" % antes["metadados"].get("commit"))
+    print("depois: %s" % depois["metadados"].get("commit"))
+    linhas, regressao = compara(antes, depois, args.tolerancia)
+    for linha in linhas:
+        print(linha)
+    sys.exit(1 if regressao else 0)
+
+
+if __name__ == "__main__":
+    main()
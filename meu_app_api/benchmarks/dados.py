@@ -0,0 +1,147 @@
+""" Geração de categorias e gastos reproduzíveis para os benchmarks.
+
+    A mesma semente sempre gera os mesmos dados. As distribuições imitam o uso
+    real: poucas categorias concentram a maior parte dos gastos, os valores
+    seguem uma lognormal com mediana própria de cada categoria, há mais gastos
+    nos fins de semana e em horário comercial, e as descrições se repetem.
+"""
+import math
+import random
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import insert
+from sqlalchemy.orm.attributes import set_committed_value
+
+from model import Categoria, Gasto, reconstroi_resumo, incrementa_versao
+
+
+NOMES_CATEGORIA = [
+    "Alimentação", "Transporte", "Moradia", "Saúde", "Lazer", "Educação",
+    "Vestuário", "Serviços", "Impostos", "Viagens", "Presentes", "Pets",
+]
+
+DESCRICOES = [
+    "Supermercado", "Padaria", "Restaurante", "Combustível", "Aplicativo de transporte",
+    "Aluguel", "Conta de luz", "Conta de água", "Internet", "Farmácia", "Consulta",
+    "Cinema", "Streaming", "Livros", "Curso", "Roupas", "Manutenção", "Assinatura",
+    "Passagem", "Hotel", "Presente", "Ração", "Veterinário", "Emergência falta de gás",
+]
+
+# início do período coberto pelos gastos gerados
+INICIO = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def _uuid(aleatorio: random.Random):
+    # ids derivados da semente, para que os dados sejam sempre os mesmos
+    return uuid.UUID(int=aleatorio.getrandbits(128), version=4)
+
+
+def gera_categorias(quantidade: int, aleatorio: random.Random):
+    """ Retorna as categorias como dicts no formato do cache de categorias,
+        cada uma com um peso de popularidade e a mediana dos seus valores.
+    """
+    categorias = []
+    for indice in range(quantidade):
+        nome = NOMES_CATEGORIA[indice % len(NOMES_CATEGORIA)]
+        if indice >= len(NOMES_CATEGORIA):
+            nome = "%s %d" % (nome, indice // len(NOMES_CATEGORIA) + 1)
+        categorias.append({
+            "id": _uuid(aleatorio),
+            "nome": nome,
+            "ordem": indice,
+            # popularidade segundo a lei de Zipf
+            "peso": 1 / (indice + 1) ** 1.1,
+            "mediana_centavos": aleatorio.choice((1500, 4000, 9000, 25000, 120000)),
+        })
+    return categorias
+
+
+def _data_gasto(aleatorio: random.Random, dias: int):
+    while True:
+        dia = INICIO + timedelta(days=aleatorio.randrange(dias))
+        # dias úteis são descartados com mais frequência que os fins de semana
+        if dia.weekday() >= 5 or aleatorio.random() < 0.6:
+            break
+    hora = min(max(aleatorio.gauss(14, 4), 0), 23.99)
+    return dia + timedelta(hours=hora)
+
+
+def gera_gastos(quantidade: int, categorias, aleatorio: random.Random, dias: int = 365):
+    """ Gera os gastos como dicts com os atributos de Gasto.
+    """
+    pesos = [categoria["peso"] for categoria in categorias]
+    agora = INICIO + timedelta(days=dias)
+    for _ in range(quantidade):
+        categoria = aleatorio.choices(categorias, pesos)[0]
+        valor = aleatorio.lognormvariate(math.log(categoria["mediana_centavos"]), 0.8)
+        yield {
+            "id": _uuid(aleatorio),
+            "descricao": "%s %d" % (aleatorio.choice(DESCRICOES), aleatorio.randrange(50)),
+            "valor_centavos": max(int(valor), 1),
+            "categoria_id": categoria["id"],
+            "data_gasto": _data_gasto(aleatorio, dias),
+            "data_insercao": agora,
+        }
+
+
+def gera_objetos(categorias: int, gastos: int, semente: int = 42):
+    """ Gera categorias e gastos em memória, sem gravar no banco.
+
+        Retorna a lista de Categoria, a lista de Gasto e as categorias no
+        formato do cache (dict de id -> dict).
+    """
+    aleatorio = random.Random(semente)
+    geradas = gera_categorias(categorias, aleatorio)
+    objetos_categoria = []
+    for dados in geradas:
+        categoria = Categoria(dados["nome"], dados["ordem"])
+        categoria.id = dados["id"]
+        objetos_categoria.append(categoria)
+    objetos_gasto = []
+    for dados in gera_gastos(gastos, geradas, aleatorio):
+        gasto = Gasto(
+            descricao=dados["descricao"],
+            valor_centavos=dados["valor_centavos"],
+            categoria_id=dados["categoria_id"],
+            data_gasto=dados["data_gasto"],
+            data_insercao=dados["data_insercao"],
+        )
+        gasto.id = dados["id"]
+        # como depois do selectinload das listagens: notas já carregadas
+        set_committed_value(gasto, "notas", [])
+        objetos_gasto.append(gasto)
+    cache = {dados["id"]: {"id": dados["id"], "nome": dados["nome"], "ordem": dados["ordem"]}
+             for dados in geradas}
+    return objetos_categoria, objetos_gasto, cache
+
+
+def popula_banco(session, categorias: int, gastos: int, semente: int = 42, tamanho_lote: int = 5000):
+    """ Grava as categorias e os gastos gerados no banco da sessão.
+
+        Os gastos são inseridos em lotes; ao final o resumo mensal é
+        reconstruído e a versão da tabela de gastos é incrementada, como na
+        importação em lote. Retorna os ids das categorias e dos gastos.
+    """
+    aleatorio = random.Random(semente)
+    geradas = gera_categorias(categorias, aleatorio)
+    for dados in geradas:
+        categoria = Categoria(dados["nome"], dados["ordem"])
+        categoria.id = dados["id"]
+        session.add(categoria)
+    session.commit()
+
+    ids_gasto = []
+    lote = []
+    for dados in gera_gastos(gastos, geradas, aleatorio):
+        lote.append(dados)
+        ids_gasto.append(dados["id"])
+        if len(lote) == tamanho_lote:
+            session.execute(insert(Gasto), lote)
+            lote = []
+    if lote:
+        session.execute(insert(Gasto), lote)
+    reconstroi_resumo(session)
+    incrementa_versao(session, "gasto")
+    session.commit()
+    return [dados["id"] for dados in geradas], ids_gasto
@@ -0,0 +1,84 @@
+""" Medição de tempos e gravação dos resultados dos benchmarks em JSON.
+"""
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+
+def mede(funcao, repeticoes: int):
+    """ Executa a função repetidas vezes e retorna o tempo de cada execução,
+        em segundos.
+    """
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return tempos
+
+
+def percentil(ordenados, fracao: float):
+    """ Percentil de uma lista já ordenada, pelo método do vizinho mais
+        próximo.
+    """
+    if not ordenados:
+        return None
+    indice = min(int(round(fracao * (len(ordenados) - 1))), len(ordenados) - 1)
+    return ordenados[indice]
+
+
+def estatisticas(tempos):
+    """ Resume uma lista de tempos, em segundos, em milissegundos.
+    """
+    ordenados = sorted(tempos)
+    if not ordenados:
+        return {}
+    return {
+        "min": round(ordenados[0] * 1000, 4),
+        "media": round(sum(ordenados) / len(ordenados) * 1000, 4),
+        "p50": round(percentil(ordenados, 0.50) * 1000, 4),
+        "p90": round(percentil(ordenados, 0.90) * 1000, 4),
+        "p99": round(percentil(ordenados, 0.99) * 1000, 4),
+        "max": round(ordenados[-1] * 1000, 4),
+    }
+
+
+def _commit_atual():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def metadados():
+    """ Ambiente em que o benchmark foi executado, para comparar resultados
+        entre versões.
+    """
+    try:
+        import orjson
+    except ImportError:
+        orjson = None
+    return {
+        "momento": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": _commit_atual(),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+        "orjson": orjson is not None,
+    }
+
+
+def grava_resultado(resultado: dict, saida: str = None):
+    """ Grava o resultado em JSON no arquivo informado ou na saída padrão.
+    """
+    texto = json.dumps(resultado, ensure_ascii=False, indent=2, default=str)
+    if saida:
+        with open(saida, "w", encoding="utf-8") as arquivo:
+            arquivo.write(texto + "\n")
+    else:
+        sys.stdout.write(texto + "\n")
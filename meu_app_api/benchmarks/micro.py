@@ -0,0 +1,77 @@
+"""Micro-benchmarks da apresentação e serialização de categorias e gastos.
+
+Uso (a partir da pasta meu_app_api):
+    python -m benchmarks.micro [--gastos 10000] [--categorias 20] [--repeticoes 20] [--saida micro.json]
+
+O resultado é gravado em JSON, com o melhor tempo e os percentis de cada caso.
+"""
+import argparse
+import os
+
+# os micro-benchmarks não usam o banco: um sqlite em memória basta
+os.environ.setdefault("DB_URL", "sqlite://")
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from fuso import fuso_padrao
+from schemas import apresenta_categorias, apresenta_gastos
+from schemas.serializacao import serializa_gastos, serializa_gasto
+from benchmarks.dados import gera_objetos
+from benchmarks.medidas import mede, estatisticas, metadados, grava_resultado
+
+
+def casos(categorias, gastos, cache):
+    """ Retorna os casos medidos: nome -> (itens processados, função).
+    """
+    # o mesmo serializador usado pelo Flask ao retornar um dict da view
+    json_flask = DefaultJSONProvider(Flask(__name__))
+    fuso = fuso_padrao()
+    pagina = gastos[:50]
+    return {
+        "apresenta_categorias": (len(categorias), lambda: apresenta_categorias(categorias)),
+        "apresenta_categorias + json": (
+            len(categorias), lambda: json_flask.dumps(apresenta_categorias(categorias))),
+        "apresenta_gastos": (len(gastos), lambda: apresenta_gastos(gastos, None, cache, fuso)),
+        "apresenta_gastos + json": (
+            len(gastos), lambda: json_flask.dumps(apresenta_gastos(gastos, None, cache, fuso))),
+        "serializa_gastos": (len(gastos), lambda: serializa_gastos(gastos, cache, None, fuso)),
+        "serializa_gastos (página de 50)": (len(pagina), lambda: serializa_gastos(pagina, cache, None, fuso)),
+        "serializa_gasto": (1, lambda: serializa_gasto(gastos[0], cache, fuso)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--gastos", type=int, default=10000)
+    parser.add_argument("--categorias", type=int, default=20)
+    parser.add_argument("--repeticoes", type=int, default=20)
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--saida", help="arquivo JSON de resultado (padrão: saída padrão)")
+    args = parser.parse_args()
+
+    categorias, gastos, cache = gera_objetos(args.categorias, args.gastos, args.semente)
+    resultados = []
+    for nome, (itens, funcao) in casos(categorias, gastos, cache).items():
+        # a primeira execução aquece os caches e não entra na medida
+        funcao()
+        tempos = mede(funcao, args.repeticoes)
+        melhor = min(tempos)
+        resultados.append({
+            "caso": nome,
+            "itens": itens,
+            "repeticoes": args.repeticoes,
+            "tempo_ms": estatisticas(tempos),
+            "itens_por_s": round(itens / melhor, 1) if melhor else None,
+        })
+
+    grava_resultado({
+        "benchmark": "micro",
+        "metadados": metadados(),
+        "parametros": vars(args),
+        "resultados": resultados,
+    }, args.saida)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+"""Benchmark de ponta a ponta das rotas da API.
+
+Uso (a partir da pasta meu_app_api):
+    python -m benchmarks.rotas [--gastos 20000] [--categorias 20] [--requisicoes 200]
+                               [--concorrencia 4] [--modos cliente,wsgi] [--rotas gastos]
+                               [--saida rotas.json]
+
+Cada rota é medida de duas formas: pelo test client do Flask, uma requisição
+por vez e sem rede, e por um servidor WSGI local (werkzeug, com threads),
+com várias conexões simultâneas. O banco é criado em um diretório
+temporário e populado com os dados gerados pela semente informada. O
+resultado é gravado em JSON, com a vazão e os percentis de latência de cada
+rota.
+"""
+import argparse
+import http.client
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from typing import NamedTuple, Optional
+from urllib.parse import urlencode
+
+from benchmarks.medidas import estatisticas, metadados, grava_resultado
+
+
+class Requisicao(NamedTuple):
+    metodo: str
+    url: str
+    form: Optional[dict] = None
+    corpo: Optional[bytes] = None
+    tipo: Optional[str] = None
+    cabecalhos: Optional[dict] = None
+
+
+class ClienteFlask:
+    """ Executa as requisições pelo test client do Flask. """
+
+    def __init__(self, app):
+        self._cliente = app.test_client()
+
+    def executa(self, req: Requisicao):
+        resposta = self._cliente.open(
+            req.url, method=req.metodo, data=req.form if req.form is not None else req.corpo,
+            content_type=req.tipo, headers=req.cabecalhos)
+        # o corpo é lido por inteiro, inclusive o das respostas em streaming
+        corpo = resposta.get_data()
+        resposta.close()
+        return resposta.status_code, corpo
+
+    def etag(self, url: str):
+        return self._cliente.get(url).headers.get("ETag")
+
+
+class ClienteHTTP:
+    """ Executa as requisições em um servidor HTTP, mantendo a conexão aberta
+        entre elas.
+    """
+
+    def __init__(self, host: str, porta: int):
+        self._conexao = http.client.HTTPConnection(host, porta, timeout=60)
+
+    def executa(self, req: Requisicao):
+        cabecalhos = dict(req.cabecalhos or {})
+        corpo = req.corpo
+        if req.form is not None:
+            corpo = urlencode(req.form).encode()
+            cabecalhos["Content-Type"] = "application/x-www-form-urlencoded"
+        elif req.tipo:
+            cabecalhos["Content-Type"] = req.tipo
+        try:
+            self._conexao.request(req.metodo, req.url, body=corpo, headers=cabecalhos)
+            resposta = self._conexao.getresponse()
+        except (ConnectionError, http.client.HTTPException):
+            # o servidor pode ter encerrado a conexão: tenta uma vez mais
+            self._conexao.close()
+            self._conexao.request(req.metodo, req.url, body=corpo, headers=cabecalhos)
+            resposta = self._conexao.getresponse()
+        return resposta.status, resposta.read()
+
+    def etag(self, url: str):
+        self._conexao.request("GET", url)
+        resposta = self._conexao.getresponse()
+        resposta.read()
+        return resposta.getheader("ETag")
+
+    def fecha(self):
+        self._conexao.close()
+
+
+def monta_casos(ids_categoria, ids_gasto, semente: int):
+    """ Retorna os casos medidos: nome -> função que, dado um cliente, monta
+        a próxima requisição.
+
+        A montagem não é medida: os casos que alteram ou removem registros
+        criam ali o que precisam. As leituras vêm antes das escritas, para que
+        todas meçam o mesmo banco.
+    """
+    aleatorio = random.Random(semente)
+    sequencia = itertools.count()
+    categoria_alvo = str(ids_categoria[-1])
+    gasto_alvo = str(ids_gasto[-1])
+    corpo_bulk = "\n".join(json.dumps({
+        "descricao": "Importado %d" % indice,
+        "valor": "%.2f" % (aleatorio.randint(100, 50000) / 100),
+        "categoria_id": str(aleatorio.choice(ids_categoria)),
+        "data_gasto": "2024-06-%02dT12:00:00" % (indice % 28 + 1),
+    }) for indice in range(100)).encode()
+
+    def categoria():
+        return str(aleatorio.choice(ids_categoria))
+
+    def gasto():
+        return str(aleatorio.choice(ids_gasto))
+
+    def form_gasto():
+        return {"descricao": "Gasto %d" % next(sequencia), "valor": "42.50",
+                "categoria_id": categoria(), "data_gasto": "2024-06-15T12:00:00"}
+
+    def cria(cliente, url, form):
+        status, corpo = cliente.executa(Requisicao("POST", url, form=form))
+        return json.loads(corpo)["id"]
+
+    def com_etag(url):
+        # o ETag atual é obtido antes, para medir a resposta 304
+        return lambda cliente: Requisicao("GET", url, cabecalhos={"If-None-Match": cliente.etag(url)})
+
+    return {
+        "GET /": lambda cliente: Requisicao("GET", "/"),
+        "GET /categorias": lambda cliente: Requisicao("GET", "/categorias"),
+        "GET /categorias (304)": com_etag("/categorias"),
+        "GET /categorias/<id>": lambda cliente: Requisicao("GET", "/categorias/%s" % categoria()),
+        "GET /gastos": lambda cliente: Requisicao("GET", "/gastos?limite=50"),
+        "GET /gastos (304)": com_etag("/gastos?limite=50"),
+        "GET /gastos?categoria_id": lambda cliente: Requisicao(
+            "GET", "/gastos?limite=50&categoria_id=%s" % categoria()),
+        "GET /gastos?descricao": lambda cliente: Requisicao("GET", "/gastos?limite=50&descricao=Farm"),
+        "GET /gastos?fields": lambda cliente: Requisicao(
+            "GET", "/gastos?limite=50&fields=id,valor,data_gasto"),
+        "GET /gastos/busca": lambda cliente: Requisicao("GET", "/gastos/busca?q=farm&limite=50"),
+        "GET /gastos/export (1 mês)": lambda cliente: Requisicao(
+            "GET", "/gastos/export?data_inicio=2024-03-01T00:00:00&data_fim=2024-03-31T23:59:59"),
+        "GET /gastos/<id>": lambda cliente: Requisicao("GET", "/gastos/%s" % gasto()),
+        "GET /relatorios/por-categoria": lambda cliente: Requisicao("GET", "/relatorios/por-categoria"),
+        "GET /relatorios/por-periodo": lambda cliente: Requisicao(
+            "GET", "/relatorios/por-periodo?granularidade=mes"),
+        "GET /metrics": lambda cliente: Requisicao("GET", "/metrics"),
+        "POST /categorias": lambda cliente: Requisicao(
+            "POST", "/categorias", form={"nome": "Bench %d" % next(sequencia)}),
+        "PUT /categorias/<id>": lambda cliente: Requisicao(
+            "PUT", "/categorias/%s" % categoria_alvo, form={"nome": "Bench %d" % next(sequencia)}),
+        "PATCH /categorias/<id>": lambda cliente: Requisicao(
+            "PATCH", "/categorias/%s" % categoria_alvo, form={"ordem": next(sequencia)}),
+        "DELETE /categoria/<id>": lambda cliente: Requisicao("DELETE", "/categoria/%s" % cria(
+            cliente, "/categorias", {"nome": "Bench %d" % next(sequencia)})),
+        "POST /gastos": lambda cliente: Requisicao("POST", "/gastos", form=form_gasto()),
+        "POST /gastos/bulk (100)": lambda cliente: Requisicao(
+            "POST", "/gastos/bulk", corpo=corpo_bulk, tipo="application/x-ndjson"),
+        "PUT /gastos/<id>": lambda cliente: Requisicao("PUT", "/gastos/%s" % gasto_alvo, form=form_gasto()),
+        "PATCH /gastos/<id>": lambda cliente: Requisicao(
+            "PATCH", "/gastos/%s" % gasto_alvo, form={"valor": "%d.00" % (next(sequencia) % 1000 + 1)}),
+        "DELETE /gasto/<id>": lambda cliente: Requisicao(
+            "DELETE", "/gasto/%s" % cria(cliente, "/gastos", form_gasto())),
+    }
+
+
+def _resultado(modo, nome, requisicoes, concorrencia, status, latencias, duracao):
+    contagem = {}
+    for codigo in status:
+        contagem[str(codigo)] = contagem.get(str(codigo), 0) + 1
+    return {
+        "modo": modo,
+        "rota": nome,
+        "requisicoes": requisicoes,
+        "concorrencia": concorrencia,
+        "status": contagem,
+        "duracao_s": round(duracao, 4),
+        "req_por_s": round(requisicoes / duracao, 1) if duracao else None,
+        "latencia_ms": estatisticas(latencias),
+    }
+
+
+def mede_cliente(app, casos, requisicoes: int, aquecimento: int):
+    """ Mede cada caso pelo test client, uma requisição por vez. """
+    cliente = ClienteFlask(app)
+    resultados = []
+    for nome, monta in casos.items():
+        for _ in range(aquecimento):
+            cliente.executa(monta(cliente))
+        lote = [monta(cliente) for _ in range(requisicoes)]
+        status, latencias = [], []
+        inicio = time.perf_counter()
+        for req in lote:
+            antes = time.perf_counter()
+            status.append(cliente.executa(req)[0])
+            latencias.append(time.perf_counter() - antes)
+        duracao = time.perf_counter() - inicio
+        resultados.append(_resultado("cliente", nome, requisicoes, 1, status, latencias, duracao))
+        print("cliente %-32s %8.1f req/s" % (nome, resultados[-1]["req_por_s"]), file=sys.stderr)
+    return resultados
+
+
+def mede_wsgi(app, casos, requisicoes: int, aquecimento: int, concorrencia: int):
+    """ Mede cada caso em um servidor WSGI local, com uma conexão por thread.
+    """
+    from werkzeug.serving import make_server, WSGIRequestHandler
+
+    class Manipulador(WSGIRequestHandler):
+        # HTTP/1.1 mantém as conexões abertas entre as requisições
+        protocol_version = "HTTP/1.1"
+
+        def log_request(self, *args, **kwargs):
+            pass
+
+    servidor = make_server("127.0.0.1", 0, app, threaded=True, request_handler=Manipulador)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    clientes = [ClienteHTTP("127.0.0.1", servidor.port) for _ in range(concorrencia)]
+    resultados = []
+    try:
+        for nome, monta in casos.items():
+            for _ in range(aquecimento):
+                clientes[0].executa(monta(clientes[0]))
+            # cada thread recebe a sua parte das requisições, já montadas
+            lotes = [[monta(cliente) for _ in range(indice, requisicoes, concorrencia)]
+                     for indice, cliente in enumerate(clientes)]
+            status, latencias = [], []
+
+            def executa_lote(cliente, lote):
+                for req in lote:
+                    antes = time.perf_counter()
+                    codigo = cliente.executa(req)[0]
+                    latencias.append(time.perf_counter() - antes)
+                    status.append(codigo)
+
+            threads = [threading.Thread(target=executa_lote, args=(cliente, lote))
+                       for cliente, lote in zip(clientes, lotes)]
+            inicio = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            duracao = time.perf_counter() - inicio
+            resultados.append(_resultado("wsgi", nome, requisicoes, concorrencia, status, latencias, duracao))
+            print("wsgi    %-32s %8.1f req/s" % (nome, resultados[-1]["req_por_s"]), file=sys.stderr)
+    finally:
+        for cliente in clientes:
+            cliente.fecha()
+        servidor.shutdown()
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--categorias", type=int, default=20)
+    parser.add_argument("--gastos", type=int, default=20000)
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--requisicoes", type=int, default=200, help="requisições medidas por rota")
+    parser.add_argument("--aquecimento", type=int, default=10, help="requisições descartadas por rota")
+    parser.add_argument("--concorrencia", type=int, default=4, help="conexões simultâneas no modo wsgi")
+    parser.add_argument("--modos", default="cliente,wsgi", help="cliente, wsgi ou ambos")
+    parser.add_argument("--rotas", help="mede apenas as rotas cujo nome contém um destes textos (separados por vírgula)")
+    parser.add_argument("--banco", help="arquivo sqlite a usar (padrão: um arquivo temporário)")
+    parser.add_argument("--saida", help="arquivo JSON de resultado (padrão: saída padrão)")
+    args = parser.parse_args()
+
+    # o banco e o nível de log precisam estar definidos antes de importar o app
+    banco = args.banco or os.path.join(tempfile.mkdtemp(prefix="benchmark_"), "db.sqlite3")
+    os.environ["DB_URL"] = "sqlite:///%s" % os.path.abspath(banco)
+    os.environ.setdefault("LOG_NIVEL", "WARNING")
+    from app import app
+    from model import Session
+    from benchmarks.dados import popula_banco
+
+    print("populando %s com %d categorias e %d gastos" % (banco, args.categorias, args.gastos), file=sys.stderr)
+    session = Session()
+    ids_categoria, ids_gasto = popula_banco(session, args.categorias, args.gastos, args.semente)
+    Session.remove()
+
+    casos = monta_casos(ids_categoria, ids_gasto, args.semente)
+    if args.rotas:
+        filtros = args.rotas.split(",")
+        casos = {nome: monta for nome, monta in casos.items() if any(filtro in nome for filtro in filtros)}
+
+    resultados = []
+    modos = args.modos.split(",")
+    if "cliente" in modos:
+        resultados += mede_cliente(app, casos, args.requisicoes, args.aquecimento)
+    if "wsgi" in modos:
+        resultados += mede_wsgi(app, casos, args.requisicoes, args.aquecimento, args.concorrencia)
+
+    grava_resultado({
+        "benchmark": "rotas",
+        "metadados": metadados(),
+        "parametros": vars(args),
+        "resultados": resultados,
+    }, args.saida)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Compara a serialização da listagem de gastos antes e depois da view compilada.
+
+Uso (a partir da pasta meu_app_api):
+    python -m benchmarks.serializacao [--quantidade 100000] [--repeticoes 3]
+"""
+import argparse
+import os
+
+# o benchmark não precisa de banco: usa um sqlite em memória
+os.environ.setdefault("DB_URL", "sqlite://")
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from model.gasto import de_centavos
+from schemas import apresenta_gastos
+from schemas.serializacao import serializa_gastos, orjson
+from benchmarks.dados import gera_objetos
+from benchmarks.medidas import mede
+
+
+def apresenta_gasto_original(gasto, categorias):
+    """ apresenta_gasto como era antes da view compilada, como referência.
+    """
+    def formatar_data_br(dt):
+        if not dt:
+            return None
+        from datetime import timedelta
+        dt_br = dt - timedelta(hours=3)
+        return dt_br.strftime('%Y-%m-%d %H:%M:%S')
+
+    return {
+        "id": gasto.id,
+        "descricao": gasto.descricao,
+        "valor": de_centavos(gasto.valor_centavos),
+        "data_insercao": formatar_data_br(gasto.data_insercao),
+        "data_gasto": formatar_data_br(gasto.data_gasto),
+        "categoria_obj": categorias.get(gasto.categoria_id),
+        "notas": getattr(gasto, "notas", []),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quantidade", type=int, default=100000)
+    parser.add_argument("--repeticoes", type=int, default=3)
+    args = parser.parse_args()
+
+    _, gastos, categorias = gera_objetos(10, args.quantidade)
+    # o mesmo serializador usado pelo Flask ao retornar um dict da view
+    json_flask = DefaultJSONProvider(Flask(__name__))
+
+    casos = {
+        "original (dict + json do Flask)": lambda: json_flask.dumps(
+            {"gastos": [apresenta_gasto_original(gasto, categorias) for gasto in gastos], "proximo_cursor": None}),
+        "apresenta_gastos + json do Flask": lambda: json_flask.dumps(apresenta_gastos(gastos, None, categorias)),
+        "serializa_gastos": lambda: serializa_gastos(gastos, categorias),
+    }
+
+    print("%d gastos, orjson %s" % (args.quantidade, "disponível" if orjson else "ausente"))
+    referencia = None
+    for nome, funcao in casos.items():
+        tempo = min(mede(funcao, args.repeticoes))
+        referencia = referencia or tempo
+        print("%-35s %8.1f ms  %10.0f gastos/s  %5.1fx" % (
+            nome, tempo * 1000, args.quantidade / tempo, referencia / tempo))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+import os
+import zlib
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # o brotli é opcional
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # o zstandard é opcional
+    zstandard = None
+
+
+# respostas menores que isso são enviadas sem compressão (em bytes)
+TAMANHO_MINIMO = int(os.environ.get("COMPRESSAO_TAMANHO_MINIMO", 1024))
+
+# nível de compressão de cada algoritmo
+NIVEL_GZIP = int(os.environ.get("COMPRESSAO_NIVEL_GZIP", 6))
+NIVEL_BR = int(os.environ.get("COMPRESSAO_NIVEL_BR", 4))
+NIVEL_ZSTD = int(os.environ.get("COMPRESSAO_NIVEL_ZSTD", 3))
+
+# tipos de conteúdo que se beneficiam de compressão, além de text/*
+TIPOS_COMPRIMIVEIS = {
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "image/svg+xml",
+}
+
+
+class _Gzip:
+    def __init__(self):
+        self._compressor = zlib.compressobj(NIVEL_GZIP, zlib.DEFLATED, 31)
+
+    def comprime(self, dados):
+        return self._compressor.compress(dados)
+
+    def finaliza(self):
+        return self._compressor.flush()
+
+
+class _Brotli:
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=NIVEL_BR)
+
+    def comprime(self, dados):
+        return self._compressor.process(dados)
+
+    def finaliza(self):
+        return self._compressor.finish()
+
+
+class _Zstd:
+    def __init__(self):
+        self._compressor = zstandard.ZstdCompressor(level=NIVEL_ZSTD).compressobj()
+
+    def comprime(self, dados):
+        return self._compressor.compress(dados)
+
+    def finaliza(self):
+        return self._compressor.flush()
+
+
+# algoritmos disponíveis, em ordem de preferência do servidor
+COMPRESSORES = {}
+if zstandard is not None:
+    COMPRESSORES["zstd"] = _Zstd
+if brotli is not None:
+    COMPRESSORES["br"] = _Brotli
+COMPRESSORES["gzip"] = _Gzip
+
+
+def _comprime_fluxo(partes, compressor):
+    """ Comprime os pedaços de uma resposta em streaming à medida que são
+        gerados.
+    """
+    try:
+        for parte in partes:
+            dados = compressor.comprime(parte)
+            if dados:
+                yield dados
+        yield compressor.finaliza()
+    finally:
+        if hasattr(partes, "close"):
+            partes.close()
+
+
+class Compressao:
+    """ Comprime as respostas do app com o algoritmo negociado pelo
+        Accept-Encoding do cliente (zstd, br ou gzip, conforme os módulos
+        instalados).
+
+        Respostas pequenas, como as de erro, vão sem compressão, assim como as
+        que já têm Content-Encoding ou um tipo de conteúdo já comprimido.
+        Respostas em streaming são comprimidas pedaço a pedaço.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.after_request(self.comprime)
+
+    def _comprimivel(self, response):
+        if request.method == "HEAD" or response.direct_passthrough:
+            return False
+        if response.status_code < 200 or response.status_code in (204, 304):
+            return False
+        if "Content-Encoding" in response.headers:
+            return False
+        mimetype = response.mimetype or ""
+        return mimetype.startswith("text/") or mimetype in TIPOS_COMPRIMIVEIS
+
+    def comprime(self, response):
+        if not self._comprimivel(response):
+            return response
+        # a resposta depende do Accept-Encoding, mesmo quando não é comprimida
+        response.vary.add("Accept-Encoding")
+
+        codificacao = request.accept_encodings.best_match(COMPRESSORES)
+        if codificacao is None:
+            return response
+
+        if response.is_streamed:
+            response.response = _comprime_fluxo(response.response, COMPRESSORES[codificacao]())
+            response.headers.pop("Content-Length", None)
+        else:
+            dados = response.get_data()
+            if len(dados) < TAMANHO_MINIMO:
+                return response
+            compressor = COMPRESSORES[codificacao]()
+            response.set_data(compressor.comprime(dados) + compressor.finaliza())
+
+        response.headers["Content-Encoding"] = codificacao
+        # o ETag da versão comprimida é fraco, como recomendado para
+        # representações com Content-Encoding diferente
+        etag, fraco = response.get_etag()
+        if etag and not fraco:
+            response.set_etag(etag, weak=True)
+        return response
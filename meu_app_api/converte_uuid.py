@@ -0,0 +1,95 @@
+"""Converte as chaves UUID de uma base sqlite entre texto e binário.
+
+Uso (com a API parada):
+    python converte_uuid.py binario [database/db.sqlite3]
+    python converte_uuid.py texto [database/db.sqlite3]
+
+Depois de converter para binário, a API deve ser iniciada com UUID_BINARIO=1.
+"""
+import argparse
+import os
+import sqlite3
+import uuid
+
+from sqlalchemy import create_engine
+from sqlalchemy.pool import NullPool
+
+# colunas que guardam UUIDs, como (tabela, coluna)
+COLUNAS_UUID = [
+    ("categoria", "pk_categoria"),
+    ("gasto", "pk_gasto"),
+    ("gasto", "categoria_id"),
+    ("nota_gasto", "gasto_id"),
+    ("gasto_busca", "pk_gasto"),
+    ("resumo_mensal", "categoria_id"),
+]
+
+
+def _para_blob(valor):
+    return uuid.UUID(valor).bytes
+
+
+def _para_texto(valor):
+    return uuid.UUID(bytes=valor).hex
+
+
+def _refaz_busca(caminho: str):
+    """ Recria as triggers do índice de busca e o preenche de novo, já com
+        as chaves no novo formato.
+    """
+    # importado só aqui: o model se conecta à base de DB_URL ao ser importado
+    from model.busca import cria_busca, reconstroi_busca
+
+    engine = create_engine("sqlite:///%s" % caminho, poolclass=NullPool)
+    with engine.begin() as conexao:
+        cria_busca(conexao)
+        reconstroi_busca(conexao)
+    engine.dispose()
+
+
+def converte_uuids(caminho: str, binario: bool):
+    """ Reescreve as colunas de COLUNAS_UUID no formato pedido, refaz o
+        índice de busca e compacta a base. Valores que já estão no formato de
+        destino são mantidos.
+    """
+    conexao = sqlite3.connect(caminho)
+    conexao.create_function("uuid_para_blob", 1, _para_blob, deterministic=True)
+    conexao.create_function("uuid_para_texto", 1, _para_texto, deterministic=True)
+    funcao, origem = ("uuid_para_blob", "text") if binario else ("uuid_para_texto", "blob")
+
+    # as chaves estrangeiras são reescritas junto das primárias
+    conexao.execute("PRAGMA foreign_keys=OFF")
+    tabelas = {linha[0] for linha in conexao.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+    with conexao:
+        # as triggers do índice de busca procurariam os gastos de cada nota
+        # reescrita com as chaves em formatos diferentes, apagando as notas
+        # do índice: elas são removidas e recriadas depois da conversão
+        triggers = [linha[0] for linha in conexao.execute(
+            "SELECT name FROM sqlite_master WHERE type='trigger' AND name LIKE '%fts%'")]
+        for trigger in triggers:
+            conexao.execute("DROP TRIGGER %s" % trigger)
+        for tabela, coluna in COLUNAS_UUID:
+            if tabela not in tabelas:
+                continue
+            cursor = conexao.execute(
+                "UPDATE %s SET %s = %s(%s) WHERE typeof(%s) = ?" % (tabela, coluna, funcao, coluna, coluna),
+                (origem,))
+            print("%s.%s: %d valores convertidos" % (tabela, coluna, cursor.rowcount))
+    if "gasto_fts" in tabelas:
+        _refaz_busca(caminho)
+    conexao.execute("VACUUM")
+    conexao.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("formato", choices=["binario", "texto"])
+    parser.add_argument("caminho", nargs="?", default="database/db.sqlite3")
+    args = parser.parse_args()
+    # o model, usado para refazer o índice de busca, aponta para a base convertida
+    os.environ["DB_URL"] = "sqlite:///%s" % os.path.abspath(args.caminho)
+
+    tamanho_antes = os.path.getsize(args.caminho)
+    converte_uuids(args.caminho, args.formato == "binario")
+    tamanho_depois = os.path.getsize(args.caminho)
+    print("Tamanho da base: %d -> %d bytes" % (tamanho_antes, tamanho_depois))
@@ -0,0 +1,123 @@
+import csv
+import io
+import zlib
+
+from schemas import apresenta_gasto
+from schemas.serializacao import linhas_ndjson
+
+
+# quantidade de bytes acumulada antes de cada envio ao cliente
+TAMANHO_BLOCO = 64 * 1024
+
+# colunas do CSV exportado, na ordem em que aparecem no arquivo
+COLUNAS_CSV = ["id", "descricao", "valor", "data_gasto", "data_insercao",
+               "categoria_id", "categoria_nome"]
+# campos de GastoViewSchema lidos do banco para montar essas colunas
+CAMPOS_CSV = ("id", "descricao", "valor", "data_insercao", "data_gasto", "categoria_obj")
+
+
+def _em_blocos(pedacos):
+    """ Agrupa os pedaços já codificados em blocos de TAMANHO_BLOCO bytes,
+        evitando um envio ao cliente para cada linha exportada.
+    """
+    bloco = []
+    tamanho = 0
+    for dados in pedacos:
+        bloco.append(dados)
+        tamanho += len(dados)
+        if tamanho >= TAMANHO_BLOCO:
+            yield b"".join(bloco)
+            bloco = []
+            tamanho = 0
+    if bloco:
+        yield b"".join(bloco)
+
+
+def linhas_csv(gastos, categorias, fuso=None, cabecalho: bool = True):
+    """ Gera o cabeçalho e uma linha CSV por gasto.
+    """
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    if cabecalho:
+        escritor.writerow(COLUNAS_CSV)
+        # o cabeçalho é enviado mesmo quando não há gastos
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    for gasto in gastos:
+        # o CSV não tem colunas para as notas
+        dados = apresenta_gasto(gasto, categorias, fuso, notas=False)
+        categoria = dados["categoria_obj"] or {}
+        escritor.writerow([
+            dados["id"], dados["descricao"], dados["valor"], dados["data_gasto"],
+            dados["data_insercao"], categoria.get("id"), categoria.get("nome"),
+        ])
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def comprime_gzip(blocos, nivel: int = 6):
+    """ Comprime os blocos em formato gzip à medida que são gerados.
+    """
+    compressor = zlib.compressobj(nivel, zlib.DEFLATED, 31)
+    for bloco in blocos:
+        dados = compressor.compress(bloco)
+        if dados:
+            yield dados
+    yield compressor.flush()
+
+
+def exporta_gastos(gastos, categorias, formato: str = "ndjson", gzip: bool = False, fuso=None,
+                   campos=None):
+    """ Retorna um gerador com o conteúdo da exportação dos gastos, pronto para
+        ser usado como corpo de uma resposta em streaming.
+
+        categorias: dict de id -> categoria apresentada (ver cache_categorias).
+        fuso: fuso horário em que as datas são exportadas.
+        campos: campos de GastoViewSchema incluídos no NDJSON (todos, se
+        None); as notas, se incluídas, devem vir carregadas com os gastos.
+    """
+    if formato == "csv":
+        linhas = linhas_csv(gastos, categorias, fuso)
+    else:
+        linhas = linhas_ndjson(gastos, categorias, fuso, campos)
+    blocos = _em_blocos(linhas)
+    if gzip:
+        blocos = comprime_gzip(blocos)
+    return blocos
+
+
+class ExportacaoEmLotes:
+    """ Exportação alimentada com lotes de gastos, para quando os gastos
+        chegam do banco aos poucos e de forma assíncrona (modo ASGI).
+
+        Cada chamada de lote retorna o trecho correspondente do arquivo, e
+        finaliza retorna o que falta dele. O cabeçalho do CSV e a compressão
+        gzip continuam de um lote para o outro.
+    """
+
+    def __init__(self, categorias, formato: str = "ndjson", gzip: bool = False, fuso=None,
+                 campos=None):
+        self.categorias = categorias
+        self.formato = formato
+        self.fuso = fuso
+        self.campos = campos
+        self._compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if gzip else None
+        self._primeiro = True
+
+    def lote(self, gastos) -> bytes:
+        if self.formato == "csv":
+            linhas = linhas_csv(gastos, self.categorias, self.fuso, cabecalho=self._primeiro)
+        else:
+            linhas = linhas_ndjson(gastos, self.categorias, self.fuso, self.campos)
+        self._primeiro = False
+        dados = b"".join(linhas)
+        return self._compressor.compress(dados) if self._compressor else dados
+
+    def finaliza(self) -> bytes:
+        # sem nenhum lote, o CSV ainda leva o cabeçalho
+        dados = self.lote([]) if self._primeiro else b""
+        if self._compressor:
+            dados += self._compressor.flush()
+        return dados
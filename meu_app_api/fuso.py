@@ -0,0 +1,47 @@
+import os
+from datetime import timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+# As datas são gravadas em UTC e convertidas para o fuso de cada requisição,
+# informado pelo parâmetro tz ou pelo cabeçalho X-Timezone (nomes IANA, como
+# "America/Sao_Paulo"). Sem eles, vale o fuso padrão.
+FUSO_PADRAO = os.environ.get("TZ_PADRAO", "America/Sao_Paulo")
+
+
+@lru_cache(maxsize=128)
+def obtem_fuso(nome: str):
+    """ Retorna o fuso horário de nome informado. Lança ValueError se o fuso
+        não existir.
+    """
+    try:
+        return ZoneInfo(nome)
+    except (ZoneInfoNotFoundError, ValueError) as e:
+        raise ValueError("fuso horário desconhecido: %s" % nome) from e
+
+
+def fuso_padrao():
+    return obtem_fuso(FUSO_PADRAO)
+
+
+def localiza(dt, fuso):
+    """ Interpreta uma data sem fuso como horário do fuso informado. Datas
+        que já têm fuso são mantidas.
+    """
+    if dt is not None and dt.tzinfo is None:
+        return dt.replace(tzinfo=fuso)
+    return dt
+
+
+def formata_datas(datas, fuso):
+    """ Formata, em uma única passada, datas do banco (em UTC) no horário do
+        fuso informado, no formato AAAA-MM-DD HH:MM:SS.
+    """
+    utc = timezone.utc
+    # isoformat equivale ao strftime, mas é bem mais rápido; o [:19] descarta
+    # o deslocamento do fuso
+    return [
+        None if dt is None else
+        (dt if dt.tzinfo is not None else dt.replace(tzinfo=utc)).astimezone(fuso).isoformat(" ", "seconds")[:19]
+        for dt in datas
+    ]
@@ -0,0 +1,215 @@
+import csv
+import io
+import json
+from datetime import timezone
+
+from pydantic import ValidationError
+from sqlalchemy import bindparam
+
+from fuso import localiza
+from model.base import gera_uuid, agora_utc
+from model import Gasto, acumula_resumo, adiciona_acumulado, chave_resumo, cache_categorias, \
+    incrementa_versao
+from schemas import GastoSchema
+
+
+# tipos de conteúdo aceitos na importação em lote
+FORMATOS_JSON = ("application/json",)
+FORMATOS_NDJSON = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+FORMATOS_CSV = ("text/csv",)
+
+# limite de erros detalhados devolvidos na resposta
+MAX_ERROS_DETALHADOS = 1000
+
+
+def le_linhas(request):
+    """ Lê o corpo do request como uma sequência de (número da linha, dict).
+
+        JSON é lido de uma vez; NDJSON e CSV são lidos do stream linha a
+        linha, sem carregar o arquivo inteiro em memória.
+        Lança ValueError se o tipo de conteúdo não for suportado.
+    """
+    mimetype = request.mimetype
+    if mimetype in FORMATOS_JSON:
+        linhas = request.get_json()
+        if not isinstance(linhas, list):
+            raise ValueError("o corpo JSON deve ser uma lista de gastos")
+        return enumerate(linhas, start=1)
+
+    texto = io.TextIOWrapper(request.stream, encoding="utf-8", newline="")
+    if mimetype in FORMATOS_NDJSON:
+        return _le_ndjson(texto)
+    if mimetype in FORMATOS_CSV:
+        return _le_csv(texto)
+    raise ValueError("tipo de conteúdo não suportado: '%s'" % mimetype)
+
+
+def _le_ndjson(texto):
+    for numero, linha in enumerate(texto, start=1):
+        linha = linha.strip()
+        if not linha:
+            continue
+        try:
+            yield numero, json.loads(linha)
+        except ValueError:
+            # a linha é repassada como texto para ser rejeitada na validação
+            yield numero, linha
+
+
+def _le_csv(texto):
+    # a linha 1 é o cabeçalho, então os dados começam na linha 2
+    for numero, linha in enumerate(csv.DictReader(texto), start=2):
+        # colunas vazias no CSV equivalem a campos não informados
+        yield numero, {k: v for k, v in linha.items() if v not in (None, "")}
+
+
+def descreve_erro(e: ValidationError):
+    """ Resume os erros de validação do pydantic em uma única mensagem.
+    """
+    return "; ".join(
+        "%s: %s" % (".".join(str(p) for p in erro["loc"]) or "linha", erro["msg"])
+        for erro in e.errors()
+    )
+
+
+def _memoriza(processa):
+    """ Guarda o resultado da conversão de valores repetidos (categoria e
+        datas costumam se repetir muito dentro de um mesmo arquivo).
+    """
+    cache = {}
+
+    def processa_memorizado(valor):
+        try:
+            return cache[valor]
+        except KeyError:
+            resultado = cache[valor] = processa(valor)
+            return resultado
+    return processa_memorizado
+
+
+def _memoriza_chave(funcao):
+    """ Versão de _memoriza para funções de dois argumentos.
+    """
+    cache = {}
+
+    def funcao_memorizada(a, b):
+        try:
+            return cache[a, b]
+        except KeyError:
+            resultado = cache[a, b] = funcao(a, b)
+            return resultado
+    return funcao_memorizada
+
+
+def _prepara_insercao(dialect):
+    """ Compila o INSERT de gastos uma única vez e monta os conversores de
+        cada coluna, para que os lotes sejam enviados direto ao driver.
+    """
+    tabela = Gasto.__table__
+    colunas = [tabela.c.pk_gasto, tabela.c.descricao, tabela.c.valor_centavos,
+               tabela.c.categoria_id, tabela.c.data_gasto, tabela.c.data_insercao]
+    repetidas = (tabela.c.categoria_id, tabela.c.data_gasto, tabela.c.data_insercao)
+
+    conversores = {}
+    for coluna in colunas:
+        processa = coluna.type.dialect_impl(dialect).bind_processor(dialect)
+        if processa is None:
+            processa = _identidade
+        elif coluna in repetidas:
+            processa = _memoriza(processa)
+        conversores[coluna.key] = processa
+
+    compilado = tabela.insert().values(
+        {coluna: bindparam(coluna.key) for coluna in colunas}
+    ).compile(dialect=dialect)
+    # ordem dos parâmetros esperada pelo driver, quando ele é posicional
+    ordem = compilado.positiontup if compilado.positional else None
+    return str(compilado), ordem, conversores
+
+
+def _identidade(valor):
+    return valor
+
+
+def importa_gastos(session, linhas, tamanho_lote: int = 5000, fuso=None):
+    """ Valida e insere os gastos em lotes, cada lote em sua própria transação.
+
+        As categorias vêm do cache em memória e cada lote é enviado ao
+        banco com um único executemany, já com os valores convertidos para o
+        formato de armazenamento. Retorna a quantidade de gastos inseridos, a
+        quantidade de erros e a lista de erros por linha. Datas sem fuso são
+        interpretadas no fuso informado (ou em UTC).
+    """
+    categorias = cache_categorias.obtem(session)
+    sql, ordem, conv = _prepara_insercao(session.get_bind().dialect)
+    conv_id, conv_descricao, conv_valor = conv["pk_gasto"], conv["descricao"], conv["valor_centavos"]
+    conv_categoria, conv_data_gasto = conv["categoria_id"], conv["data_gasto"]
+    agora = agora_utc()
+    data_insercao = conv["data_insercao"](agora)
+    inseridos = 0
+    total_erros = 0
+    erros = []
+
+    def registra_erro(numero, mensagem):
+        nonlocal total_erros
+        total_erros += 1
+        if len(erros) < MAX_ERROS_DETALHADOS:
+            erros.append({"linha": numero, "mensagem": mensagem})
+
+    def grava(lote, numeros, acumulados):
+        nonlocal inseridos
+        if ordem:
+            lote = [tuple([valores[chave] for chave in ordem]) for valores in lote]
+        try:
+            session.connection().exec_driver_sql(sql, lote)
+            # o resumo mensal e a versão de gasto são atualizados na mesma
+            # transação do lote
+            acumula_resumo(session, acumulados)
+            incrementa_versao(session, "gasto")
+            session.commit()
+            inseridos += len(lote)
+        except Exception as e:
+            session.rollback()
+            for numero in numeros:
+                registra_erro(numero, "lote rejeitado pelo banco: %s" % e.__class__.__name__)
+
+    # a chave do resumo também se repete bastante entre as linhas
+    chave = _memoriza_chave(chave_resumo)
+
+    lote, numeros, acumulados = [], [], {}
+    for numero, linha in linhas:
+        if not isinstance(linha, dict):
+            registra_erro(numero, "linha não é um objeto JSON")
+            continue
+        try:
+            form = GastoSchema(**linha)
+            valor_centavos = form.valor_centavos
+        except ValidationError as e:
+            registra_erro(numero, descreve_erro(e))
+            continue
+        except ValueError as e:
+            registra_erro(numero, "valor: %s" % e)
+            continue
+        if form.categoria_id not in categorias:
+            registra_erro(numero, "categoria '%s' não encontrada" % form.categoria_id)
+            continue
+
+        data_gasto = localiza(form.data_gasto, fuso or timezone.utc) or agora
+        lote.append({
+            "pk_gasto": conv_id(gera_uuid()),
+            "descricao": conv_descricao(form.descricao),
+            "valor_centavos": conv_valor(valor_centavos),
+            "categoria_id": conv_categoria(form.categoria_id),
+            "data_gasto": conv_data_gasto(data_gasto),
+            "data_insercao": data_insercao,
+        })
+        adiciona_acumulado(acumulados, chave(form.categoria_id, data_gasto), valor_centavos)
+        numeros.append(numero)
+        if len(lote) >= tamanho_lote:
+            grava(lote, numeros, acumulados)
+            lote, numeros, acumulados = [], [], {}
+
+    if lote:
+        grava(lote, numeros, acumulados)
+
+    return inseridos, total_erros, erros
@@ -1,24 +1,78 @@
+from datetime import datetime, timezone
 from logging.config import dictConfig
+from logging.handlers import QueueHandler, QueueListener
+import atexit
+import copy
+import json
 import logging
 import os
+import queue
 
 
 log_path = "log/"
-# Verifica se o diretorio para armexanar os logs não existe
-if not os.path.exists(log_path):
-   # então cria o diretorio
-   os.makedirs(log_path)
 
+# nível mínimo registrado e rotação dos arquivos de log
+LOG_NIVEL = os.environ.get("LOG_NIVEL", "INFO")
+LOG_TAMANHO_MAXIMO = int(os.environ.get("LOG_TAMANHO_MAXIMO", 10 * 1024 * 1024))
+LOG_ARQUIVOS_ANTIGOS = int(os.environ.get("LOG_ARQUIVOS_ANTIGOS", 5))
 
-dictConfig({
+# atributos de todo LogRecord; os demais vêm do parâmetro extra das chamadas
+_ATRIBUTOS_PADRAO = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class FormatadorJSON(logging.Formatter):
+    """ Formata cada registro como uma linha JSON, incluindo os campos
+        passados em extra.
+    """
+
+    def format(self, record):
+        dados = {
+            "momento": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "mensagem": record.getMessage(),
+            "funcao": record.funcName,
+            "linha": record.lineno,
+            "arquivo": record.pathname,
+            "pid": record.process,
+            "thread": record.threadName,
+        }
+        for atributo, valor in vars(record).items():
+            if atributo not in _ATRIBUTOS_PADRAO:
+                dados[atributo] = valor
+        if record.exc_info:
+            dados["excecao"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            dados["excecao"] = record.exc_text
+        return json.dumps(dados, ensure_ascii=False, default=str)
+
+
+class HandlerFila(QueueHandler):
+    """ Enfileira os registros para escrita em segundo plano, mantendo o
+        traceback separado da mensagem (em exc_text).
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+CONFIG_LOGGING = {
     "version": 1,
-    "disable_existing_loggers": True,
+    # mantém os loggers criados antes desta configuração, como os do model
+    "disable_existing_loggers": False,
     "formatters": {
         "default": {
             "format": "[%(asctime)s] %(levelname)-4s %(funcName)s() L%(lineno)-4d %(message)s",
         },
-        "detailed": {
-            "format": "[%(asctime)s] %(levelname)-4s %(funcName)s() L%(lineno)-4d %(message)s - call_trace=%(pathname)s L%(lineno)-4d",
+        "json": {
+            "()": FormatadorJSON,
         }
     },
     "handlers": {
@@ -39,19 +93,27 @@ dictConfig({
         # },
         "error_file": {
             "class": "logging.handlers.RotatingFileHandler",
-            "formatter": "detailed",
+            "formatter": "json",
             "filename": "log/gunicorn.error.log",
-            "maxBytes": 10000,
-            "backupCount": 10,
-            "delay": "True",
+            "maxBytes": LOG_TAMANHO_MAXIMO,
+            "backupCount": LOG_ARQUIVOS_ANTIGOS,
+            "delay": True,
         },
         "detailed_file": {
             "class": "logging.handlers.RotatingFileHandler",
-            "formatter": "detailed",
+            "formatter": "json",
             "filename": "log/gunicorn.detailed.log",
-            "maxBytes": 10000,
-            "backupCount": 10,
-            "delay": "True",
+            "maxBytes": LOG_TAMANHO_MAXIMO,
+            "backupCount": LOG_ARQUIVOS_ANTIGOS,
+            "delay": True,
+        },
+        "slow_sql_file": {
+            "class": "logging.handlers.RotatingFileHandler",
+            "formatter": "json",
+            "filename": "log/sql.lentas.log",
+            "maxBytes": LOG_TAMANHO_MAXIMO,
+            "backupCount": LOG_ARQUIVOS_ANTIGOS,
+            "delay": True,
         }
     },
     "loggers": {
@@ -59,13 +121,72 @@ dictConfig({
             "handlers": ["console", "error_file"],  #, email],
             "level": "INFO",
             "propagate": False,
+        },
+        # consultas lentas do perfil de SQL, em um arquivo só delas
+        "sql.lentas": {
+            "handlers": ["slow_sql_file"],
+            "level": "WARNING",
+            "propagate": False,
         }
     },
     "root": {
         "handlers": ["console", "detailed_file"],
-        "level": "INFO",
+        "level": LOG_NIVEL,
     }
-})
+}
+
+# loggers cujos handlers passam a rodar em segundo plano (None é o root)
+LOGGERS_EM_FILA = [None, "gunicorn.error", "sql.lentas"]
+
+_ouvintes = []
+_pid_configurado = None
+
+
+def configura_logging():
+    """ Aplica o CONFIG_LOGGING uma única vez por processo.
+
+        Os loggers de LOGGERS_EM_FILA ficam apenas com um HandlerFila, que
+        enfileira os registros, e os handlers configurados são executados
+        por um QueueListener em uma thread própria. Assim a escrita em disco
+        ou no console não bloqueia as requisições.
+    """
+    global _pid_configurado
+    if _pid_configurado == os.getpid():
+        return
+    _pid_configurado = os.getpid()
+
+    # Verifica se o diretorio para armazenar os logs não existe
+    if not os.path.exists(log_path):
+        # então cria o diretorio
+        os.makedirs(log_path)
+
+    dictConfig(CONFIG_LOGGING)
+    for nome in LOGGERS_EM_FILA:
+        alvo = logging.getLogger(nome)
+        fila = queue.SimpleQueue()
+        ouvinte = QueueListener(fila, *alvo.handlers, respect_handler_level=True)
+        alvo.handlers = [HandlerFila(fila)]
+        ouvinte.start()
+        _ouvintes.append(ouvinte)
+
+
+def encerra_logging():
+    """ Grava os registros ainda na fila e encerra as threads de escrita.
+    """
+    while _ouvintes:
+        _ouvintes.pop().stop()
+
+
+def _reconfigura_apos_fork():
+    # as threads de escrita não sobrevivem ao fork (workers do gunicorn com
+    # --preload): o processo filho descarta as do pai e cria as suas
+    _ouvintes.clear()
+    configura_logging()
+
+
+configura_logging()
+atexit.register(encerra_logging)
+os.register_at_fork(after_in_child=_reconfigura_apos_fork)
 
 
 logger = logging.getLogger(__name__)
@@ -0,0 +1,196 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from flask import request
+from sqlalchemy import event
+
+
+# limites dos histogramas, no formato do Prometheus (buckets "le")
+LIMITES_DURACAO = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LIMITES_BYTES = (128, 512, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+LIMITES_CONSULTAS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _rotulos(nomes, valores):
+    return ",".join('%s="%s"' % (nome, str(valor).replace("\\", "\\\\").replace('"', '\\"'))
+                    for nome, valor in zip(nomes, valores))
+
+
+def _serie(nome, rotulos):
+    return "%s{%s}" % (nome, rotulos) if rotulos else nome
+
+
+class Contador:
+    """ Contador por combinação de rótulos. """
+
+    def __init__(self, nome, descricao, rotulos=()):
+        self.nome = nome
+        self.descricao = descricao
+        self.rotulos = rotulos
+        self.series = {}
+
+    def incrementa(self, valores=(), quantidade=1):
+        self.series[valores] = self.series.get(valores, 0) + quantidade
+
+    def exporta(self):
+        yield "# HELP %s %s" % (self.nome, self.descricao)
+        yield "# TYPE %s counter" % self.nome
+        for valores, total in self.series.items():
+            yield "%s %s" % (_serie(self.nome, _rotulos(self.rotulos, valores)), total)
+
+
+class Histograma:
+    """ Histograma por combinação de rótulos. Cada série guarda a contagem de
+        cada faixa (não acumulada), a soma e o total de observações.
+    """
+
+    def __init__(self, nome, descricao, limites, rotulos=()):
+        self.nome = nome
+        self.descricao = descricao
+        self.limites = limites
+        self.rotulos = rotulos
+        self.series = {}
+
+    def observa(self, valores, valor):
+        serie = self.series.get(valores)
+        if serie is None:
+            serie = self.series[valores] = [0] * (len(self.limites) + 1) + [0]
+        serie[bisect_left(self.limites, valor)] += 1
+        serie[-1] += valor
+
+    def exporta(self):
+        yield "# HELP %s %s" % (self.nome, self.descricao)
+        yield "# TYPE %s histogram" % self.nome
+        for valores, serie in self.series.items():
+            rotulos = _rotulos(self.rotulos, valores)
+            separador = "," if rotulos else ""
+            acumulado = 0
+            for limite, contagem in zip(self.limites, serie):
+                acumulado += contagem
+                yield '%s_bucket{%s%sle="%s"} %d' % (self.nome, rotulos, separador, limite, acumulado)
+            total = acumulado + serie[-2]
+            yield '%s_bucket{%s%sle="+Inf"} %d' % (self.nome, rotulos, separador, total)
+            yield "%s %s" % (_serie(self.nome + "_sum", rotulos), serie[-1])
+            yield "%s %d" % (_serie(self.nome + "_count", rotulos), total)
+
+
+class Metricas:
+    """ Mede as requisições do app e as consultas feitas na engine, e expõe
+        as medidas no formato texto do Prometheus.
+
+        As medidas ficam na memória de cada processo: com vários workers do
+        gunicorn, cada coleta vê apenas o worker que atendeu o /metrics
+        (identificado pelo rótulo pid de processo_info).
+    """
+
+    def __init__(self, app=None, engine=None):
+        self._trava = threading.Lock()
+        # estado da requisição em andamento na thread
+        self._local = threading.local()
+        self.engine = engine
+
+        self.requisicoes = Contador(
+            "http_requisicoes_total", "Requisições atendidas.", ("metodo", "rota", "status"))
+        self.duracao = Histograma(
+            "http_duracao_segundos", "Tempo de atendimento das requisições, até o envio dos cabeçalhos.",
+            LIMITES_DURACAO, ("metodo", "rota"))
+        self.tamanho = Histograma(
+            "http_resposta_bytes", "Tamanho do corpo das respostas (respostas em streaming não entram).",
+            LIMITES_BYTES, ("metodo", "rota"))
+        self.consultas_requisicao = Histograma(
+            "db_consultas_por_requisicao", "Consultas ao banco feitas em cada requisição.",
+            LIMITES_CONSULTAS, ("metodo", "rota"))
+        self.duracao_db_requisicao = Histograma(
+            "db_duracao_por_requisicao_segundos", "Tempo gasto no banco em cada requisição.",
+            LIMITES_DURACAO, ("metodo", "rota"))
+        self.consultas = Contador("db_consultas_total", "Consultas executadas no banco.")
+        self.duracao_db = Contador("db_duracao_segundos_total", "Tempo total gasto em consultas ao banco.")
+
+        if app is not None:
+            self.init_app(app, engine)
+
+    def init_app(self, app, engine=None):
+        if engine is not None:
+            self.engine = engine
+        app.before_request(self._inicia_requisicao)
+        app.after_request(self._registra_requisicao)
+        if self.engine is not None:
+            self.observa_engine(self.engine)
+
+    def observa_engine(self, engine):
+        """ Passa a medir também as consultas feitas em outra engine, como a
+            de leitura. O pool exportado continua sendo o da engine principal.
+        """
+        event.listen(engine, "before_cursor_execute", self._inicia_consulta)
+        event.listen(engine, "after_cursor_execute", self._registra_consulta)
+
+    def _inicia_requisicao(self):
+        local = self._local
+        local.inicio = time.perf_counter()
+        local.consultas = 0
+        local.duracao_db = 0.0
+
+    def _registra_requisicao(self, response):
+        local = self._local
+        inicio = getattr(local, "inicio", None)
+        if inicio is None:
+            return response
+        duracao = time.perf_counter() - inicio
+        local.inicio = None
+        regra = request.url_rule
+        rotulos = (request.method, regra.rule if regra is not None else "desconhecida")
+        tamanho = None if response.is_streamed else response.content_length
+
+        with self._trava:
+            self.requisicoes.incrementa(rotulos + (response.status_code,))
+            self.duracao.observa(rotulos, duracao)
+            if tamanho is not None:
+                self.tamanho.observa(rotulos, tamanho)
+            self.consultas_requisicao.observa(rotulos, local.consultas)
+            self.duracao_db_requisicao.observa(rotulos, local.duracao_db)
+        return response
+
+    def _inicia_consulta(self, conn, cursor, statement, parameters, context, executemany):
+        context._inicio_metricas = time.perf_counter()
+
+    def _registra_consulta(self, conn, cursor, statement, parameters, context, executemany):
+        duracao = time.perf_counter() - context._inicio_metricas
+        local = self._local
+        if getattr(local, "inicio", None) is not None:
+            local.consultas += 1
+            local.duracao_db += duracao
+        with self._trava:
+            self.consultas.incrementa()
+            self.duracao_db.incrementa(quantidade=duracao)
+
+    def _exporta_pool(self):
+        pool = self.engine.pool if self.engine is not None else None
+        # apenas o QueuePool (usado com bases em arquivo) mantém esses números
+        if pool is None or not hasattr(pool, "checkedout"):
+            return
+        for nome, descricao, valor in (
+            ("db_pool_tamanho", "Conexões mantidas no pool.", pool.size()),
+            ("db_pool_em_uso", "Conexões em uso.", pool.checkedout()),
+            ("db_pool_livres", "Conexões livres no pool.", pool.checkedin()),
+            ("db_pool_excedentes", "Conexões abertas além do tamanho do pool.", max(pool.overflow(), 0)),
+        ):
+            yield "# HELP %s %s" % (nome, descricao)
+            yield "# TYPE %s gauge" % nome
+            yield "%s %d" % (nome, valor)
+
+    def exporta(self) -> str:
+        """ Retorna todas as medidas no formato texto do Prometheus.
+        """
+        linhas = [
+            "# HELP processo_info Processo que respondeu a coleta.",
+            "# TYPE processo_info gauge",
+            'processo_info{pid="%d"} 1' % os.getpid(),
+        ]
+        with self._trava:
+            for metrica in (self.requisicoes, self.duracao, self.tamanho, self.consultas_requisicao,
+                            self.duracao_db_requisicao, self.consultas, self.duracao_db):
+                linhas.extend(metrica.exporta())
+        linhas.extend(self._exporta_pool())
+        return "\n".join(linhas) + "\n"
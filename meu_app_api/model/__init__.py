@@ -1,6 +1,7 @@
 from sqlalchemy_utils import database_exists, create_database
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.engine import make_url
 import os
 
 # importando os elementos definidos no modelo
@@ -10,6 +11,16 @@ from model.base import Base
 from model.categoria import Categoria
 from model.gasto import Gasto
 from model.notagasto import NotaGasto
+from model.resumo import ResumoMensal, reconstroi_resumo, acumula_resumo, \
+    adiciona_acumulado, chave_resumo, chaves_afetadas, recalcula_resumo
+from model.versao import VersaoTabela, versao_tabela, incrementa_versao
+from model.cache_categoria import cache_categorias
+from model.busca import cria_busca, reconstroi_busca, busca_gastos
+from model.migracoes import aplica_migracoes, marca_versao_atual
+from model.consultas import ORDEM_GASTOS, filtros_gasto, condicao_cursor, projecao_gasto, \
+    totais_por_categoria, totais_por_periodo
+from model.leitura import SessaoRoteada, CopiaLeitura, usa_leitura, na_principal
+from model.perfil_conexao import PERFIL_SQL, ConexaoContadora
 
 db_path = "database/"
 # Verifica se o diretorio não existe
@@ -17,18 +28,122 @@ if not os.path.exists(db_path):
    # então cria o diretorio
    os.makedirs(db_path)
 
-# url de acesso ao banco (essa é uma url de acesso ao sqlite local)
-db_url = 'sqlite:///%s/db.sqlite3' % db_path
+# url de acesso ao banco (por padrão, uma url de acesso ao sqlite local)
+db_url = os.environ.get("DB_URL", 'sqlite:///%s/db.sqlite3' % db_path)
+
+# configuração do pool de conexões, ajustável por variáveis de ambiente
+pool_config = {
+    "pool_size": int(os.environ.get("DB_POOL_SIZE", 5)),
+    "max_overflow": int(os.environ.get("DB_MAX_OVERFLOW", 10)),
+    "pool_timeout": int(os.environ.get("DB_POOL_TIMEOUT", 30)),
+    "pool_recycle": int(os.environ.get("DB_POOL_RECYCLE", -1)),
+    "pool_pre_ping": os.environ.get("DB_POOL_PRE_PING", "0") == "1",
+}
+
+# PRAGMAs aplicados a cada nova conexão com o sqlite. O modo WAL permite
+# leituras concorrentes a uma escrita e o busy_timeout faz um escritor
+# aguardar o lock em vez de falhar com "database is locked".
+sqlite_pragmas = {
+    "journal_mode": os.environ.get("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": int(os.environ.get("SQLITE_BUSY_TIMEOUT", 5000)),
+    "cache_size": int(os.environ.get("SQLITE_CACHE_SIZE", -20000)),
+    "mmap_size": int(os.environ.get("SQLITE_MMAP_SIZE", 268435456)),
+}
+
+url = make_url(db_url)
+if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+    # o sqlite em memória usa um pool próprio, que não aceita essas opções
+    pool_config = {}
+
+if url.get_backend_name() == "sqlite" and PERFIL_SQL:
+    # com o perfil de SQL ativo, os cursores contam as linhas lidas
+    pool_config["connect_args"] = {"factory": ConexaoContadora}
 
 # cria a engine de conexão com o banco
-engine = create_engine(db_url, echo=False)
+engine = create_engine(url, echo=False, **pool_config)
+
+
+@event.listens_for(engine, "connect")
+def configura_sqlite(dbapi_connection, connection_record):
+    """ Aplica os PRAGMAs configurados a cada conexão aberta com o sqlite.
+    """
+    if engine.dialect.name != "sqlite":
+        return
+    cursor = dbapi_connection.cursor()
+    for pragma, valor in sqlite_pragmas.items():
+        cursor.execute("PRAGMA %s=%s" % (pragma, valor))
+    cursor.close()
+
+
+# engine das leituras das rotas GET: uma réplica somente leitura
+# (DB_URL_LEITURA) ou uma cópia da base sqlite refeita a cada
+# DB_COPIA_LEITURA_INTERVALO segundos. Sem nenhuma das duas, as leituras usam
+# a própria engine principal.
+db_url_leitura = os.environ.get("DB_URL_LEITURA")
+intervalo_copia = float(os.environ.get("DB_COPIA_LEITURA_INTERVALO", 0))
+copia_leitura = None
+if db_url_leitura:
+    url_leitura = make_url(db_url_leitura)
+elif intervalo_copia > 0:
+    if url.get_backend_name() != "sqlite" or url.database in (None, "", ":memory:"):
+        raise RuntimeError("DB_COPIA_LEITURA_INTERVALO exige uma base sqlite em arquivo")
+    raiz, extensao = os.path.splitext(url.database)
+    url_leitura = url.set(database=raiz + ".leitura" + extensao)
+    copia_leitura = CopiaLeitura(url.database, url_leitura.database, intervalo_copia,
+                                 sqlite_pragmas["busy_timeout"])
+else:
+    url_leitura = None
 
-# Instancia um criador de seção com o banco
-Session = sessionmaker(bind=engine)
 
-# cria o banco se ele não existir 
+def configura_sqlite_leitura(dbapi_connection, connection_record):
+    """ Aplica os PRAGMAs configurados às conexões de leitura com o
+        sqlite, que também passam a recusar escritas.
+    """
+    if engine_leitura.dialect.name != "sqlite":
+        return
+    cursor = dbapi_connection.cursor()
+    for pragma, valor in sqlite_pragmas.items():
+        # o modo do journal é definido por quem escreve na base
+        if pragma != "journal_mode":
+            cursor.execute("PRAGMA %s=%s" % (pragma, valor))
+    cursor.execute("PRAGMA query_only=1")
+    cursor.close()
+
+
+if url_leitura is None:
+    engine_leitura = engine
+else:
+    engine_leitura = create_engine(url_leitura, echo=False, **pool_config)
+    event.listen(engine_leitura, "connect", configura_sqlite_leitura)
+
+# segundos, depois de uma escrita, em que as leituras do mesmo cliente ainda
+# vão para a engine principal, para que ele veja o que acabou de gravar
+janela_leitura = float(os.environ.get("DB_LEITURA_JANELA", 2 * intervalo_copia if copia_leitura else 5))
+
+# Instancia um criador de seção com o banco. O scoped_session entrega a mesma
+# sessão durante todo o request; ela é encerrada no teardown do app.
+Session = scoped_session(sessionmaker(class_=SessaoRoteada, bind=engine, engine_leitura=engine_leitura))
+
+# cria o banco se ele não existir
 if not database_exists(engine.url):
-    create_database(engine.url) 
+    create_database(engine.url)
+
+# bases novas já nascem com o esquema atual; as existentes são migradas
+base_nova = not inspect(engine).has_table(Gasto.__tablename__)
 
 # cria as tabelas do banco, caso não existam
 Base.metadata.create_all(engine)
+
+if base_nova:
+    # o índice de busca é uma tabela virtual, que o create_all não cria
+    with engine.begin() as conexao:
+        cria_busca(conexao)
+    marca_versao_atual(engine)
+else:
+    aplica_migracoes(engine)
+
+if copia_leitura is not None:
+    # a primeira cópia é feita antes de qualquer leitura
+    copia_leitura.atualiza()
+    copia_leitura.inicia()
@@ -1,4 +1,67 @@
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+
+from sqlalchemy import DateTime
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.types import TypeDecorator
+from sqlalchemy_utils import UUIDType
 
 # cria uma classe Base para o instanciamento de novos objetos/tabelas
 Base = declarative_base()
+
+# Os UUIDs são guardados como texto por padrão. Com UUID_BINARIO=1 passam a
+# ocupar 16 bytes (bases existentes devem ser convertidas com converte_uuid.py)
+# e com UUID_V7=1 os novos ids são gerados em ordem de criação (UUIDv7), o que
+# mantém as inserções no fim dos índices.
+UUID_BINARIO = os.environ.get("UUID_BINARIO", "0") == "1"
+UUID_V7 = os.environ.get("UUID_V7", "0") == "1"
+
+
+def TipoUUID():
+    """ Tipo de coluna usado para todas as chaves UUID do modelo.
+    """
+    return UUIDType(binary=UUID_BINARIO)
+
+
+def uuid7():
+    """ Gera um UUID versão 7: 48 bits de timestamp em milissegundos seguidos
+        de bits aleatórios.
+    """
+    valor = (time.time_ns() // 1000000) << 80 | int.from_bytes(os.urandom(10), "big")
+    # marca a versão (7) e a variante (RFC 4122)
+    valor = valor & ~(0xF << 76) | (0x7 << 76)
+    valor = valor & ~(0x3 << 62) | (0x2 << 62)
+    return uuid.UUID(int=valor)
+
+
+def gera_uuid():
+    """ Gera o id de um novo registro conforme a configuração de UUID_V7.
+    """
+    return uuid7() if UUID_V7 else uuid.uuid4()
+
+
+class DataHoraUTC(TypeDecorator):
+    """ Data e hora gravada em UTC, sem fuso, como o sqlite espera, e lida de
+        volta com o fuso UTC. Datas com fuso são convertidas para UTC antes
+        de gravadas; datas sem fuso já são consideradas em UTC.
+    """
+    impl = DateTime
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is not None and value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+
+    def process_result_value(self, value, dialect):
+        if value is not None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value
+
+
+def agora_utc():
+    """ Data e hora atual, em UTC.
+    """
+    return datetime.now(timezone.utc)
@@ -0,0 +1,133 @@
+import re
+
+from sqlalchemy import Column, Integer, MetaData, Table, Text, literal_column, select, text
+
+from model.base import Base, TipoUUID
+from model.consultas import projecao_gasto
+from model.gasto import Gasto
+
+
+# Índice de busca textual (FTS5 do sqlite) sobre a descrição dos gastos e o
+# texto das suas notas, mantido por triggers que também cobrem as inserções e
+# alterações em lote feitas sem o ORM. O rowid de cada linha do índice é o id
+# do gasto em gasto_busca, e não o rowid do gasto, que o sqlite pode
+# renumerar em um VACUUM (gasto não tem INTEGER PRIMARY KEY).
+
+# chave inteira e estável de cada gasto no índice
+gasto_busca = Table(
+    "gasto_busca", Base.metadata,
+    Column("id", Integer, primary_key=True),
+    Column("pk_gasto", TipoUUID(), nullable=False, unique=True),
+)
+
+# tabela virtual, fora do Base.metadata para que o create_all não a crie
+gasto_fts = Table(
+    "gasto_fts", MetaData(),
+    Column("rowid", Integer, primary_key=True),
+    Column("descricao", Text),
+    Column("notas", Text),
+)
+
+_NOTAS_DO_GASTO = "(SELECT group_concat(texto, ' ') FROM nota_gasto WHERE nota_gasto.gasto_id = %s)"
+_ID_DO_GASTO = "(SELECT id FROM gasto_busca WHERE pk_gasto = %s)"
+
+DDL_BUSCA = [
+    # sem acentos e com índices de prefixo de 2 e 3 letras, para as buscas
+    # por início de palavra
+    "CREATE VIRTUAL TABLE IF NOT EXISTS gasto_fts USING fts5("
+    "descricao, notas, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')",
+    # a descrição pesa o dobro das notas na relevância
+    "INSERT INTO gasto_fts(gasto_fts, rank) VALUES ('rank', 'bm25(2.0, 1.0)')",
+    "DROP TRIGGER IF EXISTS gasto_fts_insere",
+    # um gasto recém-inserido ainda não tem notas
+    "CREATE TRIGGER gasto_fts_insere AFTER INSERT ON gasto BEGIN "
+    "INSERT INTO gasto_busca(pk_gasto) VALUES (new.pk_gasto); "
+    "INSERT INTO gasto_fts(rowid, descricao) VALUES (%s, new.descricao); END"
+    % (_ID_DO_GASTO % "new.pk_gasto"),
+    "DROP TRIGGER IF EXISTS gasto_fts_atualiza",
+    "CREATE TRIGGER gasto_fts_atualiza AFTER UPDATE OF descricao ON gasto BEGIN "
+    "UPDATE gasto_fts SET descricao = new.descricao WHERE rowid = %s; END"
+    % (_ID_DO_GASTO % "new.pk_gasto"),
+    "DROP TRIGGER IF EXISTS gasto_fts_remove",
+    "CREATE TRIGGER gasto_fts_remove AFTER DELETE ON gasto BEGIN "
+    "DELETE FROM gasto_fts WHERE rowid = %s; "
+    "DELETE FROM gasto_busca WHERE pk_gasto = old.pk_gasto; END"
+    % (_ID_DO_GASTO % "old.pk_gasto"),
+]
+
+# triggers das notas, que dependem da coluna nota_gasto.gasto_id
+DDL_BUSCA_NOTAS = [
+    "DROP TRIGGER IF EXISTS nota_gasto_fts_insere",
+    "CREATE TRIGGER nota_gasto_fts_insere AFTER INSERT ON nota_gasto BEGIN "
+    "UPDATE gasto_fts SET notas = %s WHERE rowid = %s; END"
+    % (_NOTAS_DO_GASTO % "new.gasto_id", _ID_DO_GASTO % "new.gasto_id"),
+    "DROP TRIGGER IF EXISTS nota_gasto_fts_atualiza",
+    "CREATE TRIGGER nota_gasto_fts_atualiza AFTER UPDATE ON nota_gasto BEGIN "
+    "UPDATE gasto_fts SET notas = %s WHERE rowid = %s; "
+    "UPDATE gasto_fts SET notas = %s WHERE rowid = %s; END"
+    % (_NOTAS_DO_GASTO % "old.gasto_id", _ID_DO_GASTO % "old.gasto_id",
+       _NOTAS_DO_GASTO % "new.gasto_id", _ID_DO_GASTO % "new.gasto_id"),
+    "DROP TRIGGER IF EXISTS nota_gasto_fts_remove",
+    "CREATE TRIGGER nota_gasto_fts_remove AFTER DELETE ON nota_gasto BEGIN "
+    "UPDATE gasto_fts SET notas = %s WHERE rowid = %s; END"
+    % (_NOTAS_DO_GASTO % "old.gasto_id", _ID_DO_GASTO % "old.gasto_id"),
+]
+
+
+def cria_busca(conexao, notas: bool = True):
+    """ Cria o índice de busca e as triggers que o mantêm. Pode ser
+        reaplicada: as triggers são recriadas com a definição atual. Com
+        notas=False, as triggers de nota_gasto não são criadas.
+    """
+    if conexao.dialect.name != "sqlite":
+        return
+    for comando in DDL_BUSCA + (DDL_BUSCA_NOTAS if notas else []):
+        conexao.exec_driver_sql(comando)
+
+
+def reconstroi_busca(conexao, notas: bool = True):
+    """ Apaga e recria todo o índice de busca, e as chaves de gasto_busca, a
+        partir de gasto e nota_gasto. Com notas=False, só as descrições são
+        indexadas.
+    """
+    conexao.execute(text("DELETE FROM gasto_fts"))
+    conexao.execute(text("DELETE FROM gasto_busca"))
+    conexao.execute(text("INSERT INTO gasto_busca(pk_gasto) SELECT pk_gasto FROM gasto"))
+    conexao.execute(text(
+        "INSERT INTO gasto_fts(rowid, descricao, notas) SELECT b.id, g.descricao, %s "
+        "FROM gasto g JOIN gasto_busca b ON b.pk_gasto = g.pk_gasto"
+        % (_NOTAS_DO_GASTO % "g.pk_gasto" if notas else "NULL")))
+    # junta os segmentos gerados pela carga em um só
+    conexao.execute(text("INSERT INTO gasto_fts(gasto_fts) VALUES ('optimize')"))
+
+
+def consulta_fts(texto: str) -> str:
+    """ Converte o texto digitado em uma consulta FTS5: cada palavra vira um
+        prefixo, e todas precisam aparecer. Lança ValueError se o texto não
+        tiver nenhuma palavra.
+    """
+    palavras = re.findall(r"\w+", texto)
+    if not palavras:
+        raise ValueError("informe ao menos uma palavra para a busca")
+    return " ".join('"%s"*' % palavra for palavra in palavras)
+
+
+def busca_gastos(session, texto: str, limite: int = 50, campos=None):
+    """ Retorna os gastos cuja descrição ou notas contêm as palavras do
+        texto (ou palavras que começam com elas), dos mais aos menos
+        relevantes. São lidas apenas as colunas dos campos informados (ver
+        projecao_gasto).
+    """
+    relevancia = literal_column("gasto_fts.rank")
+    encontrados = select(gasto_busca.c.pk_gasto, relevancia.label("relevancia")) \
+        .join_from(gasto_fts, gasto_busca, gasto_busca.c.id == gasto_fts.c.rowid) \
+        .where(literal_column("gasto_fts").op("MATCH")(consulta_fts(texto))) \
+        .order_by(relevancia) \
+        .limit(limite) \
+        .subquery()
+    entidades, opcoes = projecao_gasto(campos)
+    return session.query(*entidades) \
+        .join(encontrados, Gasto.id == encontrados.c.pk_gasto) \
+        .options(*opcoes) \
+        .order_by(encontrados.c.relevancia) \
+        .all()
@@ -0,0 +1,59 @@
+import os
+import time
+
+from model.categoria import Categoria
+from model.versao import versao_tabela, ao_alterar
+from model.leitura import na_principal
+
+
+class CacheCategorias:
+    """ Cópia em memória das categorias, já no formato de CategoriaViewSchema.
+
+        As escritas feitas neste processo invalidam o cache assim que são
+        efetivadas. Escritas de outros workers são percebidas pela versão da
+        tabela em versao_tabela, consultada no máximo uma vez a cada
+        `validade` segundos; entre uma consulta e outra o cache é servido sem
+        acessar o banco.
+    """
+
+    def __init__(self, validade: float):
+        self.validade = validade
+        # (versão, verificado_em, categorias), trocado sempre por inteiro
+        self._estado = None
+
+    def invalida(self):
+        self._estado = None
+
+    def obtem(self, session):
+        """ Retorna um dict de id -> representação da categoria.
+        """
+        return self.obtem_versionado(session)[1]
+
+    def obtem_versionado(self, session):
+        """ Retorna a versão da tabela de categorias correspondente ao cache
+            e o dict de id -> representação da categoria.
+        """
+        estado = self._estado
+        agora = time.monotonic()
+        if estado is not None and agora - estado[1] < self.validade:
+            return estado[0], estado[2]
+
+        # o cache é lido sempre da engine principal, para nunca voltar a uma
+        # versão anterior quando as leituras vêm de uma cópia. A versão é lida
+        # antes das categorias: se houver uma escrita entre as duas leituras,
+        # a próxima verificação apenas recarrega o cache
+        with na_principal(session):
+            versao = versao_tabela(session, "categoria")
+            if estado is not None and estado[0] == versao:
+                categorias = estado[2]
+            else:
+                categorias = {
+                    categoria.id: {"id": categoria.id, "nome": categoria.nome, "ordem": categoria.ordem}
+                    for categoria in session.query(Categoria)
+                }
+        self._estado = (versao, agora, categorias)
+        return versao, categorias
+
+
+cache_categorias = CacheCategorias(float(os.environ.get("CACHE_CATEGORIAS_VALIDADE", 1.0)))
+ao_alterar("categoria", cache_categorias.invalida)
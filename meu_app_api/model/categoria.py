@@ -1,14 +1,12 @@
-import uuid
 from sqlalchemy import Column, String, Integer
-from sqlalchemy_utils import UUIDType
-from model.base import Base
+from model.base import Base, TipoUUID, gera_uuid
 
 
 class Categoria(Base):
     __tablename__ = 'categoria'
 
     # Identificador único gerado automaticamente como UUID (Universally Unique Identifiers)
-    id = Column("pk_categoria", UUIDType(binary=False), primary_key=True, default=uuid.uuid4)
+    id = Column("pk_categoria", TipoUUID(), primary_key=True, default=gera_uuid)
     # O nome da categoria (e.g., 'Alimentação', 'Transporte')
     nome = Column(String(100), unique=True, nullable=False)
     # Campo opcional para definir a ordem de exibição das categorias
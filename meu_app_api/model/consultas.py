@@ -0,0 +1,222 @@
+from datetime import timedelta, timezone
+
+from sqlalchemy import and_, or_, case, func
+from sqlalchemy.orm import load_only, selectinload
+
+from fuso import localiza
+
+from model.categoria import Categoria
+from model.gasto import Gasto, para_centavos
+from model.resumo import ResumoMensal
+
+
+# Ordenação usada na listagem de gastos: mais recentes primeiro. O id entra
+# como critério de desempate para que a paginação por cursor seja estável.
+ORDEM_GASTOS = (Gasto.data_gasto.desc(), Gasto.id.desc())
+
+
+# colunas de gasto lidas para apresentar cada campo de GastoViewSchema
+COLUNAS_CAMPO_GASTO = {
+    "id": Gasto.id,
+    "descricao": Gasto.descricao,
+    "valor": Gasto.valor_centavos,
+    "data_insercao": Gasto.data_insercao,
+    "data_gasto": Gasto.data_gasto,
+    "categoria_obj": Gasto.categoria_id,
+}
+
+
+def projecao_gasto(campos=None):
+    """ Retorna o que consultar para apresentar apenas os campos informados
+        de GastoViewSchema (todos, se None), como (entidades, opções).
+
+        Sem as notas, as entidades são só as colunas necessárias: as linhas
+        lidas não passam pela hidratação do ORM e têm os mesmos atributos de
+        Gasto. Com as notas, a entidade é Gasto, com apenas essas colunas
+        (load_only) e as notas carregadas em uma consulta à parte (IN). O id
+        e a data do gasto sempre são lidos, já que ordenam e paginam.
+    """
+    if campos is None:
+        campos = list(COLUNAS_CAMPO_GASTO) + ["notas"]
+    colunas = [Gasto.id, Gasto.data_gasto] + [
+        COLUNAS_CAMPO_GASTO[campo] for campo in campos
+        if campo in COLUNAS_CAMPO_GASTO and campo not in ("id", "data_gasto")]
+    if "notas" in campos:
+        return [Gasto], [load_only(*colunas), selectinload(Gasto.notas)]
+    return colunas, []
+
+
+def filtros_gasto(busca, fuso=None):
+    """ Traduz os filtros de busca (ver GastoFiltroSchema) em uma lista de
+        condições SQL a serem aplicadas sobre a tabela de gastos.
+
+        Datas sem fuso nos filtros são interpretadas no fuso informado (ou em
+        UTC, se nenhum for informado).
+    """
+    condicoes = []
+    if busca.data_inicio is not None:
+        condicoes.append(Gasto.data_gasto >= localiza(busca.data_inicio, fuso or timezone.utc))
+    if busca.data_fim is not None:
+        condicoes.append(Gasto.data_gasto <= localiza(busca.data_fim, fuso or timezone.utc))
+    if busca.categoria_id is not None:
+        condicoes.append(Gasto.categoria_id == busca.categoria_id)
+    if busca.valor_min is not None:
+        condicoes.append(Gasto.valor_centavos >= para_centavos(busca.valor_min))
+    if busca.valor_max is not None:
+        condicoes.append(Gasto.valor_centavos <= para_centavos(busca.valor_max))
+    if busca.descricao:
+        condicoes.append(Gasto.descricao.contains(busca.descricao, autoescape=True))
+    return condicoes
+
+
+def condicao_cursor(data_gasto, id):
+    """ Retorna a condição que seleciona os gastos posteriores ao cursor
+        (data_gasto, id), respeitando a ordem definida em ORDEM_GASTOS.
+    """
+    return or_(
+        Gasto.data_gasto < data_gasto,
+        and_(Gasto.data_gasto == data_gasto, Gasto.id < id)
+    )
+
+
+# funções que agrupam uma data (expressão SQL, já no horário local) em cada
+# granularidade de período (funções de data do sqlite; a semana é
+# identificada pela segunda-feira)
+PERIODOS = {
+    "dia": lambda data: func.date(data),
+    "semana": lambda data: func.date(data, "weekday 0", "-6 days"),
+    "mes": lambda data: func.strftime("%Y-%m", data),
+}
+
+
+def deslocamentos_fuso(fuso, inicio, fim):
+    """ Retorna os deslocamentos do fuso em relação a UTC entre as datas
+        informadas (com fuso), como uma lista de (início, deslocamento): cada
+        deslocamento vale a partir do seu início até o início do seguinte.
+        O primeiro início é None.
+    """
+    def deslocamento(dt):
+        return dt.astimezone(fuso).utcoffset()
+
+    faixas = [(None, deslocamento(inicio))]
+    passo = timedelta(days=1)
+    atual = inicio
+    while atual < fim:
+        proximo = min(atual + passo, fim)
+        if deslocamento(proximo) != faixas[-1][1]:
+            # busca binária do segundo em que o deslocamento muda
+            antes, depois = atual, proximo
+            while depois - antes > timedelta(seconds=1):
+                meio = antes + (depois - antes) / 2
+                if deslocamento(meio) == faixas[-1][1]:
+                    antes = meio
+                else:
+                    depois = meio
+            faixas.append((depois, deslocamento(depois)))
+        atual = proximo
+    return faixas
+
+
+def data_local(faixas):
+    """ Expressão SQL com a data do gasto no horário local, dados os
+        deslocamentos do fuso (ver deslocamentos_fuso).
+    """
+    def desloca(deslocamento):
+        if not deslocamento:
+            return Gasto.data_gasto
+        return func.datetime(Gasto.data_gasto, "%+d seconds" % deslocamento.total_seconds())
+
+    if len(faixas) == 1:
+        return desloca(faixas[0][1])
+    return case(
+        *[(Gasto.data_gasto < inicio, desloca(deslocamento))
+          for (_, deslocamento), (inicio, _) in zip(faixas, faixas[1:])],
+        else_=desloca(faixas[-1][1]))
+
+
+def _agregados():
+    """ Colunas agregadas comuns aos relatórios de gastos, em centavos.
+    """
+    return (
+        func.sum(Gasto.valor_centavos).label("total"),
+        func.count(Gasto.id).label("quantidade"),
+        func.min(Gasto.valor_centavos).label("minimo"),
+        func.max(Gasto.valor_centavos).label("maximo"),
+    )
+
+
+def _agregados_resumo():
+    """ Mesmas colunas de _agregados, lidas do resumo mensal.
+    """
+    return (
+        func.sum(ResumoMensal.total).label("total"),
+        func.sum(ResumoMensal.quantidade).label("quantidade"),
+        func.min(ResumoMensal.minimo).label("minimo"),
+        func.max(ResumoMensal.maximo).label("maximo"),
+    )
+
+
+def _usa_resumo(busca):
+    """ O resumo mensal atende à consulta quando não há filtro além da
+        categoria, já que ele não guarda os gastos individuais.
+    """
+    return busca.data_inicio is None and busca.data_fim is None \
+        and busca.valor_min is None and busca.valor_max is None \
+        and not busca.descricao
+
+
+def totais_por_categoria(session, busca, fuso=None):
+    """ Soma os gastos de cada categoria, respeitando os filtros informados.
+
+        Sem filtros de data, valor ou descrição, os totais vêm do resumo
+        mensal, sem varrer a tabela de gastos.
+    """
+    if _usa_resumo(busca):
+        query_base = session.query(ResumoMensal.categoria_id, Categoria.nome, *_agregados_resumo()) \
+            .join(Categoria, Categoria.id == ResumoMensal.categoria_id)
+        if busca.categoria_id is not None:
+            query_base = query_base.filter(ResumoMensal.categoria_id == busca.categoria_id)
+        return query_base.group_by(ResumoMensal.categoria_id, Categoria.nome) \
+            .order_by(func.sum(ResumoMensal.total).desc()) \
+            .all()
+
+    return session.query(Gasto.categoria_id, Categoria.nome, *_agregados()) \
+        .join(Categoria, Categoria.id == Gasto.categoria_id) \
+        .filter(*filtros_gasto(busca, fuso)) \
+        .group_by(Gasto.categoria_id, Categoria.nome) \
+        .order_by(func.sum(Gasto.valor_centavos).desc()) \
+        .all()
+
+
+def totais_por_periodo(session, busca, granularidade: str, fuso=None):
+    """ Soma os gastos de cada período (dia, semana ou mês) do fuso
+        informado (ou de UTC), respeitando os filtros informados.
+
+        Totais mensais sem filtros de data, valor ou descrição vêm do resumo
+        mensal, sem varrer a tabela de gastos, quando o fuso coincide com UTC
+        em todo o intervalo dos gastos.
+    """
+    condicoes = filtros_gasto(busca, fuso)
+    faixas = [(None, timedelta(0))]
+    if fuso is not None:
+        # o intervalo dos gastos filtrados sai do índice de data_gasto
+        inicio, fim = session.query(func.min(Gasto.data_gasto), func.max(Gasto.data_gasto)) \
+            .filter(*condicoes).one()
+        if inicio is None:
+            return []
+        faixas = deslocamentos_fuso(fuso, inicio, fim)
+    em_utc = all(not deslocamento for _, deslocamento in faixas)
+
+    if granularidade == "mes" and em_utc and _usa_resumo(busca):
+        periodo = ResumoMensal.ano_mes.label("periodo")
+        query_base = session.query(periodo, *_agregados_resumo())
+        if busca.categoria_id is not None:
+            query_base = query_base.filter(ResumoMensal.categoria_id == busca.categoria_id)
+        return query_base.group_by(periodo).order_by(periodo).all()
+
+    periodo = PERIODOS[granularidade](data_local(faixas)).label("periodo")
+    return session.query(periodo, *_agregados()) \
+        .filter(*condicoes) \
+        .group_by(periodo) \
+        .order_by(periodo) \
+        .all()
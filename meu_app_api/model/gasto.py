@@ -1,50 +1,62 @@
-import uuid
-from sqlalchemy import Column, String, Integer, DateTime, Float, ForeignKey
+from sqlalchemy import Column, String, Integer, ForeignKey, Index
 from sqlalchemy.orm import relationship
-from sqlalchemy_utils import UUIDType
 from datetime import datetime
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
 from typing import Union
 
 # Importando a Base (e as outras classes, se necessário)
-from model.base import Base
+from model.base import Base, TipoUUID, gera_uuid, DataHoraUTC, agora_utc
 
 
 class Gasto(Base):
     __tablename__ = 'gasto'
 
     # Identificador único gerado automaticamente como UUID (Universally Unique Identifiers)
-    id = Column("pk_gasto", UUIDType(binary=False), primary_key=True, default=uuid.uuid4)
+    id = Column("pk_gasto", TipoUUID(), primary_key=True, default=gera_uuid)
     descricao = Column(String(140))
-    valor = Column(Float)
-    data_insercao = Column(DateTime, default=datetime.now())
-    data_gasto = Column(DateTime, default=datetime.now())
+    # Valor em centavos: somas em inteiros são exatas, sem arredondamentos
+    valor_centavos = Column(Integer)
+    # datas gravadas em UTC; o default é avaliado a cada inserção
+    data_insercao = Column(DataHoraUTC, default=agora_utc)
+    data_gasto = Column(DataHoraUTC, default=agora_utc)
 
     # 1. CHAVE ESTRANGEIRA para a tabela 'categoria'
     # Esta coluna armazena o ID da categoria
     #categoria_id = Column(Integer, ForeignKey('categoria.pk_categoria'), nullable=False)
-    categoria_id = Column(UUIDType(binary=False), ForeignKey('categoria.pk_categoria'), nullable=False)
+    categoria_id = Column(TipoUUID(), ForeignKey('categoria.pk_categoria'), nullable=False)
 
     # 2. RELACIONAMENTO com a classe Categoria
     # Este objeto permite carregar a categoria completa (objeto Categoria)
     # O 'back_populates' conecta as duas classes.
     categoria_obj = relationship("Categoria")
 
-    # notas = relationship("NotaGasto") # Descomente após criar a classe NotaGasto
+    # Notas/comentários do gasto, em ordem de inserção. As listagens as carregam
+    # para a página inteira com selectinload; removidas junto com o gasto.
+    notas = relationship("NotaGasto", order_by="NotaGasto.id", cascade="all, delete-orphan")
 
-    def __init__(self, descricao: str, valor: float, categoria_id: int,
-                 data_gasto: Union[DateTime, None] = None, data_insercao: Union[DateTime, None] = None):
+    # Índices dos caminhos de acesso mais comuns: listagem ordenada e filtrada
+    # por data, filtros e relatórios por categoria (que também servem à
+    # verificação de uso de uma categoria) e consultas por data de inserção.
+    __table_args__ = (
+        Index("ix_gasto_data_gasto", "data_gasto", "pk_gasto"),
+        Index("ix_gasto_categoria_data", "categoria_id", "data_gasto"),
+        Index("ix_gasto_data_insercao", "data_insercao"),
+    )
+
+    def __init__(self, descricao: str, valor_centavos: int, categoria_id: int,
+                 data_gasto: Union[datetime, None] = None, data_insercao: Union[datetime, None] = None):
         """
         Cria um registro de Gasto
 
         Arguments:
             descricao: Descrição breve do gasto.
-            valor: Valor total do gasto.
+            valor_centavos: Valor total do gasto, em centavos.
             categoria_id: O ID da Categoria a que este gasto pertence.
-            data_gasto: Data em que o gasto realmente ocorreu.
-            data_insercao: Data de quando o registro foi inserido à base.
+            data_gasto: Data em que o gasto realmente ocorreu (sem fuso, é considerada UTC).
+            data_insercao: Data de quando o registro foi inserido à base (idem).
         """
         self.descricao = descricao
-        self.valor = valor
+        self.valor_centavos = valor_centavos
         # Agora o Gasto é inicializado com o ID da categoria
         self.categoria_id = categoria_id
 
@@ -52,4 +64,36 @@ class Gasto(Base):
             self.data_gasto = data_gasto
 
         if data_insercao:
-            self.data_insercao = data_insercao
\ No newline at end of file
+            self.data_insercao = data_insercao
+
+
+# Maior valor, em módulo, aceito para um gasto. Mantém os centavos bem longe
+# do limite dos inteiros de 64 bits do sqlite, inclusive nas somas, e exatos
+# quando convertidos de volta para float.
+VALOR_MAXIMO = Decimal("9999999999.99")
+
+
+def para_centavos(valor):
+    """ Converte um valor monetário em centavos, arredondando meio centavo
+        para cima. Lança ValueError se o valor não for um número finito ou
+        passar de VALOR_MAXIMO.
+    """
+    if valor is None:
+        return None
+    try:
+        if not isinstance(valor, Decimal):
+            valor = Decimal(str(valor))
+        if abs(valor) > VALOR_MAXIMO:
+            raise ValueError("valor fora do limite de %s" % VALOR_MAXIMO)
+        centavos = (valor * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP)
+    except InvalidOperation as e:
+        raise ValueError("valor inválido: %s" % valor) from e
+    return int(centavos)
+
+
+def de_centavos(centavos):
+    """ Converte um valor em centavos de volta para a unidade monetária.
+    """
+    if centavos is None:
+        return None
+    return centavos / 100
@@ -0,0 +1,134 @@
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from sqlalchemy.orm import Session as OrmSession
+
+logger = logging.getLogger(__name__)
+
+# As leituras pesadas (listagens, buscas, exportação e relatórios) podem ser
+# servidas por uma engine separada da principal: uma réplica somente leitura
+# (DB_URL_LEITURA) ou uma cópia da base sqlite atualizada periodicamente pela
+# API de backup (DB_COPIA_LEITURA_INTERVALO). As escritas sempre vão para a
+# engine principal.
+
+
+class SessaoRoteada(OrmSession):
+    """ Sessão que lê da engine de leitura quando marcada com usa_leitura.
+
+        O flush e os comandos INSERT, UPDATE e DELETE sempre vão para a
+        engine principal, assim como as leituras feitas dentro de
+        na_principal.
+    """
+
+    def __init__(self, *args, engine_leitura=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.engine_leitura = engine_leitura
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.engine_leitura is not None and self.info.get("leitura") \
+                and not self.info.get("principal") and not self._flushing \
+                and not getattr(clause, "is_dml", False):
+            return self.engine_leitura
+        return super().get_bind(mapper, clause=clause, **kwargs)
+
+
+def usa_leitura(session, leitura: bool = True):
+    """ Marca a sessão para que as suas leituras usem a engine de leitura.
+    """
+    session.info["leitura"] = leitura
+
+
+@contextmanager
+def na_principal(session):
+    """ Dentro do bloco, as leituras da sessão usam a engine principal.
+    """
+    anterior = session.info.get("principal", False)
+    session.info["principal"] = True
+    try:
+        yield session
+    finally:
+        session.info["principal"] = anterior
+
+
+def _assinatura(conexao):
+    # versão do esquema e das tabelas: se forem iguais nas duas bases, a
+    # cópia ainda está atual
+    try:
+        versoes = conexao.execute("SELECT tabela, versao FROM versao_tabela ORDER BY tabela").fetchall()
+    except sqlite3.OperationalError:
+        # cópia ainda vazia
+        return None
+    return conexao.execute("PRAGMA user_version").fetchone()[0], versoes
+
+
+class CopiaLeitura:
+    """ Cópia da base sqlite usada pelas leituras, refeita a cada `intervalo`
+        segundos por uma thread em segundo plano.
+
+        A cópia é feita pela API de backup do sqlite, em uma única passada e
+        portanto com uma imagem consistente da origem, e só quando as versões
+        em versao_tabela mudaram. O destino fica em modo WAL: as leituras em
+        andamento continuam vendo a imagem anterior e as seguintes já veem a
+        nova, sem que o arquivo seja trocado.
+    """
+
+    def __init__(self, origem: str, destino: str, intervalo: float, busy_timeout: int = 5000):
+        self.origem = origem
+        self.destino = destino
+        self.intervalo = intervalo
+        self.busy_timeout = busy_timeout
+        self._parar = threading.Event()
+        self._thread = None
+
+    def _conecta(self, caminho):
+        conexao = sqlite3.connect(caminho, timeout=self.busy_timeout / 1000)
+        conexao.execute("PRAGMA busy_timeout=%d" % self.busy_timeout)
+        return conexao
+
+    def atualiza(self) -> bool:
+        """ Refaz a cópia se a origem mudou desde a última. Retorna se a
+            cópia foi refeita.
+        """
+        origem = self._conecta(self.origem)
+        destino = self._conecta(self.destino)
+        try:
+            assinatura = _assinatura(origem)
+            if assinatura is not None and assinatura == _assinatura(destino):
+                return False
+            # em WAL, as leituras abertas no destino não bloqueiam o backup
+            destino.execute("PRAGMA journal_mode=WAL")
+            origem.backup(destino)
+            return True
+        finally:
+            origem.close()
+            destino.close()
+
+    def _executa(self):
+        while not self._parar.wait(self.intervalo):
+            try:
+                if self.atualiza():
+                    logger.debug("Cópia de leitura atualizada")
+            except sqlite3.Error as e:
+                # a próxima tentativa pode dar certo, por exemplo depois de
+                # um lock demorado
+                logger.warning("Erro ao atualizar a cópia de leitura: %s" % e)
+
+    def inicia(self):
+        self._parar.clear()
+        self._thread = threading.Thread(target=self._executa, name="copia-leitura", daemon=True)
+        self._thread.start()
+        # threads não sobrevivem ao fork: cada worker mantém a sua
+        os.register_at_fork(after_in_child=self._reinicia_apos_fork)
+
+    def _reinicia_apos_fork(self):
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._executa, name="copia-leitura", daemon=True)
+        self._thread.start()
+
+    def encerra(self):
+        self._parar.set()
+        if self._thread is not None:
+            self._thread.join()
@@ -0,0 +1,164 @@
+import logging
+
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import Session as OrmSession
+
+from model.gasto import Gasto, para_centavos
+from model.notagasto import NotaGasto
+from model.resumo import ResumoMensal, reconstroi_resumo
+from model.busca import cria_busca, reconstroi_busca
+
+logger = logging.getLogger(__name__)
+
+# As migrações atualizam bases sqlite já existentes, já que o create_all só
+# cria tabelas novas e nunca altera as existentes. A versão de cada base fica
+# no PRAGMA user_version: a migração de índice i leva a base à versão i + 1.
+# Cada migração deve poder ser reaplicada sem efeitos colaterais.
+
+
+def _preenche_resumo_mensal(session):
+    """ Preenche o resumo mensal de bases criadas antes da sua existência.
+    """
+    # SQL do esquema da época, em que o valor de gasto ainda era float: o
+    # resumo em centavos é recriado depois, por _converte_valor_para_centavos
+    session.execute(text("DELETE FROM resumo_mensal"))
+    session.execute(text(
+        "INSERT INTO resumo_mensal (categoria_id, ano_mes, total, quantidade, minimo, maximo) "
+        "SELECT categoria_id, strftime('%Y-%m', data_gasto), SUM(valor), COUNT(pk_gasto), "
+        "MIN(valor), MAX(valor) FROM gasto GROUP BY categoria_id, strftime('%Y-%m', data_gasto)"))
+
+
+def _cria_indices_gasto(session):
+    """ Cria os índices de gasto declarados no modelo.
+    """
+    for indice in Gasto.__table__.indexes:
+        indice.create(session.connection(), checkfirst=True)
+
+
+# gastos convertidos para centavos a cada comando
+TAMANHO_LOTE_CENTAVOS = 5000
+
+
+def _preenche_centavos(conexao):
+    """ Preenche valor_centavos a partir de valor, em lotes, com o mesmo
+        arredondamento das escritas da API (para_centavos).
+    """
+    ultimo = 0
+    while True:
+        linhas = conexao.execute(text(
+            "SELECT rowid, pk_gasto, valor FROM gasto WHERE rowid > :ultimo ORDER BY rowid LIMIT :limite"),
+            {"ultimo": ultimo, "limite": TAMANHO_LOTE_CENTAVOS}).all()
+        if not linhas:
+            return
+        valores = []
+        for rowid, pk_gasto, valor in linhas:
+            try:
+                centavos = para_centavos(valor)
+            except ValueError as e:
+                # o valor não pode ser representado em centavos: fica vazio
+                logger.warning("Gasto '%s' sem valor em centavos: %s" % (pk_gasto, e))
+                centavos = None
+            valores.append({"rowid": rowid, "centavos": centavos})
+        conexao.execute(text("UPDATE gasto SET valor_centavos = :centavos WHERE rowid = :rowid"), valores)
+        ultimo = linhas[-1][0]
+
+
+def _converte_valor_para_centavos(session):
+    """ Troca a coluna valor (float) de gasto por valor_centavos (inteiro).
+    """
+    conexao = session.connection()
+    colunas = {coluna["name"] for coluna in inspect(conexao).get_columns("gasto")}
+    if "valor_centavos" not in colunas:
+        conexao.execute(text("ALTER TABLE gasto ADD COLUMN valor_centavos INTEGER"))
+    if "valor" in colunas:
+        _preenche_centavos(conexao)
+        conexao.execute(text("ALTER TABLE gasto DROP COLUMN valor"))
+
+    # o resumo é recriado com as colunas inteiras e os totais em centavos
+    ResumoMensal.__table__.drop(conexao, checkfirst=True)
+    ResumoMensal.__table__.create(conexao)
+    reconstroi_resumo(session)
+
+
+def _cria_busca_textual(session):
+    """ Cria o índice de busca textual de gastos e o preenche.
+    """
+    # nesta versão, nota_gasto ainda não tem a coluna gasto_id: só as
+    # descrições são indexadas, e as notas entram com _refaz_nota_gasto
+    conexao = session.connection()
+    cria_busca(conexao, notas=False)
+    reconstroi_busca(conexao, notas=False)
+
+
+def _refaz_nota_gasto(session):
+    """ Troca a coluna gasto (inteira) de nota_gasto pela chave gasto_id.
+    """
+    conexao = session.connection()
+    colunas = {coluna["name"] for coluna in inspect(conexao).get_columns("nota_gasto")}
+    if "gasto" in colunas:
+        # o sqlite não altera o tipo de uma coluna: a tabela é recriada, e
+        # as notas que não apontam para um gasto existente são descartadas
+        conexao.execute(text("ALTER TABLE nota_gasto RENAME TO nota_gasto_antiga"))
+        NotaGasto.__table__.create(conexao)
+        conexao.execute(text(
+            "INSERT INTO nota_gasto (id, texto, data_insercao, gasto_id) "
+            "SELECT n.id, n.texto, n.data_insercao, n.gasto FROM nota_gasto_antiga n "
+            "JOIN gasto ON gasto.pk_gasto = n.gasto"))
+        conexao.execute(text("DROP TABLE nota_gasto_antiga"))
+    for indice in NotaGasto.__table__.indexes:
+        indice.create(conexao, checkfirst=True)
+
+    # as triggers da busca passam a usar a nova coluna
+    cria_busca(conexao)
+    reconstroi_busca(conexao)
+
+
+def _chaveia_busca_por_gasto(session):
+    """ Passa a chavear o índice de busca por gasto_busca, e não pelo rowid de gasto.
+    """
+    # gasto_busca já foi criada pelo create_all: as triggers são recriadas
+    # com a nova chave e o índice é preenchido de novo
+    conexao = session.connection()
+    cria_busca(conexao)
+    reconstroi_busca(conexao)
+
+
+MIGRACOES = [
+    _preenche_resumo_mensal,
+    _cria_indices_gasto,
+    _converte_valor_para_centavos,
+    _cria_busca_textual,
+    _refaz_nota_gasto,
+    _chaveia_busca_por_gasto,
+]
+
+
+def versao_banco(conexao):
+    """ Retorna a versão de esquema gravada na base.
+    """
+    return conexao.execute(text("PRAGMA user_version")).scalar()
+
+
+def _grava_versao(conexao, versao: int):
+    conexao.execute(text("PRAGMA user_version = %d" % versao))
+
+
+def marca_versao_atual(engine):
+    """ Marca uma base recém-criada pelo create_all como já atualizada.
+    """
+    with engine.begin() as conexao:
+        _grava_versao(conexao, len(MIGRACOES))
+
+
+def aplica_migracoes(engine):
+    """ Aplica, em ordem, as migrações ainda não aplicadas na base.
+    """
+    with engine.connect() as conexao:
+        versao = versao_banco(conexao)
+
+    for numero, migracao in enumerate(MIGRACOES[versao:], start=versao + 1):
+        logger.info("Aplicando migração %d: %s" % (numero, migracao.__doc__.strip()))
+        with OrmSession(bind=engine) as session:
+            migracao(session)
+            _grava_versao(session.connection(), numero)
+            session.commit()
@@ -1,8 +1,8 @@
-from sqlalchemy import Column, String, Integer, DateTime, ForeignKey
-from datetime import datetime
+from sqlalchemy import Column, String, Integer, ForeignKey, Index
 from typing import Union
+from datetime import datetime
 
-from model.base import Base
+from model.base import Base, TipoUUID, DataHoraUTC, agora_utc
 
 
 class NotaGasto(Base):
@@ -11,19 +11,29 @@ class NotaGasto(Base):
     id = Column(Integer, primary_key=True)
     # Texto da anotação/detalhe
     texto = Column(String(4000))
-    data_insercao = Column(DateTime, default=datetime.now())
+    # gravada em UTC; o default é avaliado a cada inserção
+    data_insercao = Column(DataHoraUTC, default=agora_utc)
 
     # Definição do relacionamento: Chave Estrangeira que aponta para 'gasto'.
-    gasto = Column(Integer, ForeignKey("gasto.pk_gasto"), nullable=False)
+    gasto_id = Column(TipoUUID(), ForeignKey("gasto.pk_gasto"), nullable=False)
+
+    # as notas são sempre lidas pelo gasto, em ordem de inserção, inclusive
+    # as de uma página inteira de gastos de uma só vez (IN)
+    __table_args__ = (
+        Index("ix_nota_gasto_gasto", "gasto_id", "id"),
+    )
 
-    def __init__(self, texto:str, data_insercao:Union[DateTime, None] = None):
+    def __init__(self, texto:str, gasto_id=None, data_insercao:Union[datetime, None] = None):
         """
         Cria uma Nota de Gasto (Comentário/Observação)
 
         Arguments:
             texto: o texto da nota.
-            data_insercao: data de quando a nota foi feita ou inserida.
+            gasto_id: o ID do Gasto ao qual a nota pertence.
+            data_insercao: data de quando a nota foi feita ou inserida (sem fuso, é considerada UTC).
         """
         self.texto = texto
+        if gasto_id:
+            self.gasto_id = gasto_id
         if data_insercao:
-            self.data_insercao = data_insercao
\ No newline at end of file
+            self.data_insercao = data_insercao
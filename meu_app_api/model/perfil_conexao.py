@@ -0,0 +1,39 @@
+import os
+import sqlite3
+
+
+# Com PERFIL_SQL=1, as conexões com o sqlite passam a contar as linhas lidas
+# por cada consulta, medidas pelo perfil de SQL do app (ver perfil_sql.py).
+PERFIL_SQL = os.environ.get("PERFIL_SQL", "0") == "1"
+
+
+class CursorContador(sqlite3.Cursor):
+    """ Cursor do sqlite que conta as linhas lidas, já que o rowcount das
+        consultas SELECT é sempre -1.
+    """
+    linhas = 0
+
+    def fetchone(self):
+        linha = super().fetchone()
+        if linha is not None:
+            self.linhas += 1
+        return linha
+
+    def fetchmany(self, *args, **kwargs):
+        linhas = super().fetchmany(*args, **kwargs)
+        self.linhas += len(linhas)
+        return linhas
+
+    def fetchall(self):
+        linhas = super().fetchall()
+        self.linhas += len(linhas)
+        return linhas
+
+
+class ConexaoContadora(sqlite3.Connection):
+    """ Conexão do sqlite cujos cursores contam as linhas lidas. Usada como
+        factory da engine quando o perfil de SQL está ativo.
+    """
+
+    def cursor(self, factory=CursorContador):
+        return super().cursor(factory)
@@ -0,0 +1,159 @@
+from datetime import datetime, timezone
+from sqlalchemy import Column, String, Integer, event, func, delete, insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session as OrmSession
+
+from model.base import Base, TipoUUID
+from model.gasto import Gasto
+
+
+class ResumoMensal(Base):
+    """ Totais de gastos por categoria e mês, mantidos na mesma transação de
+        cada escrita em gasto para que os relatórios não precisem varrer a
+        tabela de gastos.
+    """
+    __tablename__ = 'resumo_mensal'
+
+    categoria_id = Column(TipoUUID(), primary_key=True)
+    # Mês do gasto no formato AAAA-MM
+    ano_mes = Column(String(7), primary_key=True)
+    # total, mínimo e máximo em centavos, como em Gasto.valor_centavos
+    total = Column(Integer, nullable=False, default=0)
+    quantidade = Column(Integer, nullable=False, default=0)
+    minimo = Column(Integer)
+    maximo = Column(Integer)
+
+
+def chave_resumo(categoria_id, data_gasto):
+    """ Retorna a chave (categoria_id, ano_mes) do resumo de um gasto. O mês
+        é o da data em UTC, como gravada no banco.
+    """
+    if data_gasto.tzinfo is not None:
+        data_gasto = data_gasto.astimezone(timezone.utc)
+    return categoria_id, data_gasto.strftime("%Y-%m")
+
+
+def acumula_resumo(session, acumulados):
+    """ Soma ao resumo os gastos inseridos, agrupados por chave.
+
+        acumulados: dict de (categoria_id, ano_mes) -> [total, quantidade,
+        minimo, maximo] apenas dos gastos novos.
+    """
+    for (categoria_id, ano_mes), (total, quantidade, minimo, maximo) in acumulados.items():
+        comando = sqlite_insert(ResumoMensal).values(
+            categoria_id=categoria_id, ano_mes=ano_mes, total=total,
+            quantidade=quantidade, minimo=minimo, maximo=maximo)
+        excluido = comando.excluded
+        session.execute(comando.on_conflict_do_update(
+            index_elements=[ResumoMensal.categoria_id, ResumoMensal.ano_mes],
+            set_={
+                "total": ResumoMensal.total + excluido.total,
+                "quantidade": ResumoMensal.quantidade + excluido.quantidade,
+                "minimo": func.min(ResumoMensal.minimo, excluido.minimo),
+                "maximo": func.max(ResumoMensal.maximo, excluido.maximo),
+            }))
+
+
+def adiciona_acumulado(acumulados, chave, valor):
+    """ Inclui o valor de um gasto novo no acumulado da sua chave.
+    """
+    atual = acumulados.get(chave)
+    if atual is None:
+        acumulados[chave] = [valor, 1, valor, valor]
+    else:
+        atual[0] += valor
+        atual[1] += 1
+        atual[2] = min(atual[2], valor)
+        atual[3] = max(atual[3], valor)
+
+
+def chaves_afetadas(session, *condicoes):
+    """ Retorna as chaves do resumo dos gastos que atendem às condições.
+    """
+    ano_mes = func.strftime("%Y-%m", Gasto.data_gasto)
+    return {tuple(linha) for linha in session.query(Gasto.categoria_id, ano_mes).filter(*condicoes).distinct()}
+
+
+def recalcula_resumo(session, chaves):
+    """ Recalcula a partir de gasto o resumo das chaves informadas.
+
+        Usado quando gastos são alterados ou removidos, já que mínimo e
+        máximo não podem ser desfeitos de forma incremental. O custo é
+        limitado aos gastos de uma categoria em um mês.
+    """
+    for categoria_id, ano_mes in chaves:
+        inicio = datetime.strptime(ano_mes, "%Y-%m")
+        fim = inicio.replace(year=inicio.year + 1, month=1) if inicio.month == 12 \
+            else inicio.replace(month=inicio.month + 1)
+        total, quantidade, minimo, maximo = session.query(
+            func.sum(Gasto.valor_centavos), func.count(Gasto.id),
+            func.min(Gasto.valor_centavos), func.max(Gasto.valor_centavos)
+        ).filter(
+            Gasto.categoria_id == categoria_id,
+            Gasto.data_gasto >= inicio,
+            Gasto.data_gasto < fim
+        ).one()
+
+        session.execute(delete(ResumoMensal).where(
+            ResumoMensal.categoria_id == categoria_id,
+            ResumoMensal.ano_mes == ano_mes))
+        if quantidade:
+            session.execute(insert(ResumoMensal).values(
+                categoria_id=categoria_id, ano_mes=ano_mes, total=total,
+                quantidade=quantidade, minimo=minimo, maximo=maximo))
+
+
+def reconstroi_resumo(session):
+    """ Apaga e recria todo o resumo a partir da tabela de gastos.
+    """
+    ano_mes = func.strftime("%Y-%m", Gasto.data_gasto)
+    session.execute(delete(ResumoMensal))
+    session.execute(insert(ResumoMensal).from_select(
+        ["categoria_id", "ano_mes", "total", "quantidade", "minimo", "maximo"],
+        session.query(
+            Gasto.categoria_id, ano_mes, func.sum(Gasto.valor_centavos), func.count(Gasto.id),
+            func.min(Gasto.valor_centavos), func.max(Gasto.valor_centavos)
+        ).group_by(Gasto.categoria_id, ano_mes)
+    ))
+
+
+def _valor_anterior(estado, atributo):
+    """ Valor de um atributo antes da alteração pendente no flush.
+    """
+    historico = estado.attrs[atributo].history
+    if historico.deleted:
+        return historico.deleted[0]
+    return getattr(estado.obj(), atributo)
+
+
+@event.listens_for(OrmSession, "after_flush")
+def atualiza_resumo(session, flush_context):
+    """ Mantém o resumo mensal em dia com as alterações de gastos feitas pelo
+        ORM, dentro da mesma transação do flush.
+    """
+    acumulados = {}
+    recalcular = set()
+
+    for gasto in session.new:
+        if isinstance(gasto, Gasto):
+            adiciona_acumulado(acumulados, chave_resumo(gasto.categoria_id, gasto.data_gasto), gasto.valor_centavos)
+
+    for gasto in session.dirty:
+        if not isinstance(gasto, Gasto) or not session.is_modified(gasto):
+            continue
+        estado = gasto._sa_instance_state
+        recalcular.add(chave_resumo(_valor_anterior(estado, "categoria_id"),
+                                    _valor_anterior(estado, "data_gasto")))
+        recalcular.add(chave_resumo(gasto.categoria_id, gasto.data_gasto))
+
+    for gasto in session.deleted:
+        if isinstance(gasto, Gasto):
+            recalcular.add(chave_resumo(gasto.categoria_id, gasto.data_gasto))
+
+    # as chaves recalculadas já incluem os gastos novos
+    for chave in recalcular:
+        acumulados.pop(chave, None)
+    if acumulados:
+        acumula_resumo(session, acumulados)
+    if recalcular:
+        recalcula_resumo(session, recalcular)
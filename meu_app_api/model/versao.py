@@ -0,0 +1,85 @@
+from collections import defaultdict
+from sqlalchemy import Column, String, Integer, event
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session as OrmSession
+
+from model.base import Base
+from model.categoria import Categoria
+from model.gasto import Gasto
+from model.notagasto import NotaGasto
+
+
+class VersaoTabela(Base):
+    """ Contador de alterações de cada tabela, incrementado na mesma transação
+        da escrita. Permite que caches de todos os workers saibam, com uma
+        única leitura, se os dados que guardam ainda são atuais.
+    """
+    __tablename__ = 'versao_tabela'
+
+    tabela = Column(String(50), primary_key=True)
+    versao = Column(Integer, nullable=False, default=0)
+
+
+# classes do modelo cujas alterações incrementam a versão de uma tabela
+TABELAS_VERSIONADAS = {
+    Categoria: "categoria",
+    Gasto: "gasto",
+    # as notas fazem parte da representação do gasto
+    NotaGasto: "gasto",
+}
+
+# funções chamadas após o commit de uma alteração, por tabela
+_ao_alterar = defaultdict(list)
+
+
+def ao_alterar(tabela: str, funcao):
+    """ Registra uma função a ser chamada, neste processo, sempre que uma
+        alteração na tabela for efetivada.
+    """
+    _ao_alterar[tabela].append(funcao)
+
+
+def versao_tabela(session, tabela: str) -> int:
+    """ Retorna a versão atual da tabela (0 se ela nunca foi alterada).
+    """
+    versao = session.query(VersaoTabela.versao).filter(VersaoTabela.tabela == tabela).scalar()
+    return versao or 0
+
+
+def incrementa_versao(session, *tabelas: str):
+    """ Incrementa a versão das tabelas na transação corrente. Deve ser
+        chamada pelas escritas que não passam pelo ORM.
+    """
+    for tabela in tabelas:
+        comando = sqlite_insert(VersaoTabela).values(tabela=tabela, versao=1)
+        session.execute(comando.on_conflict_do_update(
+            index_elements=[VersaoTabela.tabela],
+            set_={"versao": VersaoTabela.versao + 1}))
+    session.info.setdefault("tabelas_alteradas", set()).update(tabelas)
+
+
+@event.listens_for(OrmSession, "after_flush")
+def registra_alteracoes(session, flush_context):
+    """ Incrementa a versão das tabelas alteradas pelo ORM neste flush.
+    """
+    tabelas = set()
+    for objeto in list(session.new) + list(session.deleted):
+        if type(objeto) in TABELAS_VERSIONADAS:
+            tabelas.add(TABELAS_VERSIONADAS[type(objeto)])
+    for objeto in session.dirty:
+        if type(objeto) in TABELAS_VERSIONADAS and session.is_modified(objeto):
+            tabelas.add(TABELAS_VERSIONADAS[type(objeto)])
+    if tabelas:
+        incrementa_versao(session, *tabelas)
+
+
+@event.listens_for(OrmSession, "after_commit")
+def notifica_alteracoes(session):
+    for tabela in session.info.pop("tabelas_alteradas", ()):
+        for funcao in _ao_alterar[tabela]:
+            funcao()
+
+
+@event.listens_for(OrmSession, "after_rollback")
+def descarta_alteracoes(session):
+    session.info.pop("tabelas_alteradas", None)
@@ -0,0 +1,117 @@
+from sqlalchemy import delete, update
+
+from fuso import localiza
+from model import Gasto, NotaGasto, chaves_afetadas, recalcula_resumo, cache_categorias, incrementa_versao
+
+
+# quantidade de ids por comando, abaixo do limite de parâmetros do sqlite
+TAMANHO_GRUPO_IDS = 900
+
+
+def _em_grupos(ids):
+    ids = list(dict.fromkeys(ids))
+    for inicio in range(0, len(ids), TAMANHO_GRUPO_IDS):
+        yield ids[inicio:inicio + TAMANHO_GRUPO_IDS]
+
+
+def _chaves(session, ids):
+    chaves = set()
+    for grupo in _em_grupos(ids):
+        chaves |= chaves_afetadas(session, Gasto.id.in_(grupo))
+    return chaves
+
+
+def valores_alterados(valores, fuso=None):
+    """ Converte o GastoPatchSchema nos valores das colunas a alterar,
+        ignorando os campos não informados, como na atualização parcial.
+        Lança ValueError se nenhum campo for informado.
+    """
+    alterados = {}
+    if valores is not None:
+        if valores.descricao is not None and valores.descricao != "":
+            alterados["descricao"] = valores.descricao
+        if valores.categoria_id is not None:
+            alterados["categoria_id"] = valores.categoria_id
+        if valores.data_gasto is not None:
+            alterados["data_gasto"] = localiza(valores.data_gasto, fuso)
+        if valores.valor is not None:
+            alterados["valor_centavos"] = valores.valor_centavos
+    if not alterados:
+        raise ValueError("nenhum valor informado para atualizar")
+    return alterados
+
+
+def aplica_operacoes(session, operacoes, fuso=None):
+    """ Aplica as operações de remoção e atualização em uma única transação.
+
+        Cada operação vira um DELETE ou UPDATE por grupo de ids, sem carregar
+        os gastos. O resumo mensal é recalculado apenas para as chaves
+        afetadas, antes e depois das alterações. Retorna a quantidade de
+        gastos removidos e atualizados. Lança ValueError, sem alterar nada,
+        se uma operação for inválida.
+    """
+    categorias = cache_categorias.obtem(session)
+    comandos = []
+    ids = []
+    for numero, operacao in enumerate(operacoes, start=1):
+        if operacao.acao == "remover":
+            comandos.append((operacao, None))
+        else:
+            try:
+                alterados = valores_alterados(operacao.valores, fuso)
+            except ValueError as e:
+                raise ValueError("operação %d: %s" % (numero, e))
+            if "categoria_id" in alterados and alterados["categoria_id"] not in categorias:
+                raise ValueError("operação %d: categoria %s não encontrada" % (numero, alterados["categoria_id"]))
+            comandos.append((operacao, alterados))
+        ids.extend(operacao.ids)
+
+    try:
+        chaves = _chaves(session, ids)
+        removidos = atualizados = 0
+        for operacao, alterados in comandos:
+            for grupo in _em_grupos(operacao.ids):
+                if alterados is None:
+                    # o DELETE em lote não passa pelo cascade do ORM: as notas
+                    # dos gastos são removidas antes deles
+                    session.execute(delete(NotaGasto).where(NotaGasto.gasto_id.in_(grupo)),
+                                    execution_options={"synchronize_session": False})
+                    comando = delete(Gasto).where(Gasto.id.in_(grupo))
+                else:
+                    comando = update(Gasto).where(Gasto.id.in_(grupo)).values(**alterados)
+                resultado = session.execute(comando, execution_options={"synchronize_session": False})
+                if alterados is None:
+                    removidos += resultado.rowcount
+                else:
+                    atualizados += resultado.rowcount
+        # as chaves de destino dos gastos que mudaram de categoria ou de mês
+        chaves |= _chaves(session, ids)
+        recalcula_resumo(session, chaves)
+        if removidos or atualizados:
+            incrementa_versao(session, "gasto")
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return removidos, atualizados
+
+
+def recategoriza_gastos(session, origem_id, destino_id):
+    """ Move todos os gastos de uma categoria para outra com um único UPDATE.
+        Retorna a quantidade de gastos movidos.
+    """
+    try:
+        chaves = chaves_afetadas(session, Gasto.categoria_id == origem_id)
+        resultado = session.execute(
+            update(Gasto).where(Gasto.categoria_id == origem_id).values(categoria_id=destino_id),
+            execution_options={"synchronize_session": False})
+        # os mesmos meses passam a contar na categoria de destino
+        chaves |= {(destino_id, ano_mes) for _, ano_mes in chaves}
+        recalcula_resumo(session, chaves)
+        if resultado.rowcount:
+            incrementa_versao(session, "gasto")
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return resultado.rowcount
@@ -0,0 +1,128 @@
+import logging
+import os
+import re
+import time
+import uuid
+from itertools import groupby
+
+from flask import g, request, has_request_context
+from sqlalchemy import event
+
+
+# O perfil de SQL é opcional: com PERFIL_SQL=1 cada requisição recebe um id
+# (X-Request-ID) e todas as consultas feitas nela são medidas. As que passam de
+# PERFIL_SQL_LIMITE_MS vão para o log de consultas lentas.
+LIMITE_LENTA = float(os.environ.get("PERFIL_SQL_LIMITE_MS", 100)) / 1000
+SERVER_TIMING = os.environ.get("PERFIL_SQL_SERVER_TIMING", "0") == "1"
+
+logger = logging.getLogger("sql.perfil")
+logger_lentas = logging.getLogger("sql.lentas")
+
+# ids recebidos do cliente só são aceitos neste formato
+_ID_VALIDO = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+
+def formato_parametros(parametros, executemany=False):
+    """ Descreve os parâmetros de uma consulta pelos seus tipos, sem expor os
+        valores.
+    """
+    if executemany:
+        primeiro = formato_parametros(parametros[0]) if parametros else "()"
+        return "%d x %s" % (len(parametros), primeiro)
+    if isinstance(parametros, dict):
+        return "{%s}" % ", ".join("%s: %s" % (nome, type(valor).__name__) for nome, valor in parametros.items())
+    # tipos repetidos em sequência, como os de um IN, são agrupados
+    tipos = []
+    for tipo, repeticoes in groupby(type(valor).__name__ for valor in parametros or ()):
+        quantidade = sum(1 for _ in repeticoes)
+        tipos.append(tipo if quantidade == 1 else "%d x %s" % (quantidade, tipo))
+    return "(%s)" % ", ".join(tipos)
+
+
+class PerfilSQL:
+    """ Mede cada consulta feita na engine durante as requisições do app.
+
+        Cada consulta é registrada com o texto, o formato dos parâmetros, a
+        duração e as linhas lidas ou alteradas, marcada com o id da
+        requisição. As lentas vão para o logger sql.lentas e, com
+        PERFIL_SQL_SERVER_TIMING=1, a resposta leva o cabeçalho Server-Timing
+        com o tempo gasto no banco.
+    """
+
+    def __init__(self, app=None, engine=None):
+        if app is not None:
+            self.init_app(app, engine)
+
+    def init_app(self, app, engine):
+        app.before_request(self._inicia_requisicao)
+        app.after_request(self._finaliza_resposta)
+        # nas respostas em streaming, o teardown roda de novo ao fim do envio
+        app.teardown_request(self._registra_requisicao)
+        self.observa_engine(engine)
+
+    def observa_engine(self, engine):
+        """ Passa a medir também as consultas feitas em outra engine.
+        """
+        event.listen(engine, "before_cursor_execute", self._inicia_consulta)
+        event.listen(engine, "after_cursor_execute", self._registra_consulta)
+
+    def _inicia_requisicao(self):
+        recebido = request.headers.get("X-Request-ID", "")
+        g.request_id = recebido if _ID_VALIDO.match(recebido) else uuid.uuid4().hex
+        g.perfil_inicio = time.perf_counter()
+        g.perfil_consultas = []
+        g.perfil_registradas = 0
+
+    def _finaliza_resposta(self, response):
+        consultas = g.get("perfil_consultas")
+        if consultas is None:
+            return response
+        response.headers["X-Request-ID"] = g.request_id
+        if SERVER_TIMING:
+            duracao_db = sum(consulta["duracao"] for consulta in consultas)
+            duracao_app = time.perf_counter() - g.perfil_inicio
+            response.headers["Server-Timing"] = 'db;dur=%.2f;desc="%d consultas", app;dur=%.2f' % (
+                duracao_db * 1000, len(consultas), duracao_app * 1000)
+        return response
+
+    def _inicia_consulta(self, conn, cursor, statement, parameters, context, executemany):
+        context._inicio_perfil = time.perf_counter()
+
+    def _registra_consulta(self, conn, cursor, statement, parameters, context, executemany):
+        duracao = time.perf_counter() - context._inicio_perfil
+        if not has_request_context() or g.get("perfil_consultas") is None:
+            return
+        g.perfil_consultas.append({
+            "sql": statement,
+            "parametros": formato_parametros(parameters, executemany),
+            "duracao": duracao,
+            # as linhas de um SELECT só são conhecidas depois de lidas
+            "cursor": cursor if cursor.description is not None else None,
+            "linhas": cursor.rowcount,
+        })
+
+    def _registra_requisicao(self, exception=None):
+        consultas = g.get("perfil_consultas")
+        if not consultas:
+            return
+        # a lista continua recebendo as consultas feitas durante o streaming
+        g.perfil_consultas = []
+        for ordem, consulta in enumerate(consultas, start=g.perfil_registradas + 1):
+            cursor = consulta.pop("cursor")
+            if cursor is not None:
+                consulta["linhas"] = getattr(cursor, "linhas", None)
+            dados = {
+                "request_id": g.request_id,
+                "rota": request.path,
+                "ordem": ordem,
+                "sql": consulta["sql"],
+                "parametros": consulta["parametros"],
+                "duracao_ms": round(consulta["duracao"] * 1000, 3),
+                "linhas": consulta["linhas"],
+            }
+            logger.debug("consulta %d da requisição %s: %.3f ms", ordem, g.request_id, dados["duracao_ms"],
+                         extra=dados)
+            if consulta["duracao"] >= LIMITE_LENTA:
+                logger_lentas.warning("consulta lenta em %s: %.3f ms", request.path, dados["duracao_ms"],
+                                      extra=dados)
+        g.perfil_registradas += len(consultas)
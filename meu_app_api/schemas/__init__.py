@@ -1,4 +1,6 @@
 from schemas.categoria_schema import *
-from schemas.notagasto import NotaGastoSchema, NotaGastoViewSchema
+from schemas.notagasto import NotaGastoSchema, NotaGastoViewSchema, NotaGastoPathSchema, \
+    ListaNotasGastoViewSchema, NotaGastoDelSchema, apresenta_nota, apresenta_notas
 from schemas.gasto_schema import *
 from schemas.error import ErrorSchema
+from schemas.relatorio_schema import *
@@ -1,33 +1,115 @@
+import base64
+import json
 import uuid
 from datetime import datetime
-from typing import Optional, List
-from pydantic import BaseModel, Field
+from decimal import Decimal
+from typing import Optional, List, Literal
+from pydantic import BaseModel, Field, field_validator
 
 
 # Importa os schemas de visualização para aninhamento
 from schemas import *
-from schemas import NotaGastoViewSchema
+from schemas import NotaGastoViewSchema, apresenta_nota
+from model.gasto import para_centavos, de_centavos, VALOR_MAXIMO
+from fuso import fuso_padrao, formata_datas
 
 
 class GastoSchema(BaseModel):
     """ Schema para inserção de um novo Gasto. """
     descricao: str
-    valor: float
+    valor: Decimal = Field(..., ge=-VALOR_MAXIMO, le=VALOR_MAXIMO)
     # O Gasto requer o ID da Categoria
     categoria_id: uuid.UUID
     data_gasto: Optional[datetime] = None
 
+    @property
+    def valor_centavos(self) -> int:
+        """ Valor informado convertido para centavos, como é armazenado. """
+        return para_centavos(self.valor)
+
 class GastoPatchSchema(BaseModel):
     """ Schema para atualização de um novo Gasto. """
     descricao: Optional[str] = Field(None, example="Emergência falta de gás")
-    valor: Optional[float] = Field(None, example=120.0)
+    valor: Optional[Decimal] = Field(None, ge=-VALOR_MAXIMO, le=VALOR_MAXIMO, example=120.0)
     categoria_id: Optional[uuid.UUID] = Field(None, example=uuid.uuid4())
     data_gasto: Optional[datetime] = Field(None, example="2025-09-28T14:48:00")
 
+    @property
+    def valor_centavos(self) -> Optional[int]:
+        """ Valor informado convertido para centavos, como é armazenado. """
+        return para_centavos(self.valor)
+
 class GastoBuscaSchema(BaseModel):
     """ Schema para busca de Gasto por ID. """
     id: uuid.UUID
 
+class GastoFiltroSchema(BaseModel):
+    """ Schema com os filtros aceitos na busca de Gastos. """
+    data_inicio: Optional[datetime] = Field(None, example="2025-09-01T00:00:00")
+    data_fim: Optional[datetime] = Field(None, example="2025-09-30T23:59:59")
+    categoria_id: Optional[uuid.UUID] = Field(None, example=uuid.uuid4())
+    valor_min: Optional[Decimal] = Field(None, ge=-VALOR_MAXIMO, le=VALOR_MAXIMO, example=10.0)
+    valor_max: Optional[Decimal] = Field(None, ge=-VALOR_MAXIMO, le=VALOR_MAXIMO, example=500.0)
+    descricao: Optional[str] = Field(None, example="gás")
+
+class CamposGastoSchema(BaseModel):
+    """ Schema com a escolha dos campos de GastoViewSchema devolvidos nas
+        listagens de Gastos.
+
+        fields recebe os nomes separados por vírgula (por exemplo
+        "id,valor,data_gasto"): só as colunas necessárias são lidas do banco
+        e só esses campos aparecem em cada gasto.
+    """
+    fields: Optional[str] = Field(None, example="id,valor,data_gasto")
+    # quando falso, as notas não são carregadas nem incluídas nos gastos
+    incluir_notas: bool = Field(True, example=True)
+
+    @field_validator("fields")
+    @classmethod
+    def valida_campos(cls, fields):
+        if fields is None:
+            return None
+        nomes = [nome.strip() for nome in fields.split(",") if nome.strip()]
+        if not nomes:
+            raise ValueError("informe ao menos um campo")
+        desconhecidos = [nome for nome in nomes if nome not in GastoViewSchema.model_fields]
+        if desconhecidos:
+            raise ValueError("campos desconhecidos: %s (válidos: %s)" % (
+                ", ".join(desconhecidos), ", ".join(GastoViewSchema.model_fields)))
+        return ",".join(nomes)
+
+    @property
+    def campos(self) -> tuple:
+        """ Campos pedidos, na ordem de GastoViewSchema. """
+        pedidos = set(self.fields.split(",")) if self.fields else set(GastoViewSchema.model_fields)
+        if not self.incluir_notas:
+            pedidos.discard("notas")
+        return tuple(campo for campo in GastoViewSchema.model_fields if campo in pedidos)
+
+class GastoListaQuerySchema(GastoFiltroSchema, CamposGastoSchema):
+    """ Schema para listagem paginada de Gastos.
+
+        A paginação é feita por cursor sobre (data_gasto, id): basta repassar
+        o proximo_cursor recebido na página anterior.
+    """
+    cursor: Optional[str] = Field(None, example="WyIyMDI1LTA5LTI4VDE0OjQ4OjAwIiwgIi4uLiJd")
+    limite: int = Field(50, ge=1, le=500, example=50)
+
+class GastoBuscaTextoQuerySchema(CamposGastoSchema):
+    """ Schema para a busca textual de Gastos, por palavras da descrição ou
+        das notas. Cada palavra também encontra as que começam com ela.
+    """
+    q: str = Field(..., min_length=1, example="mercado")
+    limite: int = Field(50, ge=1, le=500, example=50)
+
+class GastoExportQuerySchema(GastoFiltroSchema, CamposGastoSchema):
+    """ Schema para exportação de Gastos, com os mesmos filtros da listagem.
+        O CSV tem colunas fixas: fields vale apenas para o NDJSON.
+    """
+    formato: Literal["ndjson", "csv"] = Field("ndjson", example="csv")
+    # quando verdadeiro, o arquivo é entregue compactado (.gz)
+    gzip: bool = Field(False, example=False)
+
 class GastoPathSchema(BaseModel):
     """ Schema para busca de uma Gasto. """
     id: Optional[uuid.UUID] = Field(None, example=uuid.uuid4())
@@ -50,6 +132,8 @@ class GastoViewSchema(BaseModel):
 class ListaGastosViewSchema(BaseModel):
     """ Schema para retorno de uma lista de Gastos. """
     gastos: List[GastoViewSchema]
+    # Cursor da próxima página, ausente quando não há mais resultados
+    proximo_cursor: Optional[str] = None
 
 
 class GastoDelSchema(BaseModel):
@@ -58,33 +142,119 @@ class GastoDelSchema(BaseModel):
     descricao: str
 
 
+class GastoImportacaoQuerySchema(BaseModel):
+    """ Schema para os parâmetros da importação de Gastos em lote. """
+    tamanho_lote: int = Field(5000, ge=1, le=50000, example=5000)
 
-def apresenta_gasto(gasto):
-    def formatar_data_br(dt):
-        if not dt:
-            return None
-        from datetime import datetime, timedelta
-        if isinstance(dt, str):
-            try:
-                dt = datetime.fromisoformat(dt.replace('Z', '+00:00'))
-            except Exception:
-                return dt
-        dt_br = dt - timedelta(hours=3)
-        return dt_br.strftime('%Y-%m-%d %H:%M:%S')
-
-    return {
+
+class ErroLinhaSchema(BaseModel):
+    """ Schema para o erro de uma linha rejeitada na importação. """
+    linha: int = Field(..., example=3)
+    mensagem: str = Field(..., example="valor: Input should be a valid decimal")
+
+
+class GastoImportacaoViewSchema(BaseModel):
+    """ Schema para o resultado da importação de Gastos em lote. """
+    inseridos: int = Field(..., example=1200)
+    total_erros: int = Field(..., example=1)
+    # detalhamento limitado às primeiras linhas com erro
+    erros: List[ErroLinhaSchema] = []
+
+
+class OperacaoLoteSchema(BaseModel):
+    """ Schema de uma operação aplicada a vários Gastos de uma vez. """
+    acao: Literal["remover", "atualizar"] = Field(..., example="atualizar")
+    ids: List[uuid.UUID] = Field(..., min_length=1, example=[uuid.uuid4()])
+    # campos a alterar, obrigatório quando a ação é atualizar
+    valores: Optional[GastoPatchSchema] = None
+
+
+class GastoLoteSchema(BaseModel):
+    """ Schema para remoção e atualização de Gastos em lote. """
+    operacoes: List[OperacaoLoteSchema] = Field(..., min_length=1)
+
+
+class GastoLoteViewSchema(BaseModel):
+    """ Schema para o resultado das operações em lote. """
+    removidos: int = Field(..., example=10)
+    atualizados: int = Field(..., example=250)
+
+
+class RecategorizacaoSchema(BaseModel):
+    """ Schema para mover todos os Gastos de uma categoria para outra. """
+    origem_id: uuid.UUID = Field(..., example=uuid.uuid4())
+    destino_id: uuid.UUID = Field(..., example=uuid.uuid4())
+
+
+class RecategorizacaoViewSchema(BaseModel):
+    """ Schema para o resultado da recategorização. """
+    atualizados: int = Field(..., example=1200)
+
+
+
+def formata_data(dt, fuso=None):
+    """ Formata uma data do banco (em UTC) para exibição no fuso informado,
+        por padrão o FUSO_PADRAO.
+    """
+    if not dt:
+        return None
+    if isinstance(dt, str):
+        try:
+            dt = datetime.fromisoformat(dt.replace('Z', '+00:00'))
+        except ValueError:
+            return dt
+    return formata_datas([dt], fuso or fuso_padrao())[0]
+
+
+def apresenta_gasto(gasto, categorias=None, fuso=None, notas=True):
+    """ Retorna uma representação do gasto seguindo o schema definido em
+        GastoViewSchema, com as datas no fuso informado.
+
+        categorias: dict de id -> categoria já apresentada, como o retornado
+        por cache_categorias.obtem. Sem ele, a categoria vem do relacionamento
+        categoria_obj, o que pode exigir uma consulta por gasto.
+        notas: quando falso, as notas não são lidas e ficam fora da
+        representação.
+    """
+    if categorias is not None:
+        categoria = categorias.get(gasto.categoria_id)
+    else:
+        categoria = apresenta_categoria(gasto.categoria_obj) if getattr(gasto, "categoria_obj", None) else None
+
+    representacao = {
         "id": gasto.id,
         "descricao": gasto.descricao,
-        "valor": gasto.valor,
-        "data_insercao": formatar_data_br(gasto.data_insercao),
-        "data_gasto": formatar_data_br(gasto.data_gasto),
-        "categoria_obj": apresenta_categoria(gasto.categoria_obj) if getattr(gasto, "categoria_obj", None) else None,
-        "notas": getattr(gasto, "notas", [])
+        "valor": de_centavos(gasto.valor_centavos),
+        "data_insercao": formata_data(gasto.data_insercao, fuso),
+        "data_gasto": formata_data(gasto.data_gasto, fuso),
+        "categoria_obj": categoria,
     }
+    if notas:
+        representacao["notas"] = [apresenta_nota(nota, fuso) for nota in gasto.notas]
+    return representacao
 
-def apresenta_gastos(gastos):
+def apresenta_gastos(gastos, proximo_cursor=None, categorias=None, fuso=None):
     """Retorna uma lista de gastos serializados."""
     result = []
     for gasto in gastos:
-        result.append(apresenta_gasto(gasto))
-    return {"gastos": result}
\ No newline at end of file
+        result.append(apresenta_gasto(gasto, categorias, fuso))
+    return {"gastos": result, "proximo_cursor": proximo_cursor}
+
+
+def codifica_cursor(gasto):
+    """ Gera o cursor opaco que aponta para o gasto informado, usado na
+        paginação por (data_gasto, id).
+    """
+    chave = json.dumps([gasto.data_gasto.isoformat(), str(gasto.id)])
+    return base64.urlsafe_b64encode(chave.encode()).decode()
+
+
+def decodifica_cursor(cursor: str):
+    """ Recupera (data_gasto, id) a partir de um cursor gerado por
+        codifica_cursor. Lança ValueError se o cursor for inválido.
+    """
+    try:
+        data_gasto, id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(data_gasto), uuid.UUID(id)
+    except Exception as e:
+        raise ValueError("cursor inválido") from e
\ No newline at end of file
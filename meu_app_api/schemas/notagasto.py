@@ -1,13 +1,50 @@
+import uuid
 from datetime import datetime
-from pydantic import BaseModel
+from typing import List
+from pydantic import BaseModel, Field
+
+from fuso import fuso_padrao, formata_datas
 
 class NotaGastoSchema(BaseModel):
     """ Schema para inserção de uma nova NotaGasto (texto). """
-    texto: str
+    texto: str = Field(..., min_length=1, max_length=4000, example="Dividido com a família")
 
 
 class NotaGastoViewSchema(BaseModel):
     """ Schema para retorno/visualização de uma NotaGasto. """
     id: int
     texto: str
-    data_insercao: datetime
\ No newline at end of file
+    data_insercao: datetime
+
+
+class NotaGastoPathSchema(BaseModel):
+    """ Schema para busca de uma NotaGasto de um Gasto. """
+    id: uuid.UUID = Field(..., example=uuid.uuid4())
+    nota_id: int = Field(..., example=1)
+
+
+class ListaNotasGastoViewSchema(BaseModel):
+    """ Schema para retorno das NotaGasto de um Gasto. """
+    notas: List[NotaGastoViewSchema]
+
+
+class NotaGastoDelSchema(BaseModel):
+    """ Schema para mensagem de sucesso ao deletar uma NotaGasto. """
+    id: int
+    mensagem: str
+
+
+def apresenta_nota(nota, fuso=None):
+    """ Retorna uma representação da nota seguindo o schema definido em
+        NotaGastoViewSchema, com a data no fuso informado.
+    """
+    return {
+        "id": nota.id,
+        "texto": nota.texto,
+        "data_insercao": formata_datas([nota.data_insercao], fuso or fuso_padrao())[0],
+    }
+
+
+def apresenta_notas(notas, fuso=None):
+    """ Retorna uma lista de notas serializadas. """
+    return {"notas": [apresenta_nota(nota, fuso) for nota in notas]}
\ No newline at end of file
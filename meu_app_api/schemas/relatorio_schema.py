@@ -0,0 +1,72 @@
+import uuid
+from typing import List, Literal
+from pydantic import BaseModel, Field
+
+from model.gasto import de_centavos
+from schemas.gasto_schema import GastoFiltroSchema
+
+
+class RelatorioPeriodoQuerySchema(GastoFiltroSchema):
+    """ Schema para o relatório de totais por período. """
+    granularidade: Literal["dia", "semana", "mes"] = Field("mes", example="mes")
+
+
+class TotalCategoriaSchema(BaseModel):
+    """ Define como os totais de uma categoria serão retornados. """
+    categoria_id: uuid.UUID
+    nome: str = Field(..., example="Transporte")
+    total: float = Field(..., example=350.9)
+    quantidade: int = Field(..., example=12)
+    minimo: float = Field(..., example=4.5)
+    maximo: float = Field(..., example=120.0)
+
+
+class RelatorioCategoriaViewSchema(BaseModel):
+    """ Define como o relatório de totais por categoria será retornado. """
+    categorias: List[TotalCategoriaSchema]
+
+
+class TotalPeriodoSchema(BaseModel):
+    """ Define como os totais de um período serão retornados. """
+    # dia (AAAA-MM-DD), segunda-feira da semana (AAAA-MM-DD) ou mês (AAAA-MM)
+    periodo: str = Field(..., example="2025-09")
+    total: float = Field(..., example=1280.4)
+    quantidade: int = Field(..., example=37)
+    minimo: float = Field(..., example=2.0)
+    maximo: float = Field(..., example=450.0)
+
+
+class RelatorioPeriodoViewSchema(BaseModel):
+    """ Define como o relatório de totais por período será retornado. """
+    granularidade: str = Field(..., example="mes")
+    periodos: List[TotalPeriodoSchema]
+
+
+def _apresenta_agregados(linha):
+    # os agregados vêm do banco em centavos
+    return {
+        "total": de_centavos(linha.total),
+        "quantidade": linha.quantidade,
+        "minimo": de_centavos(linha.minimo),
+        "maximo": de_centavos(linha.maximo),
+    }
+
+
+def apresenta_relatorio_categorias(linhas):
+    """ Retorna uma representação do relatório seguindo o schema definido em
+        RelatorioCategoriaViewSchema.
+    """
+    return {"categorias": [
+        {"categoria_id": linha.categoria_id, "nome": linha.nome, **_apresenta_agregados(linha)}
+        for linha in linhas
+    ]}
+
+
+def apresenta_relatorio_periodos(linhas, granularidade: str):
+    """ Retorna uma representação do relatório seguindo o schema definido em
+        RelatorioPeriodoViewSchema.
+    """
+    return {"granularidade": granularidade, "periodos": [
+        {"periodo": linha.periodo, **_apresenta_agregados(linha)}
+        for linha in linhas
+    ]}
@@ -0,0 +1,221 @@
+""" Serialização rápida das views de gasto e categoria direto para bytes.
+
+    O formato de cada view é compilado uma única vez a partir dos campos do
+    schema pydantic: cada campo vira um prefixo JSON já codificado e uma
+    função que extrai o valor do objeto do modelo. Assim as listagens não
+    montam um dict por linha nem passam pelo serializador do Flask. O orjson
+    é usado quando instalado; sem ele, o json da biblioteca padrão.
+"""
+import json
+from functools import lru_cache
+
+try:
+    import orjson
+except ImportError:  # o orjson é opcional
+    orjson = None
+
+from schemas.categoria_schema import CategoriaViewSchema
+from schemas.gasto_schema import GastoViewSchema
+from schemas.notagasto import NotaGastoViewSchema
+from fuso import fuso_padrao, formata_datas
+
+
+if orjson is not None:
+    def codifica(valor) -> bytes:
+        """ Codifica um valor simples em JSON. """
+        return orjson.dumps(valor)
+else:
+    _codificador = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), default=str)
+
+    def codifica(valor) -> bytes:
+        """ Codifica um valor simples em JSON. """
+        return _codificador.encode(valor).encode("utf-8")
+
+
+NULO = b"null"
+
+
+class VisaoCompilada:
+    """ Serializador de uma view, montado uma única vez a partir dos campos
+        do schema.
+
+        extratores: dict de campo -> função (objeto, contexto) que retorna o
+        valor do campo já codificado em JSON. Todo campo do schema precisa de
+        um extrator, para que a view e o schema não divirjam.
+        campos: quando informado, apenas esses campos do schema são escritos,
+        na ordem do schema (fieldsets esparsos).
+    """
+
+    def __init__(self, schema, extratores, campos=None):
+        todos = list(schema.model_fields)
+        divergentes = set(todos) ^ set(extratores)
+        if divergentes:
+            raise ValueError("campos sem extrator ou fora de %s: %s" % (schema.__name__, sorted(divergentes)))
+        if campos is not None:
+            desconhecidos = set(campos) - set(todos)
+            if desconhecidos:
+                raise ValueError("campos fora de %s: %s" % (schema.__name__, sorted(desconhecidos)))
+        campos = [campo for campo in todos if campos is None or campo in campos]
+        self._partes = [
+            ((b"{" if indice == 0 else b",") + codifica(campo) + b":", extratores[campo])
+            for indice, campo in enumerate(campos)
+        ]
+
+    def escreve(self, buffer: bytearray, objeto, contexto=None):
+        """ Acrescenta ao buffer o objeto serializado. """
+        for prefixo, extrai in self._partes:
+            buffer += prefixo
+            buffer += extrai(objeto, contexto)
+        buffer += b"}"
+
+    def serializa(self, objeto, contexto=None) -> bytes:
+        buffer = bytearray()
+        self.escreve(buffer, objeto, contexto)
+        return bytes(buffer)
+
+
+def _texto(valor) -> bytes:
+    return NULO if valor is None else b'"%s"' % str(valor).encode()
+
+
+def _valor(centavos) -> bytes:
+    # mesmo resultado de de_centavos seguido do json.dumps do float
+    return NULO if centavos is None else repr(centavos / 100).encode()
+
+
+# a categoria é apresentada a partir do dict do cache de categorias
+VISAO_CATEGORIA = VisaoCompilada(CategoriaViewSchema, {
+    "id": lambda categoria, contexto: _texto(categoria["id"]),
+    "nome": lambda categoria, contexto: codifica(categoria["nome"]),
+    "ordem": lambda categoria, contexto: codifica(categoria["ordem"]),
+})
+
+
+class ContextoGastos:
+    """ Dados compartilhados pelos gastos de uma mesma serialização: as
+        categorias do cache e as datas, no fuso da requisição, codificadas uma
+        única vez cada.
+    """
+
+    def __init__(self, categorias, fuso=None):
+        self.categorias = categorias
+        self.fuso = fuso or fuso_padrao()
+        self._codificadas = {}
+        self._datas = {}
+
+    def prepara_datas(self, datas):
+        """ Formata de uma só vez as datas ainda não formatadas. """
+        novas = [dt for dt in set(datas) if dt not in self._datas]
+        for dt, texto in zip(novas, formata_datas(novas, self.fuso)):
+            self._datas[dt] = NULO if texto is None else b'"%s"' % texto.encode()
+
+    def data(self, dt) -> bytes:
+        codificada = self._datas.get(dt)
+        if codificada is None:
+            self.prepara_datas([dt])
+            codificada = self._datas[dt]
+        return codificada
+
+    def categoria(self, categoria_id) -> bytes:
+        codificada = self._codificadas.get(categoria_id)
+        if codificada is None:
+            categoria = self.categorias.get(categoria_id)
+            codificada = NULO if categoria is None else VISAO_CATEGORIA.serializa(categoria)
+            self._codificadas[categoria_id] = codificada
+        return codificada
+
+
+VISAO_NOTA = VisaoCompilada(NotaGastoViewSchema, {
+    "id": lambda nota, contexto: codifica(nota.id),
+    "texto": lambda nota, contexto: codifica(nota.texto),
+    "data_insercao": lambda nota, contexto: contexto.data(nota.data_insercao),
+})
+
+
+def _notas(gasto, contexto) -> bytes:
+    notas = gasto.notas
+    if not notas:
+        return b"[]"
+    buffer = bytearray(b"[")
+    for indice, nota in enumerate(notas):
+        if indice:
+            buffer += b","
+        VISAO_NOTA.escreve(buffer, nota, contexto)
+    buffer += b"]"
+    return bytes(buffer)
+
+
+_EXTRATORES_GASTO = {
+    "id": lambda gasto, contexto: _texto(gasto.id),
+    "descricao": lambda gasto, contexto: codifica(gasto.descricao),
+    "valor": lambda gasto, contexto: _valor(gasto.valor_centavos),
+    "data_insercao": lambda gasto, contexto: contexto.data(gasto.data_insercao),
+    "data_gasto": lambda gasto, contexto: contexto.data(gasto.data_gasto),
+    "categoria_obj": lambda gasto, contexto: contexto.categoria(gasto.categoria_id),
+    # as notas devem vir carregadas (selectinload), para não haver uma
+    # consulta por gasto
+    "notas": _notas,
+}
+
+VISAO_GASTO = VisaoCompilada(GastoViewSchema, _EXTRATORES_GASTO)
+
+
+@lru_cache(maxsize=None)
+def _visao_campos(campos: tuple):
+    # uma view compilada por combinação de campos pedida (no máximo 2^7)
+    return VisaoCompilada(GastoViewSchema, _EXTRATORES_GASTO, campos)
+
+
+def visao_gasto(campos=None) -> VisaoCompilada:
+    """ Retorna a view de gasto com apenas os campos informados (todos, se
+        None). Os objetos precisam ter apenas os atributos desses campos,
+        como as linhas lidas com projecao_gasto.
+    """
+    return VISAO_GASTO if campos is None else _visao_campos(tuple(campos))
+
+
+def serializa_gasto(gasto, categorias, fuso=None, campos=None) -> bytes:
+    """ Retorna o JSON de um gasto, no formato de GastoViewSchema. """
+    return visao_gasto(campos).serializa(gasto, ContextoGastos(categorias, fuso))
+
+
+def serializa_gastos(gastos, categorias, proximo_cursor=None, fuso=None, campos=None) -> bytes:
+    """ Retorna o JSON de uma listagem de gastos, no formato de
+        ListaGastosViewSchema, escrevendo cada gasto direto no buffer.
+        Com campos, cada gasto leva apenas os campos informados.
+    """
+    contexto = ContextoGastos(categorias, fuso)
+    # as datas da página são convertidas todas de uma vez
+    datas = []
+    if campos is None or "data_gasto" in campos:
+        datas += [gasto.data_gasto for gasto in gastos]
+    if campos is None or "data_insercao" in campos:
+        datas += [gasto.data_insercao for gasto in gastos]
+    if campos is None or "notas" in campos:
+        datas += [nota.data_insercao for gasto in gastos for nota in gasto.notas]
+    contexto.prepara_datas(datas)
+    escreve = visao_gasto(campos).escreve
+    buffer = bytearray(b'{"gastos":[')
+    primeiro = True
+    for gasto in gastos:
+        if not primeiro:
+            buffer += b","
+        primeiro = False
+        escreve(buffer, gasto, contexto)
+    buffer += b'],"proximo_cursor":'
+    buffer += codifica(proximo_cursor)
+    buffer += b"}"
+    return bytes(buffer)
+
+
+def linhas_ndjson(gastos, categorias, fuso=None, campos=None):
+    """ Gera um gasto por linha, já codificado, no formato de GastoViewSchema
+        (apenas com os campos informados, se houver).
+    """
+    contexto = ContextoGastos(categorias, fuso)
+    escreve = visao_gasto(campos).escreve
+    for gasto in gastos:
+        buffer = bytearray()
+        escreve(buffer, gasto, contexto)
+        buffer += b"\n"
+        yield bytes(buffer)
@@ -0,0 +1,18 @@
+""" Testes da API.
+
+    Uso (a partir da pasta meu_app_api):
+        python -m nose2 -v
+    ou
+        python -m pytest -q
+
+    Os testes usam uma base sqlite temporária própria, definida antes da
+    importação do model, e nunca a base configurada em DB_URL.
+
+    Com TESTES_QUANTIDADE_TOTAIS=1000000, o teste dos totais em centavos roda
+    com um milhão de gastos em vez do padrão de 20 mil.
+"""
+import os
+import tempfile
+
+_pasta = tempfile.mkdtemp(prefix="meu_app_api_testes_")
+os.environ["DB_URL"] = "sqlite:///%s" % os.path.join(_pasta, "db.sqlite3")
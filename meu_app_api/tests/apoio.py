@@ -0,0 +1,35 @@
+""" Funções de apoio comuns aos testes. """
+from contextlib import contextmanager
+
+from sqlalchemy import delete, event
+
+from model import Session, engine, Categoria, Gasto, NotaGasto, ResumoMensal, incrementa_versao
+
+
+def limpa_base():
+    """ Remove todos os registros, para que cada teste comece com a base vazia.
+    """
+    session = Session()
+    for modelo in (NotaGasto, Gasto, ResumoMensal, Categoria):
+        session.execute(delete(modelo))
+    # invalida os caches e ETags das representações anteriores
+    incrementa_versao(session, "gasto", "categoria")
+    session.commit()
+    Session.remove()
+
+
+@contextmanager
+def conta_consultas(alvo=engine):
+    """ Conta os comandos enviados ao banco pela engine dentro do bloco.
+        Retorna a lista dos comandos, preenchida ao longo do bloco.
+    """
+    comandos = []
+
+    def registra(conn, cursor, statement, parameters, context, executemany):
+        comandos.append(statement)
+
+    event.listen(alvo, "before_cursor_execute", registra)
+    try:
+        yield comandos
+    finally:
+        event.remove(alvo, "before_cursor_execute", registra)
@@ -0,0 +1,120 @@
+import csv
+import io
+import json
+import unittest
+
+try:
+    from starlette.testclient import TestClient
+    import asgi
+except ImportError:  # o modo ASGI depende de requirements-asgi.txt
+    asgi = None
+
+from app import app
+from tests.apoio import limpa_base
+
+
+@unittest.skipIf(asgi is None, "requer as dependências de requirements-asgi.txt")
+class TestModoASGI(unittest.TestCase):
+    """ As views assíncronas respondem como as rotas do app Flask.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        limpa_base()
+        flask = app.test_client()
+        cls.mercado = flask.post("/categorias", data={"nome": "Mercado", "ordem": 1}).get_json()["id"]
+        cls.lazer = flask.post("/categorias", data={"nome": "Lazer", "ordem": 2}).get_json()["id"]
+        cls.gastos = []
+        for descricao, valor, categoria, data in [
+            ("Feira da semana", "10.00", cls.mercado, "2025-03-10T10:00:00"),
+            ("Supermercado", "20.50", cls.mercado, "2025-04-02T18:30:00"),
+            ("Cinema", "5.25", cls.lazer, "2025-04-05T21:00:00"),
+        ]:
+            gasto = flask.post("/gastos", data={"descricao": descricao, "valor": valor,
+                                                "categoria_id": categoria, "data_gasto": data}).get_json()
+            cls.gastos.append(gasto["id"])
+        flask.post("/gastos/%s/notas" % cls.gastos[0], data={"texto": "Frutas e verduras"})
+
+        cls.contexto = TestClient(asgi.app)
+        cls.cliente = cls.contexto.__enter__()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.contexto.__exit__(None, None, None)
+        limpa_base()
+
+    def test_lista_gastos(self):
+        resposta = self.cliente.get("/gastos")
+        self.assertEqual(resposta.status_code, 200)
+        corpo = resposta.json()
+        self.assertEqual([gasto["id"] for gasto in corpo["gastos"]], self.gastos[::-1])
+        self.assertIsNone(corpo["proximo_cursor"])
+        self.assertEqual(corpo["gastos"][2]["notas"][0]["texto"], "Frutas e verduras")
+        self.assertEqual(corpo["gastos"][0]["categoria_obj"]["nome"], "Lazer")
+
+    def test_lista_paginada_e_filtrada(self):
+        pagina = self.cliente.get("/gastos?limite=1&categoria_id=%s" % self.mercado).json()
+        self.assertEqual([gasto["id"] for gasto in pagina["gastos"]], [self.gastos[1]])
+        seguinte = self.cliente.get("/gastos?limite=1&categoria_id=%s&cursor=%s" % (
+            self.mercado, pagina["proximo_cursor"])).json()
+        self.assertEqual([gasto["id"] for gasto in seguinte["gastos"]], [self.gastos[0]])
+
+    def test_etag_304(self):
+        for url in ("/gastos", "/gastos/%s" % self.gastos[0], "/categorias", "/relatorios/por-categoria"):
+            resposta = self.cliente.get(url)
+            etag = resposta.headers["ETag"]
+            nao_modificado = self.cliente.get(url, headers={"If-None-Match": etag})
+            self.assertEqual(nao_modificado.status_code, 304, url)
+            self.assertEqual(nao_modificado.content, b"")
+        # o fuso faz parte do ETag das representações com datas
+        etag = self.cliente.get("/gastos").headers["ETag"]
+        resposta = self.cliente.get("/gastos?tz=UTC", headers={"If-None-Match": etag})
+        self.assertEqual(resposta.status_code, 200)
+
+    def test_mesma_resposta_do_flask(self):
+        flask = app.test_client()
+        for url in ("/gastos", "/gastos/%s" % self.gastos[0], "/gastos/busca?q=merc",
+                    "/gastos/%s/notas" % self.gastos[0], "/relatorios/por-periodo?granularidade=mes"):
+            self.assertEqual(self.cliente.get(url).json(), flask.get(url).get_json(), url)
+
+    def test_exporta_csv(self):
+        resposta = self.cliente.get("/gastos/export?formato=csv")
+        self.assertEqual(resposta.status_code, 200)
+        self.assertIn("gastos.csv", resposta.headers["Content-Disposition"])
+        linhas = list(csv.DictReader(io.StringIO(resposta.text)))
+        self.assertEqual([linha["descricao"] for linha in linhas], ["Cinema", "Supermercado", "Feira da semana"])
+
+    def test_exporta_ndjson(self):
+        resposta = self.cliente.get("/gastos/export?formato=ndjson&fields=id,valor")
+        linhas = [json.loads(linha) for linha in resposta.text.splitlines()]
+        self.assertEqual(linhas, [{"id": self.gastos[2], "valor": 5.25}, {"id": self.gastos[1], "valor": 20.5},
+                                  {"id": self.gastos[0], "valor": 10.0}])
+
+    def test_relatorios(self):
+        por_categoria = self.cliente.get("/relatorios/por-categoria").json()
+        self.assertEqual(self.cliente.get("/relatorios/por-categoria").json(),
+                         app.test_client().get("/relatorios/por-categoria").get_json())
+        totais = {item["categoria_id"]: item["total"] for item in por_categoria["categorias"]}
+        self.assertEqual(totais, {self.mercado: 30.5, self.lazer: 5.25})
+
+        por_mes = self.cliente.get("/relatorios/por-periodo?granularidade=mes").json()
+        self.assertEqual([(item["periodo"], item["total"]) for item in por_mes["periodos"]],
+                         [("2025-03", 10.0), ("2025-04", 25.75)])
+
+    def test_busca_e_notas(self):
+        busca = self.cliente.get("/gastos/busca?q=verdura").json()
+        self.assertEqual([gasto["id"] for gasto in busca["gastos"]], [self.gastos[0]])
+        self.assertEqual(self.cliente.get("/gastos/busca?q=%21%21").status_code, 400)
+        notas = self.cliente.get("/gastos/%s/notas" % self.gastos[0]).json()
+        self.assertEqual([nota["texto"] for nota in notas["notas"]], ["Frutas e verduras"])
+
+    def test_escritas_seguem_no_flask(self):
+        resposta = self.cliente.post("/categorias", data={"nome": "Saúde", "ordem": 3})
+        self.assertEqual(resposta.status_code, 201)
+        nomes = [categoria["nome"] for categoria in self.cliente.get("/categorias").json()["categorias"]]
+        self.assertIn("Saúde", nomes)
+        self.assertEqual(self.cliente.delete("/categoria/%s" % resposta.json()["id"]).status_code, 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
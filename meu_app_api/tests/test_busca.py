@@ -0,0 +1,134 @@
+import os
+import tempfile
+import unittest
+import uuid
+from unittest import mock
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session as OrmSession
+
+from app import app
+from model import Base, Gasto, engine, aplica_migracoes, busca_gastos
+from model.migracoes import MIGRACOES, versao_banco
+from tests.apoio import limpa_base
+from tests.test_centavos import ESQUEMA_INICIAL
+
+
+def rowids_gasto(conexao):
+    return dict(conexao.execute(text("SELECT pk_gasto, rowid FROM gasto")).all())
+
+
+class TestBuscaAposVacuum(unittest.TestCase):
+    """ O índice de busca continua apontando para os gastos certos depois de
+        um VACUUM, que pode renumerar os rowids de gasto.
+    """
+
+    def setUp(self):
+        limpa_base()
+        self.cliente = app.test_client()
+        categoria = self.cliente.post("/categorias", data={"nome": "Mercado"}).get_json()["id"]
+        self.ids = {}
+        for indice in range(30):
+            descricao = "Gasto numero%d" % indice
+            self.ids[descricao] = self.cliente.post("/gastos", data={
+                "descricao": descricao, "valor": "1.00", "categoria_id": categoria}).get_json()["id"]
+        # gastos removidos no meio, que não devem voltar na busca
+        for indice in range(10):
+            self.cliente.delete("/gasto/%s" % self.ids.pop("Gasto numero%d" % indice))
+        primeiro = self.ids["Gasto numero10"]
+        self.cliente.post("/gastos/%s/notas" % primeiro, data={"texto": "Frutas e verduras"})
+
+    def tearDown(self):
+        limpa_base()
+
+    def busca(self, texto):
+        resposta = self.cliente.get("/gastos/busca?q=%s&fields=id,descricao" % texto)
+        return [(gasto["id"], gasto["descricao"]) for gasto in resposta.get_json()["gastos"]]
+
+    def test_busca_apos_vacuum(self):
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conexao:
+            antes = rowids_gasto(conexao)
+            conexao.exec_driver_sql("VACUUM")
+            # o VACUUM pode renumerar os gastos, mas nem sempre o faz: aqui a
+            # renumeração é forçada, invertendo a ordem dos rowids
+            conexao.exec_driver_sql("UPDATE gasto SET rowid = -rowid")
+            conexao.exec_driver_sql("UPDATE gasto SET rowid = 100 + rowid")
+            self.assertNotEqual(rowids_gasto(conexao), antes)
+
+        for descricao, id in self.ids.items():
+            self.assertEqual(self.busca(descricao.split()[1]), [(id, descricao)])
+        self.assertEqual(self.busca("numero5"), [])
+        self.assertEqual(self.busca("verdura"), [(self.ids["Gasto numero10"], "Gasto numero10")])
+
+        # as triggers seguem a mesma chave depois do VACUUM
+        id = self.ids["Gasto numero20"]
+        self.cliente.patch("/gastos/%s" % id, data={"descricao": "Padaria"})
+        self.assertEqual(self.busca("padaria"), [(id, "Padaria")])
+        self.assertEqual(self.busca("numero20"), [])
+        self.cliente.delete("/gasto/%s" % id)
+        self.assertEqual(self.busca("padaria"), [])
+
+
+class TestMigracaoBusca(unittest.TestCase):
+    """ Uma base da versão inicial da API ganha o índice de busca, com a
+        descrição e as notas dos gastos, ao ser migrada.
+    """
+
+    def setUp(self):
+        self.pasta = tempfile.TemporaryDirectory()
+        self.engine = create_engine("sqlite:///%s" % os.path.join(self.pasta.name, "antiga.sqlite3"))
+        categoria_id, self.feira, self.cinema = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+        with self.engine.begin() as conexao:
+            for comando in ESQUEMA_INICIAL:
+                conexao.exec_driver_sql(comando)
+            conexao.exec_driver_sql("INSERT INTO categoria VALUES (?, 'Mercado', 1)", (categoria_id.hex,))
+            conexao.exec_driver_sql(
+                "INSERT INTO gasto (pk_gasto, descricao, valor, data_gasto, categoria_id) "
+                "VALUES (?, ?, 10.0, '2025-03-02 10:00:00', ?)",
+                [(self.feira.hex, "Feira", categoria_id.hex), (self.cinema.hex, "Cinema", categoria_id.hex)])
+            conexao.exec_driver_sql(
+                "INSERT INTO nota_gasto (texto, gasto) VALUES ('Frutas e verduras', ?)", (self.feira.hex,))
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.pasta.cleanup()
+
+    def test_migra_busca(self):
+        Base.metadata.create_all(self.engine)
+        aplica_migracoes(self.engine)
+
+        with OrmSession(self.engine) as session:
+            def busca(texto):
+                return [gasto.id for gasto in busca_gastos(session, texto)]
+
+            self.assertEqual(busca("feira"), [self.feira])
+            self.assertEqual(busca("verduras"), [self.feira])
+            self.assertEqual(busca("cine"), [self.cinema])
+
+            # e as triggers mantêm o índice a partir daí
+            session.add(Gasto("Cinema com pipoca", 5, session.get(Gasto, self.cinema).categoria_id))
+            session.commit()
+            self.assertEqual(len(busca("pipoca")), 1)
+
+    def test_indice_criado_na_versao_4(self):
+        Base.metadata.create_all(self.engine)
+        # só até a migração que cria o índice, quando nota_gasto ainda tem a
+        # coluna gasto: as descrições já são indexadas, as notas ainda não
+        with mock.patch("model.migracoes.MIGRACOES", MIGRACOES[:4]):
+            aplica_migracoes(self.engine)
+        with self.engine.connect() as conexao:
+            self.assertEqual(versao_banco(conexao), 4)
+            encontrados = conexao.execute(text(
+                "SELECT b.pk_gasto FROM gasto_fts JOIN gasto_busca b ON b.id = gasto_fts.rowid "
+                "WHERE gasto_fts MATCH :texto"), {"texto": "feira"}).scalars().all()
+            self.assertEqual(encontrados, [self.feira.hex])
+            self.assertEqual(conexao.execute(text(
+                "SELECT count(*) FROM gasto_fts WHERE gasto_fts MATCH 'verduras'")).scalar(), 0)
+
+        aplica_migracoes(self.engine)
+        with OrmSession(self.engine) as session:
+            self.assertEqual([gasto.id for gasto in busca_gastos(session, "verduras")], [self.feira])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+import uuid
+from unittest import mock
+
+from sqlalchemy import text
+
+from app import app
+from model import engine, cache_categorias
+from tests.apoio import limpa_base, conta_consultas
+
+
+class TestCacheCategorias(unittest.TestCase):
+    """ O cache de categorias é servido sem acessar o banco e invalidado
+        pelas escritas deste processo e, após a validade, pelas de outros.
+    """
+
+    def setUp(self):
+        limpa_base()
+        self.cliente = app.test_client()
+        self.mercado = self.cliente.post("/categorias", data={"nome": "Mercado"}).get_json()["id"]
+
+    def tearDown(self):
+        limpa_base()
+
+    def nomes(self):
+        return sorted(categoria["nome"] for categoria in self.cliente.get("/categorias").get_json()["categorias"])
+
+    def test_servido_da_memoria(self):
+        self.nomes()
+        with mock.patch.object(cache_categorias, "validade", 60), conta_consultas() as comandos:
+            self.assertEqual(self.nomes(), ["Mercado"])
+        self.assertFalse([comando for comando in comandos if "FROM categoria" in comando])
+
+    def test_invalidado_pelas_escritas(self):
+        with mock.patch.object(cache_categorias, "validade", 60):
+            self.assertEqual(self.nomes(), ["Mercado"])
+            lazer = self.cliente.post("/categorias", data={"nome": "Lazer"}).get_json()["id"]
+            self.assertEqual(self.nomes(), ["Lazer", "Mercado"])
+            self.cliente.put("/categorias/%s" % self.mercado, data={"nome": "Feira"})
+            self.assertEqual(self.nomes(), ["Feira", "Lazer"])
+            self.cliente.delete("/categoria/%s" % lazer)
+            self.assertEqual(self.nomes(), ["Feira"])
+
+    def test_escrita_de_outro_processo(self):
+        self.nomes()
+        # como faria outro worker: a categoria e a nova versão, sem passar
+        # pelo ORM deste processo
+        with engine.begin() as conexao:
+            conexao.execute(text("INSERT INTO categoria (pk_categoria, nome, ordem) VALUES (:id, 'Lazer', 2)"),
+                            {"id": uuid.uuid4().hex})
+            conexao.execute(text("UPDATE versao_tabela SET versao = versao + 1 WHERE tabela = 'categoria'"))
+        with mock.patch.object(cache_categorias, "validade", 60):
+            self.assertEqual(self.nomes(), ["Mercado"])
+        # vencida a validade, a versão é consultada e o cache recarregado
+        with mock.patch.object(cache_categorias, "validade", 0):
+            self.assertEqual(self.nomes(), ["Lazer", "Mercado"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,203 @@
+import os
+import random
+import tempfile
+import unittest
+import uuid
+from decimal import Decimal, ROUND_HALF_UP
+
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import Session as OrmSession
+
+from app import app
+from model import Base, Categoria, Gasto, ResumoMensal, reconstroi_resumo, totais_por_categoria, \
+    aplica_migracoes
+from model.gasto import para_centavos, de_centavos
+from schemas import GastoFiltroSchema
+from tests.apoio import limpa_base
+
+
+class TestParaCentavos(unittest.TestCase):
+
+    def test_arredonda_meio_centavo_para_cima(self):
+        self.assertEqual(para_centavos(Decimal("0.285")), 29)
+        self.assertEqual(para_centavos(Decimal("1.005")), 101)
+        self.assertEqual(para_centavos(Decimal("-1.005")), -101)
+        self.assertEqual(para_centavos(Decimal("10.004")), 1000)
+
+    def test_floats_usam_a_representacao_decimal(self):
+        # 0.145 em binário é 0.14499999..., mas é lido como o texto "0.145"
+        self.assertEqual(para_centavos(0.145), 15)
+        self.assertEqual(para_centavos(0.1 + 0.2), 30)
+
+    def test_valor_fora_do_limite(self):
+        for valor in (Decimal("1e30"), 1e30, Decimal("-1e11")):
+            with self.assertRaises(ValueError):
+                para_centavos(valor)
+
+    def test_valor_nao_finito(self):
+        for valor in (Decimal("NaN"), Decimal("Infinity"), float("inf"), "abc"):
+            with self.assertRaises(ValueError):
+                para_centavos(valor)
+
+
+class TestValidacaoValor(unittest.TestCase):
+    """ Valores grandes demais são recusados na validação, sem erro 500.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        limpa_base()
+        cls.cliente = app.test_client()
+        cls.categoria_id = cls.cliente.post("/categorias", data={"nome": "Mercado", "ordem": 1}).get_json()["id"]
+        cls.gasto_id = cls.cliente.post("/gastos", data={
+            "descricao": "Feira", "valor": "12.50", "categoria_id": cls.categoria_id}).get_json()["id"]
+
+    @classmethod
+    def tearDownClass(cls):
+        limpa_base()
+
+    def test_post(self):
+        resposta = self.cliente.post("/gastos", data={
+            "descricao": "Caro", "valor": "1e30", "categoria_id": self.categoria_id})
+        self.assertEqual(resposta.status_code, 422)
+
+    def test_patch(self):
+        resposta = self.cliente.patch("/gastos/%s" % self.gasto_id, data={"valor": "1e30"})
+        self.assertEqual(resposta.status_code, 422)
+
+    def test_filtro(self):
+        self.assertEqual(self.cliente.get("/gastos?valor_min=1e30").status_code, 422)
+        self.assertEqual(self.cliente.get("/gastos?valor_max=-1e30").status_code, 422)
+        self.assertEqual(self.cliente.get("/relatorios/por-categoria?valor_min=1e30").status_code, 422)
+
+    def test_batch(self):
+        resposta = self.cliente.post("/gastos/batch", json={"operacoes": [
+            {"acao": "atualizar", "ids": [self.gasto_id], "valores": {"valor": "1e30"}}]})
+        self.assertEqual(resposta.status_code, 422)
+        self.assertEqual(self.cliente.get("/gastos/%s" % self.gasto_id).get_json()["valor"], 12.5)
+
+    def test_bulk_rejeita_apenas_a_linha(self):
+        resposta = self.cliente.post("/gastos/bulk", json=[
+            {"descricao": "Ok", "valor": "3.10", "categoria_id": self.categoria_id},
+            {"descricao": "Caro", "valor": "1e30", "categoria_id": self.categoria_id},
+        ])
+        self.assertEqual(resposta.status_code, 200)
+        corpo = resposta.get_json()
+        self.assertEqual(corpo["inseridos"], 1)
+        self.assertEqual(corpo["total_erros"], 1)
+        self.assertEqual(corpo["erros"][0]["linha"], 2)
+
+
+class TestTotaisCentavos(unittest.TestCase):
+    """ Os totais de muitos gastos batem, ao centavo, com a soma exata dos
+        valores informados, arredondados para centavos.
+    """
+    # TESTES_QUANTIDADE_TOTAIS=1000000 repete o teste com um milhão de gastos
+    QUANTIDADE = int(os.environ.get("TESTES_QUANTIDADE_TOTAIS", 20000))
+    # valores nas bordas do arredondamento: meios centavos e frações que não
+    # têm representação exata em float
+    BORDAS = ["0.005", "0.015", "0.285", "1.005", "2.675", "1234.565", "0.1", "0.2", "0.3", "0.7",
+              "99999.995"]
+
+    def test_totais(self):
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        aleatorio = random.Random(2024)
+        categorias = [uuid.UUID(int=aleatorio.getrandbits(128), version=4) for _ in range(5)]
+        esperados = dict.fromkeys(categorias, Decimal(0))
+        linhas = []
+        for _ in range(self.QUANTIDADE):
+            categoria_id = aleatorio.choice(categorias)
+            # metade dos valores com centavos, como digitados; a outra, nas bordas
+            if aleatorio.random() < 0.5:
+                valor = Decimal(aleatorio.randrange(1, 5000000)).scaleb(-2)
+            else:
+                valor = Decimal(aleatorio.choice(self.BORDAS))
+            esperados[categoria_id] += valor.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+            linhas.append((uuid.UUID(int=aleatorio.getrandbits(128), version=4).hex, str(valor),
+                           para_centavos(valor), categoria_id.hex, "2025-01-%02d 12:00:00" % aleatorio.randint(1, 28)))
+
+        with OrmSession(engine) as session:
+            session.add_all(Categoria("Categoria %d" % indice) for indice in range(len(categorias)))
+            session.flush()
+            for categoria, categoria_id in zip(session.query(Categoria), categorias):
+                categoria.id = categoria_id
+            session.flush()
+            session.connection().exec_driver_sql(
+                "INSERT INTO gasto (pk_gasto, descricao, valor_centavos, categoria_id, data_gasto) "
+                "VALUES (?, ?, ?, ?, ?)", linhas)
+            reconstroi_resumo(session)
+
+            total = session.query(func.sum(Gasto.valor_centavos)).scalar()
+            self.assertEqual(Decimal(total).scaleb(-2), sum(esperados.values()))
+
+            # pelos dois caminhos dos relatórios: GROUP BY em gasto e resumo mensal
+            self.assertEqual(session.query(func.sum(ResumoMensal.total)).scalar(), total)
+            filtros = (GastoFiltroSchema(), GastoFiltroSchema(valor_min=Decimal("0.01")))
+            for filtro in filtros:
+                linhas_relatorio = totais_por_categoria(session, filtro)
+                self.assertEqual(
+                    {linha.categoria_id: Decimal(linha.total).scaleb(-2) for linha in linhas_relatorio},
+                    esperados)
+        engine.dispose()
+
+
+# esquema da base antes da conversão para centavos, como criado pela versão
+# inicial da API (sem migrações aplicadas)
+ESQUEMA_INICIAL = [
+    "CREATE TABLE categoria (pk_categoria CHAR(32) NOT NULL, nome VARCHAR(100) NOT NULL, ordem INTEGER, "
+    "PRIMARY KEY (pk_categoria), UNIQUE (nome))",
+    "CREATE TABLE gasto (pk_gasto CHAR(32) NOT NULL, descricao VARCHAR(140), valor FLOAT, "
+    "data_insercao DATETIME, data_gasto DATETIME, categoria_id CHAR(32) NOT NULL, PRIMARY KEY (pk_gasto), "
+    "FOREIGN KEY(categoria_id) REFERENCES categoria (pk_categoria))",
+    "CREATE TABLE nota_gasto (id INTEGER NOT NULL, texto VARCHAR(4000), data_insercao DATETIME, "
+    "gasto INTEGER NOT NULL, PRIMARY KEY (id), FOREIGN KEY(gasto) REFERENCES gasto (pk_gasto))",
+]
+
+
+class TestMigracaoCentavos(unittest.TestCase):
+    """ A migração de uma base com valores em float arredonda como as
+        escritas da API.
+    """
+    VALORES = [0.285, 1.005, 0.145, 10.0, 0.1 + 0.2, 1234.565, 99.99, -2.675]
+
+    def setUp(self):
+        self.pasta = tempfile.TemporaryDirectory()
+        self.engine = create_engine("sqlite:///%s" % os.path.join(self.pasta.name, "antiga.sqlite3"))
+        self.categoria_id = uuid.uuid4()
+        with self.engine.begin() as conexao:
+            for comando in ESQUEMA_INICIAL:
+                conexao.exec_driver_sql(comando)
+            conexao.exec_driver_sql("INSERT INTO categoria VALUES (?, 'Mercado', 1)", (self.categoria_id.hex,))
+            conexao.exec_driver_sql(
+                "INSERT INTO gasto (pk_gasto, descricao, valor, data_insercao, data_gasto, categoria_id) "
+                "VALUES (?, ?, ?, '2025-03-01 10:00:00', '2025-03-02 10:00:00', ?)",
+                [(uuid.uuid4().hex, "gasto %d" % indice, valor, self.categoria_id.hex)
+                 for indice, valor in enumerate(self.VALORES)])
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.pasta.cleanup()
+
+    def test_migra_valores(self):
+        # como na inicialização: create_all das tabelas novas e as migrações
+        Base.metadata.create_all(self.engine)
+        aplica_migracoes(self.engine)
+
+        with OrmSession(self.engine) as session:
+            gastos = {gasto.descricao: gasto.valor_centavos for gasto in session.query(Gasto)}
+            self.assertEqual(gastos, {"gasto %d" % indice: para_centavos(valor)
+                                      for indice, valor in enumerate(self.VALORES)})
+            self.assertEqual(gastos["gasto 0"], 29)
+            self.assertEqual(gastos["gasto 1"], 101)
+            self.assertEqual(gastos["gasto 2"], 15)
+
+            resumo = session.query(ResumoMensal).one()
+            self.assertEqual((resumo.categoria_id, resumo.ano_mes), (self.categoria_id, "2025-03"))
+            self.assertEqual(resumo.total, sum(gastos.values()))
+            self.assertEqual(resumo.quantidade, len(self.VALORES))
+            self.assertEqual(de_centavos(resumo.maximo), 1234.57)
+
+
+if __name__ == "__main__":
+    unittest.main()
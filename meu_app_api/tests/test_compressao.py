@@ -0,0 +1,84 @@
+import gzip
+import unittest
+
+from app import app
+from compressao import COMPRESSORES, TAMANHO_MINIMO
+from tests.apoio import limpa_base
+
+
+def descomprime(codificacao, dados):
+    if codificacao == "gzip":
+        return gzip.decompress(dados)
+    if codificacao == "br":
+        import brotli
+        return brotli.decompress(dados)
+    import zstandard
+    return zstandard.ZstdDecompressor().decompressobj().decompress(dados)
+
+
+class TestCompressao(unittest.TestCase):
+    """ As respostas são comprimidas com o algoritmo negociado pelo
+        Accept-Encoding e levam o ETag na forma fraca.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        limpa_base()
+        cls.cliente = app.test_client()
+        categoria = cls.cliente.post("/categorias", data={"nome": "Mercado"}).get_json()["id"]
+        for indice in range(30):
+            cls.cliente.post("/gastos", data={"descricao": "Gasto %d" % indice, "valor": "10.00",
+                                              "categoria_id": categoria})
+
+    @classmethod
+    def tearDownClass(cls):
+        limpa_base()
+
+    def test_sem_accept_encoding(self):
+        resposta = self.cliente.get("/gastos")
+        self.assertNotIn("Content-Encoding", resposta.headers)
+        self.assertIn("Accept-Encoding", resposta.headers["Vary"])
+        self.assertFalse(resposta.headers["ETag"].startswith("W/"))
+
+    def test_cada_algoritmo(self):
+        original = self.cliente.get("/gastos")
+        self.assertGreater(len(original.get_data()), TAMANHO_MINIMO)
+        for codificacao in COMPRESSORES:
+            resposta = self.cliente.get("/gastos", headers={"Accept-Encoding": codificacao})
+            self.assertEqual(resposta.headers["Content-Encoding"], codificacao)
+            self.assertEqual(descomprime(codificacao, resposta.get_data()), original.get_data())
+            self.assertLess(len(resposta.get_data()), len(original.get_data()))
+            # mesmo ETag, na forma fraca
+            self.assertEqual(resposta.headers["ETag"], "W/" + original.headers["ETag"])
+
+    def test_preferencia_do_cliente(self):
+        resposta = self.cliente.get("/gastos", headers={"Accept-Encoding": "gzip;q=1.0, br;q=0.5, zstd;q=0.1"})
+        self.assertEqual(resposta.headers["Content-Encoding"], "gzip")
+        resposta = self.cliente.get("/gastos", headers={"Accept-Encoding": "gzip;q=0, identity"})
+        self.assertNotIn("Content-Encoding", resposta.headers)
+
+    def test_304_com_etag_fraco(self):
+        etag = self.cliente.get("/gastos", headers={"Accept-Encoding": "gzip"}).headers["ETag"]
+        resposta = self.cliente.get("/gastos", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+        self.assertEqual(resposta.status_code, 304)
+        self.assertNotIn("Content-Encoding", resposta.headers)
+
+    def test_respostas_pequenas_nao_comprimidas(self):
+        resposta = self.cliente.get("/gastos/00000000-0000-0000-0000-000000000000",
+                                    headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(resposta.status_code, 404)
+        self.assertNotIn("Content-Encoding", resposta.headers)
+
+    def test_exportacao_em_streaming(self):
+        original = self.cliente.get("/gastos/export?formato=ndjson").get_data()
+        resposta = self.cliente.get("/gastos/export?formato=ndjson", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(resposta.headers["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(resposta.get_data()), original)
+        # o arquivo .gz já vem comprimido e não é comprimido de novo
+        resposta = self.cliente.get("/gastos/export?formato=ndjson&gzip=true", headers={"Accept-Encoding": "gzip"})
+        self.assertNotIn("Content-Encoding", resposta.headers)
+        self.assertEqual(gzip.decompress(resposta.get_data()), original)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import unittest
+
+from sqlalchemy import insert
+
+from app import app
+from model import Session, NotaGasto
+from benchmarks.dados import popula_banco
+from tests.apoio import limpa_base, conta_consultas
+
+
+# comandos de uma página da listagem: versões de categoria e de gasto,
+# categorias (quando o cache expira), os gastos e as notas da página
+MAX_CONSULTAS_PAGINA = 5
+
+
+class TestConsultasListagemGastos(unittest.TestCase):
+    """ A quantidade de consultas de uma página da listagem não depende da
+        quantidade de gastos nela (sem N+1 para categorias ou notas).
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        limpa_base()
+        session = Session()
+        _, cls.ids = popula_banco(session, categorias=8, gastos=1000, semente=7)
+        session.execute(insert(NotaGasto), [
+            {"texto": "nota do gasto %d" % indice, "gasto_id": id}
+            for indice, id in enumerate(cls.ids)
+        ])
+        session.commit()
+        Session.remove()
+        cls.cliente = app.test_client()
+
+    @classmethod
+    def tearDownClass(cls):
+        limpa_base()
+
+    def lista_todos(self, url):
+        """ Percorre todas as páginas da listagem. Retorna os gastos e a
+            quantidade de consultas de cada página.
+        """
+        gastos, consultas = [], []
+        proxima = url
+        while proxima:
+            with conta_consultas() as comandos:
+                resposta = self.cliente.get(proxima)
+            self.assertEqual(resposta.status_code, 200)
+            consultas.append(len(comandos))
+            corpo = resposta.get_json()
+            gastos.extend(corpo["gastos"])
+            proxima = corpo["proximo_cursor"] and "%s&cursor=%s" % (url, corpo["proximo_cursor"])
+        return gastos, consultas
+
+    def test_lista_com_notas(self):
+        gastos, consultas = self.lista_todos("/gastos?limite=500")
+        self.assertEqual(len(gastos), 1000)
+        self.assertEqual(len(consultas), 2)
+        self.assertLessEqual(max(consultas), MAX_CONSULTAS_PAGINA)
+        for gasto in gastos:
+            self.assertIsNotNone(gasto["categoria_obj"])
+            self.assertEqual(len(gasto["notas"]), 1)
+
+    def test_consultas_nao_dependem_do_tamanho_da_pagina(self):
+        _, pequenas = self.lista_todos("/gastos?limite=5&data_fim=2024-01-20T00:00:00")
+        _, grandes = self.lista_todos("/gastos?limite=500")
+        self.assertLessEqual(max(pequenas + grandes), MAX_CONSULTAS_PAGINA)
+
+    def test_lista_sem_notas(self):
+        gastos, consultas = self.lista_todos("/gastos?limite=500&incluir_notas=false")
+        self.assertEqual(len(gastos), 1000)
+        # sem a consulta das notas
+        self.assertLessEqual(max(consultas), MAX_CONSULTAS_PAGINA - 1)
+        self.assertNotIn("notas", gastos[0])
+
+    def test_lista_com_campos(self):
+        gastos, consultas = self.lista_todos("/gastos?limite=500&fields=id,valor,categoria_obj")
+        self.assertEqual(len(gastos), 1000)
+        self.assertLessEqual(max(consultas), MAX_CONSULTAS_PAGINA - 1)
+        self.assertEqual(set(gastos[0]), {"id", "valor", "categoria_obj"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,167 @@
+import contextlib
+import io
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import unittest
+import uuid
+
+from app import app
+from converte_uuid import COLUNAS_UUID, converte_uuids
+from model import engine
+from tests.apoio import limpa_base
+
+
+# tabelas com os dados da API (os ids de gasto_busca podem ser refeitos)
+TABELAS = ["categoria", "gasto", "nota_gasto", "resumo_mensal"]
+
+# requisições que comparam as respostas nos dois formatos de armazenamento
+URLS = ["/categorias", "/gastos", "/gastos/{id}", "/gastos/{id}/notas", "/gastos/busca?q=banana",
+        "/gastos/export?formato=ndjson", "/relatorios/por-categoria", "/relatorios/por-periodo?granularidade=mes"]
+
+# executado em outro processo, já que UUID_BINARIO é lido na importação do model
+SCRIPT_MODO_BINARIO = """
+import json, sys
+from app import app
+
+urls, saida = json.loads(sys.argv[1]), sys.argv[2]
+cliente = app.test_client()
+respostas = {url: cliente.get(url).get_data(as_text=True) for url in urls}
+categoria = cliente.get("/categorias").get_json()["categorias"][0]["id"]
+novo = cliente.post("/gastos", data={"descricao": "Uvas", "valor": "3.00", "categoria_id": categoria}).get_json()
+respostas["novo"] = novo
+respostas["novo_lido"] = cliente.get("/gastos/%s" % novo["id"]).get_json()
+with open(saida, "w") as arquivo:
+    json.dump(respostas, arquivo)
+"""
+
+
+def conteudo(caminho):
+    """ Todas as linhas das tabelas de TABELAS, em ordem. """
+    conexao = sqlite3.connect(caminho)
+    try:
+        return {tabela: sorted(conexao.execute("SELECT * FROM %s" % tabela).fetchall(), key=repr)
+                for tabela in TABELAS}
+    finally:
+        conexao.close()
+
+
+def busca_notas(caminho, texto):
+    """ Ids dos gastos encontrados pelo índice de busca da base, como UUIDs. """
+    conexao = sqlite3.connect(caminho)
+    try:
+        linhas = conexao.execute(
+            "SELECT g.pk_gasto FROM gasto_fts JOIN gasto_busca b ON b.id = gasto_fts.rowid "
+            "JOIN gasto g ON g.pk_gasto = b.pk_gasto WHERE gasto_fts MATCH ?", (texto,)).fetchall()
+    finally:
+        conexao.close()
+    return [uuid.UUID(bytes=id) if isinstance(id, bytes) else uuid.UUID(id) for id, in linhas]
+
+
+class BaseParaConverter(unittest.TestCase):
+    """ Cria, pela API, uma base com gastos e notas e a copia para uma pasta
+        temporária, onde é convertida.
+    """
+
+    def setUp(self):
+        limpa_base()
+        cliente = app.test_client()
+        categoria = cliente.post("/categorias", data={"nome": "Feira"}).get_json()["id"]
+        self.gastos = {}
+        for descricao, nota in (("Frutas", "abacaxi doce"), ("Mais frutas", "banana prata")):
+            id = cliente.post("/gastos", data={"descricao": descricao, "valor": "7.50", "categoria_id": categoria,
+                                               "data_gasto": "2025-03-02T10:00:00"}).get_json()["id"]
+            cliente.post("/gastos/%s/notas" % id, data={"texto": nota})
+            self.gastos[nota] = uuid.UUID(id)
+
+        self.pasta = tempfile.TemporaryDirectory()
+        self.caminho = os.path.join(self.pasta.name, "db.sqlite3")
+        origem, destino = sqlite3.connect(engine.url.database), sqlite3.connect(self.caminho)
+        origem.backup(destino)
+        origem.close()
+        destino.close()
+
+    def tearDown(self):
+        self.pasta.cleanup()
+        limpa_base()
+
+    def converte(self, binario):
+        with contextlib.redirect_stdout(io.StringIO()):
+            converte_uuids(self.caminho, binario)
+
+
+class TestConversaoMantemABusca(BaseParaConverter):
+    """ As notas continuam no índice de busca depois da conversão.
+    """
+
+    def test_notas_encontradas_apos_converter(self):
+        for binario in (True, False):
+            self.converte(binario)
+            for nota, id in self.gastos.items():
+                self.assertEqual(busca_notas(self.caminho, nota.split()[0]), [id])
+            self.assertCountEqual(busca_notas(self.caminho, "frutas"), self.gastos.values())
+
+
+class TestIdaEVolta(BaseParaConverter):
+    """ Converter para binário e de volta para texto preserva os dados.
+    """
+
+    def test_ida_e_volta(self):
+        original = conteudo(self.caminho)
+        self.converte(True)
+        conexao = sqlite3.connect(self.caminho)
+        try:
+            for tabela, coluna in COLUNAS_UUID:
+                tipos = conexao.execute("SELECT DISTINCT typeof(%s) FROM %s" % (coluna, tabela)).fetchall()
+                self.assertEqual(tipos, [("blob",)], "%s.%s" % (tabela, coluna))
+            self.assertEqual(conexao.execute("PRAGMA foreign_key_check").fetchall(), [])
+            # as chaves estrangeiras continuam apontando para os registros
+            self.assertEqual(conexao.execute(
+                "SELECT count(*) FROM nota_gasto n JOIN gasto g ON g.pk_gasto = n.gasto_id "
+                "JOIN categoria c ON c.pk_categoria = g.categoria_id").fetchone()[0], 2)
+            self.assertEqual(conexao.execute(
+                "SELECT count(*) FROM resumo_mensal r JOIN categoria c ON c.pk_categoria = r.categoria_id"
+            ).fetchone()[0], 1)
+        finally:
+            conexao.close()
+
+        self.converte(False)
+        self.assertEqual(conteudo(self.caminho), original)
+
+
+class TestModoBinario(BaseParaConverter):
+    """ A API responde igual sobre uma base convertida para binário, e os
+        novos gastos ganham ids UUIDv7.
+    """
+
+    def test_respostas_iguais(self):
+        id = self.gastos["banana prata"]
+        urls = [url.format(id=id) for url in URLS]
+        cliente = app.test_client()
+        esperadas = {url: cliente.get(url).get_data(as_text=True) for url in urls}
+
+        self.converte(True)
+        saida = os.path.join(self.pasta.name, "respostas.json")
+        ambiente = dict(os.environ, DB_URL="sqlite:///%s" % self.caminho, UUID_BINARIO="1", UUID_V7="1")
+        subprocess.run([sys.executable, "-c", SCRIPT_MODO_BINARIO, json.dumps(urls), saida], check=True,
+                       env=ambiente, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        with open(saida) as arquivo:
+            respostas = json.load(arquivo)
+
+        for url in urls:
+            self.assertEqual(respostas[url], esperadas[url], url)
+        self.assertEqual(uuid.UUID(respostas["novo"]["id"]).version, 7)
+        self.assertEqual(respostas["novo_lido"], respostas["novo"])
+        # e o gasto novo foi gravado com a chave em binário
+        conexao = sqlite3.connect(self.caminho)
+        tipo = conexao.execute("SELECT typeof(pk_gasto) FROM gasto WHERE descricao = 'Uvas'").fetchone()
+        conexao.close()
+        self.assertEqual(tipo, ("blob",))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+
+from app import app
+from tests.apoio import limpa_base, conta_consultas
+
+
+class TestETag(unittest.TestCase):
+    """ As leituras respondem 304 ao ETag atual e mudam de ETag depois de
+        uma escrita nas tabelas de que dependem.
+    """
+
+    def setUp(self):
+        limpa_base()
+        self.cliente = app.test_client()
+        self.categoria = self.cliente.post("/categorias", data={"nome": "Mercado"}).get_json()["id"]
+        self.gasto = self.cliente.post("/gastos", data={"descricao": "Feira", "valor": "10.00",
+                                                        "categoria_id": self.categoria}).get_json()["id"]
+        self.urls = ["/categorias", "/categorias/%s" % self.categoria, "/gastos", "/gastos/%s" % self.gasto,
+                     "/gastos/%s/notas" % self.gasto, "/gastos/busca?q=feira", "/relatorios/por-categoria",
+                     "/relatorios/por-periodo?granularidade=mes"]
+
+    def tearDown(self):
+        limpa_base()
+
+    def etags(self):
+        etags = {}
+        for url in self.urls:
+            resposta = self.cliente.get(url)
+            self.assertEqual(resposta.status_code, 200, url)
+            etags[url] = resposta.headers["ETag"]
+        return etags
+
+    def test_304_com_o_etag_atual(self):
+        for url, etag in self.etags().items():
+            with conta_consultas() as comandos:
+                resposta = self.cliente.get(url, headers={"If-None-Match": etag})
+            self.assertEqual(resposta.status_code, 304, url)
+            self.assertEqual(resposta.get_data(), b"", url)
+            self.assertEqual(resposta.headers["ETag"], etag, url)
+            # o 304 sai sem ler nenhum gasto
+            self.assertFalse([comando for comando in comandos if "FROM gasto " in comando], url)
+            # a forma fraca e listas de ETags também valem
+            for cabecalho in ("W/" + etag, '"outro", ' + etag):
+                self.assertEqual(self.cliente.get(url, headers={"If-None-Match": cabecalho}).status_code, 304)
+            self.assertEqual(self.cliente.get(url, headers={"If-None-Match": '"outro"'}).status_code, 200)
+
+    def test_novo_etag_apos_escrita(self):
+        antes = self.etags()
+        self.cliente.post("/gastos/%s/notas" % self.gasto, data={"texto": "Frutas"})
+        depois = self.etags()
+        # a nota altera as representações de gasto, mas não as de categoria
+        for url in self.urls:
+            if url.startswith("/categorias"):
+                self.assertEqual(depois[url], antes[url], url)
+            else:
+                self.assertNotEqual(depois[url], antes[url], url)
+                resposta = self.cliente.get(url, headers={"If-None-Match": antes[url]})
+                self.assertEqual(resposta.status_code, 200, url)
+
+        self.cliente.put("/categorias/%s" % self.categoria, data={"nome": "Feira livre"})
+        self.assertNotEqual(self.etags()["/categorias"], depois["/categorias"])
+
+    def test_fuso_no_etag(self):
+        etag = self.cliente.get("/gastos?tz=UTC").headers["ETag"]
+        resposta = self.cliente.get("/gastos?tz=America/Sao_Paulo", headers={"If-None-Match": etag})
+        self.assertEqual(resposta.status_code, 200)
+        self.assertIn("X-Timezone", resposta.headers["Vary"])
+
+
+if __name__ == "__main__":
+    unittest.main()
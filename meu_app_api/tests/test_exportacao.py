@@ -0,0 +1,98 @@
+import csv
+import gzip
+import io
+import json
+import unittest
+
+from app import app
+from exportacao import COLUNAS_CSV
+from model import Session
+from benchmarks.dados import popula_banco
+from tests.apoio import limpa_base
+
+
+class TestExportacao(unittest.TestCase):
+    """ A exportação traz os mesmos gastos da listagem, em NDJSON ou CSV,
+        com ou sem gzip.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        limpa_base()
+        cls.cliente = app.test_client()
+        cls.mercado = cls.cliente.post("/categorias", data={"nome": "Mercado"}).get_json()["id"]
+        cls.lazer = cls.cliente.post("/categorias", data={"nome": "Lazer"}).get_json()["id"]
+        for descricao, valor, categoria, data in [
+            ("Feira", "10.00", cls.mercado, "2025-03-10T10:00:00"),
+            ('Pão, leite e "queijo"', "20.50", cls.mercado, "2025-04-02T18:30:00"),
+            ("Cinema", "5.25", cls.lazer, "2025-04-05T21:00:00"),
+        ]:
+            cls.cliente.post("/gastos?tz=UTC", data={"descricao": descricao, "valor": valor,
+                                                     "categoria_id": categoria, "data_gasto": data})
+
+    @classmethod
+    def tearDownClass(cls):
+        limpa_base()
+
+    def exporta(self, parametros):
+        resposta = self.cliente.get("/gastos/export?tz=UTC&" + parametros)
+        self.assertEqual(resposta.status_code, 200)
+        return resposta
+
+    def test_ndjson_igual_a_listagem(self):
+        resposta = self.exporta("formato=ndjson")
+        self.assertEqual(resposta.mimetype, "application/x-ndjson")
+        self.assertIn("filename=gastos.ndjson", resposta.headers["Content-Disposition"])
+        linhas = [json.loads(linha) for linha in resposta.get_data(as_text=True).splitlines()]
+        self.assertEqual(linhas, self.cliente.get("/gastos?tz=UTC").get_json()["gastos"])
+
+    def test_ndjson_com_campos_e_filtros(self):
+        resposta = self.exporta("formato=ndjson&fields=descricao,valor&categoria_id=%s" % self.mercado)
+        linhas = [json.loads(linha) for linha in resposta.get_data(as_text=True).splitlines()]
+        self.assertEqual([(linha["descricao"], linha["valor"]) for linha in linhas],
+                         [('Pão, leite e "queijo"', 20.5), ("Feira", 10.0)])
+
+    def test_csv(self):
+        resposta = self.exporta("formato=csv")
+        self.assertEqual(resposta.mimetype, "text/csv")
+        linhas = list(csv.reader(io.StringIO(resposta.get_data(as_text=True))))
+        self.assertEqual(linhas[0], COLUNAS_CSV)
+        registros = [dict(zip(linhas[0], linha)) for linha in linhas[1:]]
+        self.assertEqual([(registro["descricao"], registro["valor"], registro["categoria_nome"],
+                           registro["data_gasto"]) for registro in registros], [
+            ("Cinema", "5.25", "Lazer", "2025-04-05 21:00:00"),
+            ('Pão, leite e "queijo"', "20.5", "Mercado", "2025-04-02 18:30:00"),
+            ("Feira", "10.0", "Mercado", "2025-03-10 10:00:00"),
+        ])
+
+    def test_gzip(self):
+        for formato in ("csv", "ndjson"):
+            resposta = self.exporta("formato=%s&gzip=true" % formato)
+            self.assertEqual(resposta.mimetype, "application/gzip")
+            self.assertIn("filename=gastos.%s.gz" % formato, resposta.headers["Content-Disposition"])
+            self.assertEqual(gzip.decompress(resposta.get_data()),
+                             self.exporta("formato=%s" % formato).get_data())
+
+
+class TestExportacaoEmBlocos(unittest.TestCase):
+    """ Exportações maiores que um bloco de envio chegam completas.
+    """
+
+    def setUp(self):
+        limpa_base()
+        popula_banco(Session(), categorias=3, gastos=3000, semente=5)
+        Session.remove()
+
+    def tearDown(self):
+        limpa_base()
+
+    def test_exporta_tudo(self):
+        cliente = app.test_client()
+        ndjson = cliente.get("/gastos/export?formato=ndjson&gzip=true").get_data()
+        self.assertEqual(len(gzip.decompress(ndjson).splitlines()), 3000)
+        linhas = cliente.get("/gastos/export?formato=csv").get_data(as_text=True).splitlines()
+        self.assertEqual(len(linhas), 3001)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import unittest
+
+from app import app
+from tests.apoio import limpa_base
+
+
+class TestFusoInvalido(unittest.TestCase):
+    """ Um fuso horário inválido só é recusado nas rotas com datas.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        limpa_base()
+        cls.cliente = app.test_client()
+
+    @classmethod
+    def tearDownClass(cls):
+        limpa_base()
+
+    def test_recusado_nas_rotas_com_datas(self):
+        self.assertEqual(self.cliente.get("/gastos?tz=Marte/Olimpo").status_code, 400)
+        resposta = self.cliente.get("/relatorios/por-periodo?granularidade=mes",
+                                    headers={"X-Timezone": "Marte/Olimpo"})
+        self.assertEqual(resposta.status_code, 400)
+
+    def test_ignorado_nas_demais_rotas(self):
+        cabecalhos = {"X-Timezone": "Marte/Olimpo"}
+        self.assertEqual(self.cliente.get("/openapi/openapi.json", headers=cabecalhos).status_code, 200)
+        self.assertEqual(self.cliente.get("/metrics", headers=cabecalhos).status_code, 200)
+        self.assertEqual(self.cliente.get("/categorias", headers=cabecalhos).status_code, 200)
+        resposta = self.cliente.post("/categorias", data={"nome": "Lazer"}, headers=cabecalhos)
+        self.assertEqual(resposta.status_code, 201)
+
+
+
+class TestPeriodosNoFuso(unittest.TestCase):
+    """ Os relatórios por período agrupam os gastos pelo dia e mês do fuso
+        da requisição, também nas mudanças de horário de verão.
+    """
+
+    def setUp(self):
+        limpa_base()
+        self.cliente = app.test_client()
+        self.categoria = self.cliente.post("/categorias", data={"nome": "Mercado"}).get_json()["id"]
+
+    def tearDown(self):
+        limpa_base()
+
+    def cria_gasto(self, data, fuso, valor="10.00"):
+        resposta = self.cliente.post("/gastos?tz=%s" % fuso, data={
+            "descricao": "Gasto", "valor": valor, "categoria_id": self.categoria, "data_gasto": data})
+        self.assertEqual(resposta.status_code, 201)
+
+    def periodos(self, granularidade, fuso, filtros=""):
+        resposta = self.cliente.get("/relatorios/por-periodo?granularidade=%s&tz=%s%s" % (
+            granularidade, fuso, filtros))
+        return [(item["periodo"], item["quantidade"]) for item in resposta.get_json()["periodos"]]
+
+    def test_fim_do_mes(self):
+        # 22h do último dia do mês em São Paulo já é o mês seguinte em UTC
+        self.cria_gasto("2025-01-31T22:00:00", "America/Sao_Paulo")
+        self.cria_gasto("2025-02-10T12:00:00", "America/Sao_Paulo")
+        for filtros in ("", "&valor_min=1"):
+            self.assertEqual(self.periodos("mes", "America/Sao_Paulo", filtros), [("2025-01", 1), ("2025-02", 1)])
+            self.assertEqual(self.periodos("dia", "America/Sao_Paulo", filtros),
+                             [("2025-01-31", 1), ("2025-02-10", 1)])
+            self.assertEqual(self.periodos("mes", "UTC", filtros), [("2025-02", 2)])
+            self.assertEqual(self.periodos("dia", "UTC", filtros), [("2025-02-01", 1), ("2025-02-10", 1)])
+
+    def test_horario_de_verao(self):
+        # o deslocamento de Nova York muda de -5h para -4h em 09/03/2025
+        for data in ("2025-03-08T00:30:00", "2025-03-10T00:30:00", "2025-03-11T23:30:00"):
+            self.cria_gasto(data, "America/New_York")
+        self.assertEqual(self.periodos("dia", "America/New_York"),
+                         [("2025-03-08", 1), ("2025-03-10", 1), ("2025-03-11", 1)])
+        self.assertEqual(self.periodos("semana", "America/New_York"), [("2025-03-03", 1), ("2025-03-10", 2)])
+
+    def test_sem_gastos(self):
+        self.assertEqual(self.periodos("dia", "America/Sao_Paulo"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
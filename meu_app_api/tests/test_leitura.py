@@ -0,0 +1,136 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import NullPool
+
+try:
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+    from starlette.testclient import TestClient
+    import asgi
+except ImportError:  # o modo ASGI depende de requirements-asgi.txt
+    asgi = None
+
+from app import app, COOKIE_ESCRITA
+from model import Session, SessaoRoteada, CopiaLeitura, engine, engine_leitura, configura_sqlite_leitura
+from tests.apoio import limpa_base
+
+
+class CopiaDeLeitura(unittest.TestCase):
+    """ Liga, durante o teste, uma cópia de leitura da base dos testes, que
+        só é atualizada quando o teste chama self.copia.atualiza().
+    """
+
+    def setUp(self):
+        limpa_base()
+        self.pasta = tempfile.TemporaryDirectory()
+        self.destino = os.path.join(self.pasta.name, "db.leitura.sqlite3")
+        self.copia = CopiaLeitura(engine.url.database, self.destino, intervalo=60)
+        self.copia.atualiza()
+        self.leitura = create_engine("sqlite:///%s" % self.destino, poolclass=NullPool)
+        event.listen(self.leitura, "connect", configura_sqlite_leitura)
+        Session.configure(engine_leitura=self.leitura)
+        self.engine_leitura = mock.patch("app.engine_leitura", self.leitura)
+        self.engine_leitura.start()
+
+        self.escritor = app.test_client()
+        self.categoria = self.escritor.post("/categorias", data={"nome": "Mercado"}).get_json()["id"]
+        self.copia.atualiza()
+
+    def tearDown(self):
+        self.engine_leitura.stop()
+        Session.remove()
+        Session.configure(engine_leitura=engine_leitura)
+        self.leitura.dispose()
+        self.pasta.cleanup()
+        limpa_base()
+
+    def cria_gasto(self, cliente, descricao="Feira"):
+        resposta = cliente.post("/gastos", data={"descricao": descricao, "valor": "10.00",
+                                                 "categoria_id": self.categoria})
+        self.assertEqual(resposta.status_code, 201)
+        return resposta
+
+
+class TestLeituraDaCopia(CopiaDeLeitura):
+    """ As rotas GET leem da cópia, que fica para trás até ser atualizada,
+        exceto para o cliente que acabou de escrever.
+    """
+
+    def test_copia_atrasada_ate_atualizar(self):
+        id = self.cria_gasto(self.escritor).get_json()["id"]
+        leitor = app.test_client()
+        self.assertEqual(leitor.get("/gastos/%s" % id).status_code, 404)
+        self.assertEqual(leitor.get("/gastos").get_json()["gastos"], [])
+
+        self.assertTrue(self.copia.atualiza())
+        self.assertEqual(leitor.get("/gastos/%s" % id).status_code, 200)
+        self.assertEqual([gasto["id"] for gasto in leitor.get("/gastos").get_json()["gastos"]], [id])
+        # sem escritas novas, a cópia não é refeita
+        self.assertFalse(self.copia.atualiza())
+
+    def test_janela_de_leitura_apos_escrita(self):
+        resposta = self.cria_gasto(self.escritor)
+        self.assertIn(COOKIE_ESCRITA, resposta.headers["Set-Cookie"])
+        id = resposta.get_json()["id"]
+        # quem escreveu lê da base principal durante a janela
+        self.assertEqual(self.escritor.get("/gastos/%s" % id).status_code, 200)
+        # e da cópia, ainda atrasada, depois dela
+        with mock.patch("app.janela_leitura", 0):
+            self.assertEqual(self.escritor.get("/gastos/%s" % id).status_code, 404)
+
+    def test_cookie_invalido(self):
+        id = self.cria_gasto(self.escritor).get_json()["id"]
+        leitor = app.test_client()
+        leitor.set_cookie(COOKIE_ESCRITA, "abc")
+        self.assertEqual(leitor.get("/gastos/%s" % id).status_code, 404)
+
+    def test_escritas_vao_para_a_principal(self):
+        # a cópia recusa escritas: a alteração só funciona na base principal
+        id = self.cria_gasto(app.test_client()).get_json()["id"]
+        self.copia.atualiza()
+        leitor = app.test_client()
+        self.assertEqual(leitor.patch("/gastos/%s" % id, data={"descricao": "Padaria"}).status_code, 200)
+        self.copia.atualiza()
+        self.assertEqual(app.test_client().get("/gastos/%s" % id).get_json()["descricao"], "Padaria")
+
+
+@unittest.skipIf(asgi is None, "requer as dependências de requirements-asgi.txt")
+class TestLeituraDaCopiaASGI(CopiaDeLeitura):
+    """ As views assíncronas roteiam as leituras como as rotas do app Flask.
+    """
+
+    def setUp(self):
+        super().setUp()
+        leitura_async = create_async_engine("sqlite+aiosqlite:///%s" % self.destino, poolclass=NullPool)
+        sessoes = async_sessionmaker(asgi.engine_async, expire_on_commit=False, sync_session_class=SessaoRoteada,
+                                     engine_leitura=leitura_async.sync_engine)
+        self.sessoes = [mock.patch("asgi.engine_async_leitura", leitura_async),
+                        mock.patch("asgi.SessionAsync", sessoes)]
+        for sessao in self.sessoes:
+            sessao.start()
+
+    def tearDown(self):
+        for sessao in self.sessoes:
+            sessao.stop()
+        super().tearDown()
+
+    def test_copia_atrasada_ate_atualizar(self):
+        with TestClient(asgi.app) as escritor, TestClient(asgi.app) as leitor:
+            # a escrita passa pelo app Flask montado, que marca o cliente
+            id = self.cria_gasto(escritor).json()["id"]
+            self.assertEqual(escritor.get("/gastos/%s" % id).status_code, 200)
+            self.assertEqual(leitor.get("/gastos/%s" % id).status_code, 404)
+            self.assertEqual(leitor.get("/gastos").json()["gastos"], [])
+            with mock.patch("app.janela_leitura", 0):
+                self.assertEqual(escritor.get("/gastos/%s" % id).status_code, 404)
+
+            self.copia.atualiza()
+            self.assertEqual(leitor.get("/gastos/%s" % id).status_code, 200)
+            self.assertEqual([gasto["id"] for gasto in leitor.get("/gastos").json()["gastos"]], [id])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from logger import HandlerFila, LOGGERS_EM_FILA
+
+# executado em outro processo, com uma pasta de trabalho própria, já que os
+# arquivos de log ficam em log/
+SCRIPT_LOG = """
+import logging
+from logger import logger, encerra_logging
+
+logger.info("gasto %s criado", "abc", extra={"gasto_id": "abc", "valor": 10.5})
+try:
+    1 / 0
+except ZeroDivisionError:
+    logger.exception("falhou")
+logging.getLogger("sql.lentas").warning("consulta lenta", extra={"duracao_ms": 250})
+logging.getLogger("gunicorn.error").error("worker reiniciado")
+encerra_logging()
+"""
+
+
+def le_json(caminho):
+    with open(caminho, encoding="utf-8") as arquivo:
+        return [json.loads(linha) for linha in arquivo]
+
+
+class TestLogger(unittest.TestCase):
+    """ Os registros são enfileirados e gravados em segundo plano, um JSON
+        por linha, no arquivo do seu logger.
+    """
+
+    def test_handlers_em_fila(self):
+        for nome in LOGGERS_EM_FILA:
+            handlers = logging.getLogger(nome).handlers
+            self.assertEqual(sum(isinstance(handler, HandlerFila) for handler in handlers), 1, nome)
+            # nenhum handler de arquivo ou console escreve na thread da
+            # requisição (o pytest acrescenta os seus ao root)
+            self.assertFalse([handler for handler in handlers if type(handler).__module__.startswith("logging")],
+                             nome)
+
+    def test_linhas_json_nos_arquivos(self):
+        raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        with tempfile.TemporaryDirectory() as pasta:
+            subprocess.run([sys.executable, "-c", SCRIPT_LOG], check=True, cwd=pasta,
+                           env=dict(os.environ, PYTHONPATH=raiz), stdout=subprocess.DEVNULL)
+            detalhado = le_json(os.path.join(pasta, "log", "gunicorn.detailed.log"))
+            lentas = le_json(os.path.join(pasta, "log", "sql.lentas.log"))
+            erros = le_json(os.path.join(pasta, "log", "gunicorn.error.log"))
+
+        info, excecao = detalhado
+        self.assertEqual((info["nivel"], info["logger"], info["mensagem"]), ("INFO", "logger", "gasto abc criado"))
+        # os campos de extra viram chaves do JSON
+        self.assertEqual((info["gasto_id"], info["valor"]), ("abc", 10.5))
+        self.assertTrue(info["momento"].endswith("+00:00"))
+        # o traceback fica separado da mensagem
+        self.assertEqual(excecao["mensagem"], "falhou")
+        self.assertIn("ZeroDivisionError", excecao["excecao"])
+
+        self.assertEqual([(linha["mensagem"], linha["duracao_ms"]) for linha in lentas], [("consulta lenta", 250)])
+        self.assertEqual([linha["mensagem"] for linha in erros], ["worker reiniciado"])
+
+
+if __name__ == "__main__":
+    unittest.main()
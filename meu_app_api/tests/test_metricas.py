@@ -0,0 +1,75 @@
+import unittest
+
+from app import app
+from tests.apoio import limpa_base
+
+
+def series(texto):
+    """ Valores do formato texto do Prometheus, por nome de série. """
+    valores = {}
+    for linha in texto.splitlines():
+        if linha and not linha.startswith("#"):
+            serie, valor = linha.rsplit(" ", 1)
+            valores[serie] = float(valor)
+    return valores
+
+
+class TestMetricas(unittest.TestCase):
+    """ O /metrics expõe os contadores e histogramas das requisições e das
+        consultas feitas ao banco.
+    """
+
+    def setUp(self):
+        limpa_base()
+        self.cliente = app.test_client()
+
+    def tearDown(self):
+        limpa_base()
+
+    def coleta(self):
+        resposta = self.cliente.get("/metrics")
+        self.assertEqual(resposta.status_code, 200)
+        self.assertTrue(resposta.headers["Content-Type"].startswith("text/plain; version=0.0.4"))
+        return series(resposta.get_data(as_text=True))
+
+    def test_contadores_apos_requisicoes(self):
+        antes = self.coleta()
+        categoria = self.cliente.post("/categorias", data={"nome": "Mercado"}).get_json()["id"]
+        self.cliente.get("/categorias/%s" % categoria)
+        self.cliente.get("/categorias/%s" % categoria)
+        self.cliente.get("/gastos/00000000-0000-0000-0000-000000000000")
+        depois = self.coleta()
+
+        def diferenca(serie):
+            return depois.get(serie, 0) - antes.get(serie, 0)
+
+        # as requisições são contadas pela regra da rota, não pela URL
+        self.assertEqual(diferenca('http_requisicoes_total{metodo="POST",rota="/categorias",status="201"}'), 1)
+        self.assertEqual(diferenca(
+            'http_requisicoes_total{metodo="GET",rota="/categorias/<uuid:id>",status="200"}'), 2)
+        self.assertEqual(diferenca(
+            'http_requisicoes_total{metodo="GET",rota="/gastos/<uuid:id>",status="404"}'), 1)
+
+        rotulos = 'metodo="GET",rota="/categorias/<uuid:id>"'
+        self.assertEqual(diferenca("http_duracao_segundos_count{%s}" % rotulos), 2)
+        self.assertEqual(diferenca('http_duracao_segundos_bucket{%s,le="+Inf"}' % rotulos), 2)
+        self.assertEqual(diferenca("http_resposta_bytes_count{%s}" % rotulos), 2)
+        self.assertGreater(diferenca("http_resposta_bytes_sum{%s}" % rotulos), 0)
+        # cada leitura da categoria consultou o banco
+        self.assertEqual(diferenca("db_consultas_por_requisicao_count{%s}" % rotulos), 2)
+        self.assertGreaterEqual(diferenca("db_consultas_por_requisicao_sum{%s}" % rotulos), 2)
+        self.assertGreater(diferenca("db_consultas_total"), 0)
+        self.assertGreater(diferenca("db_duracao_segundos_total"), 0)
+
+    def test_faixas_acumuladas(self):
+        self.cliente.get("/categorias")
+        valores = self.coleta()
+        prefixo = 'http_duracao_segundos_bucket{metodo="GET",rota="/categorias",le="'
+        faixas = [valor for serie, valor in valores.items() if serie.startswith(prefixo)]
+        self.assertEqual(faixas, sorted(faixas))
+        self.assertEqual(faixas[-1], valores['http_duracao_segundos_count{metodo="GET",rota="/categorias"}'])
+        self.assertIn("processo_info", "".join(valores))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,149 @@
+import random
+import unittest
+from unittest import mock
+
+from sqlalchemy import func, insert
+
+from app import app
+from model import Session, Gasto, NotaGasto, ResumoMensal, reconstroi_resumo, versao_tabela
+from operacoes_lote import aplica_operacoes
+from schemas import GastoLoteSchema
+from benchmarks.dados import popula_banco
+from tests.apoio import limpa_base
+
+
+def resumo_atual(session):
+    """ Linhas do resumo mensal, como tuplas ordenadas. """
+    return sorted(
+        (str(linha.categoria_id), linha.ano_mes, linha.total, linha.quantidade, linha.minimo, linha.maximo)
+        for linha in session.query(ResumoMensal))
+
+
+def estado_base(session):
+    """ Tudo o que as operações em lote podem alterar. """
+    gastos = sorted((str(gasto.id), gasto.descricao, gasto.valor_centavos, str(gasto.categoria_id),
+                     gasto.data_gasto) for gasto in session.query(Gasto))
+    notas = sorted((nota.id, str(nota.gasto_id)) for nota in session.query(NotaGasto))
+    return gastos, notas, resumo_atual(session), versao_tabela(session, "gasto")
+
+
+class TestOperacoesLote(unittest.TestCase):
+    """ As operações em lote não passam pelos eventos do ORM: o resumo
+        mensal, as notas e a versão de gasto são mantidos por elas.
+    """
+
+    def setUp(self):
+        limpa_base()
+        session = Session()
+        self.categorias, self.ids = popula_banco(session, categorias=6, gastos=2000, semente=11)
+        self.ids = [str(id) for id in self.ids]
+        self.categorias = [str(id) for id in self.categorias]
+        # uma nota para cada um dos primeiros 500 gastos
+        session.execute(insert(NotaGasto), [
+            {"texto": "nota %d" % indice, "gasto_id": id} for indice, id in enumerate(self.ids[:500])])
+        session.commit()
+        Session.remove()
+        self.cliente = app.test_client()
+        self.aleatorio = random.Random(3)
+
+    def tearDown(self):
+        Session.remove()
+        limpa_base()
+
+    def assertResumoReconstruido(self):
+        """ O resumo mantido pelas operações é igual ao reconstruído do zero.
+        """
+        session = Session()
+        mantido = resumo_atual(session)
+        reconstroi_resumo(session)
+        self.assertEqual(mantido, resumo_atual(session))
+        session.rollback()
+        Session.remove()
+
+    def test_lote_misto(self):
+        ids = self.aleatorio.sample(self.ids, 1200)
+        removidos, valor, categoria, data = ids[:300], ids[300:600], ids[600:900], ids[900:]
+        resposta = self.cliente.post("/gastos/batch", json={"operacoes": [
+            {"acao": "remover", "ids": removidos},
+            {"acao": "atualizar", "ids": valor, "valores": {"valor": "12.34"}},
+            {"acao": "atualizar", "ids": categoria, "valores": {"categoria_id": self.categorias[-1]}},
+            # muda o mês dos gastos e, em parte deles, também a categoria e o valor
+            {"acao": "atualizar", "ids": data, "valores": {"data_gasto": "2026-02-15T12:00:00"}},
+            {"acao": "atualizar", "ids": data[:100],
+             "valores": {"categoria_id": self.categorias[0], "valor": "0.01"}},
+        ]}, headers={"X-Timezone": "UTC"})
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.get_json(), {"removidos": 300, "atualizados": 1000})
+        self.assertResumoReconstruido()
+
+        session = Session()
+        self.assertEqual(session.query(Gasto).filter(Gasto.id.in_(removidos)).count(), 0)
+        self.assertEqual(session.query(func.count(Gasto.id)).scalar(), 1700)
+        self.assertEqual(session.query(func.sum(ResumoMensal.quantidade))
+                         .filter(ResumoMensal.ano_mes == "2026-02").scalar(), 300)
+        resumo = session.query(ResumoMensal).filter(ResumoMensal.ano_mes == "2026-02",
+                                                    ResumoMensal.categoria_id == self.categorias[0]).one()
+        self.assertEqual(resumo.minimo, 1)
+
+    def test_remocao_apaga_as_notas(self):
+        removidos = self.ids[:200] + self.ids[1000:1100]
+        resposta = self.cliente.post("/gastos/batch", json={"operacoes": [{"acao": "remover", "ids": removidos}]})
+        self.assertEqual(resposta.status_code, 200)
+        session = Session()
+        self.assertEqual(session.query(NotaGasto).filter(NotaGasto.gasto_id.in_(removidos)).count(), 0)
+        # as notas dos demais gastos continuam
+        self.assertEqual(session.query(func.count(NotaGasto.id)).scalar(), 300)
+        # e os removidos somem também da busca
+        busca = self.cliente.get("/gastos/busca?q=nota&limite=500&fields=id").get_json()
+        self.assertEqual(sorted(gasto["id"] for gasto in busca["gastos"]), sorted(self.ids[200:500]))
+        self.assertResumoReconstruido()
+
+    def test_recategorizacao(self):
+        origem, destino = self.categorias[0], self.categorias[1]
+        session = Session()
+        esperados = session.query(func.count(Gasto.id)).filter(Gasto.categoria_id.in_([origem, destino])).scalar()
+        Session.remove()
+
+        resposta = self.cliente.post("/gastos/recategorizar", json={"origem_id": origem, "destino_id": destino})
+        self.assertEqual(resposta.status_code, 200)
+        self.assertGreater(resposta.get_json()["atualizados"], 0)
+        self.assertResumoReconstruido()
+
+        session = Session()
+        self.assertEqual(session.query(ResumoMensal).filter(ResumoMensal.categoria_id == origem).count(), 0)
+        self.assertEqual(session.query(func.sum(ResumoMensal.quantidade))
+                         .filter(ResumoMensal.categoria_id == destino).scalar(), esperados)
+
+    def test_operacao_invalida_nao_altera_nada(self):
+        session = Session()
+        antes = estado_base(session)
+        Session.remove()
+
+        for operacoes in (
+            # a categoria de destino não existe
+            [{"acao": "remover", "ids": self.ids[:10]},
+             {"acao": "atualizar", "ids": self.ids[10:20], "valores": {"categoria_id": self.ids[0]}}],
+            # nenhum valor para atualizar
+            [{"acao": "remover", "ids": self.ids[:10]}, {"acao": "atualizar", "ids": self.ids[10:20]}],
+        ):
+            resposta = self.cliente.post("/gastos/batch", json={"operacoes": operacoes})
+            self.assertEqual(resposta.status_code, 400)
+            self.assertEqual(estado_base(Session()), antes)
+            Session.remove()
+
+    def test_falha_no_banco_desfaz_o_lote(self):
+        session = Session()
+        antes = estado_base(session)
+        lote = GastoLoteSchema(operacoes=[
+            {"acao": "remover", "ids": self.ids[:100]},
+            {"acao": "atualizar", "ids": self.ids[100:200], "valores": {"valor": "1.00"}},
+        ])
+        # a falha acontece depois dos DELETE e UPDATE, ao recalcular o resumo
+        with mock.patch("operacoes_lote.recalcula_resumo", side_effect=RuntimeError("falha")):
+            with self.assertRaises(RuntimeError):
+                aplica_operacoes(session, lote.operacoes)
+        self.assertEqual(estado_base(session), antes)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+
+from app import app
+from model import Session, Gasto
+from model.gasto import de_centavos
+from benchmarks.dados import popula_banco
+from tests.apoio import limpa_base, conta_consultas
+
+
+def agrega(gastos, chave):
+    """ Totais esperados dos gastos, agrupados pela chave, como no relatório. """
+    grupos = {}
+    for gasto in gastos:
+        grupos.setdefault(chave(gasto), []).append(gasto.valor_centavos)
+    return {grupo: {"total": de_centavos(sum(valores)), "quantidade": len(valores),
+                    "minimo": de_centavos(min(valores)), "maximo": de_centavos(max(valores))}
+            for grupo, valores in grupos.items()}
+
+
+def por_chave(itens, chave):
+    return {item.pop(chave): item for item in itens}
+
+
+class TestRelatorios(unittest.TestCase):
+    """ Os relatórios somam os mesmos totais pelo resumo mensal (sem filtros)
+        e pelo GROUP BY em gasto (com filtros).
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        limpa_base()
+        session = Session()
+        cls.categorias, _ = popula_banco(session, categorias=5, gastos=3000, semente=13)
+        cls.gastos = session.query(Gasto).all()
+        Session.remove()
+        cls.cliente = app.test_client()
+
+    @classmethod
+    def tearDownClass(cls):
+        limpa_base()
+
+    def relatorio(self, url):
+        with conta_consultas() as comandos:
+            resposta = self.cliente.get(url)
+        self.assertEqual(resposta.status_code, 200, url)
+        # o caminho usado: resumo mensal ou GROUP BY em gasto
+        resumo = any("resumo_mensal" in comando for comando in comandos)
+        return resposta.get_json(), resumo
+
+    def por_categoria(self, filtros=""):
+        corpo, resumo = self.relatorio("/relatorios/por-categoria?tz=UTC" + filtros)
+        for item in corpo["categorias"]:
+            del item["nome"]
+        return por_chave(corpo["categorias"], "categoria_id"), resumo
+
+    def por_periodo(self, granularidade, filtros=""):
+        corpo, resumo = self.relatorio("/relatorios/por-periodo?tz=UTC&granularidade=%s%s" % (
+            granularidade, filtros))
+        periodos = [item["periodo"] for item in corpo["periodos"]]
+        self.assertEqual(periodos, sorted(periodos))
+        return por_chave(corpo["periodos"], "periodo"), resumo
+
+    def test_por_categoria(self):
+        totais, resumo = self.por_categoria()
+        self.assertTrue(resumo)
+        self.assertEqual(totais, agrega(self.gastos, lambda gasto: str(gasto.categoria_id)))
+
+        categoria = self.categorias[2]
+        totais, resumo = self.por_categoria("&categoria_id=%s" % categoria)
+        self.assertTrue(resumo)
+        self.assertEqual(totais, agrega([gasto for gasto in self.gastos if gasto.categoria_id == categoria],
+                                        lambda gasto: str(gasto.categoria_id)))
+
+    def test_por_categoria_com_filtros(self):
+        totais, resumo = self.por_categoria("&valor_min=100&data_inicio=2024-03-01T00:00:00")
+        self.assertFalse(resumo)
+        inicio = datetime(2024, 3, 1, tzinfo=timezone.utc)
+        self.assertEqual(totais, agrega(
+            [gasto for gasto in self.gastos if gasto.valor_centavos >= 10000 and gasto.data_gasto >= inicio],
+            lambda gasto: str(gasto.categoria_id)))
+
+    def test_por_mes_nos_dois_caminhos(self):
+        esperado = agrega(self.gastos, lambda gasto: gasto.data_gasto.strftime("%Y-%m"))
+        totais, resumo = self.por_periodo("mes")
+        self.assertTrue(resumo)
+        self.assertEqual(totais, esperado)
+        # um filtro que não exclui nenhum gasto força o GROUP BY
+        totais, resumo = self.por_periodo("mes", "&valor_min=0")
+        self.assertFalse(resumo)
+        self.assertEqual(totais, esperado)
+
+    def test_por_dia_e_semana(self):
+        totais, _ = self.por_periodo("dia")
+        self.assertEqual(totais, agrega(self.gastos, lambda gasto: gasto.data_gasto.strftime("%Y-%m-%d")))
+        totais, _ = self.por_periodo("semana")
+        # a semana é identificada pela segunda-feira
+        self.assertEqual(totais, agrega(self.gastos, lambda gasto: (
+            gasto.data_gasto - timedelta(days=gasto.data_gasto.weekday())).strftime("%Y-%m-%d")))
+
+    def test_por_periodo_com_filtros(self):
+        categoria = self.categorias[0]
+        totais, _ = self.por_periodo("dia", "&categoria_id=%s&valor_max=50" % categoria)
+        self.assertEqual(totais, agrega(
+            [gasto for gasto in self.gastos if gasto.categoria_id == categoria and gasto.valor_centavos <= 5000],
+            lambda gasto: gasto.data_gasto.strftime("%Y-%m-%d")))
+
+
+if __name__ == "__main__":
+    unittest.main()